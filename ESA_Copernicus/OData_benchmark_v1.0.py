@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+#
+#  Script to benchmark the query and download code of the OData scripts
+#  against a local mock of the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/).
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial script: query the catalogue of the mock server of
+#         OData_mockserver through OData_search, then run an OData_download
+#         script on the first records, and report products/s, MB/s, time to
+#         first byte and peak memory.
+#
+#
+#  Usage: ./OData_benchmark_vx.x.py [DOWNLOADSCRIPT]
+#
+#      DOWNLOADSCRIPT : OData_download script to benchmark, instead of
+#                       params_DownloadScript.
+#
+#  Exit status:
+#      0      if OK,
+#      1      cannot access the download script,
+#      2      the download script exited with an error or did not download
+#             every product.
+#
+
+
+###  BEGIN Set Benchmark Parameters  ###
+
+#  params_CatalogueRecords : number of products in the catalogue of the mock
+#                            server, all of which are queried.
+#  params_PageSize : number of records requested per page.
+#  params_Products : number of products downloaded (the first records of the
+#                    query).
+#  params_ProductSize : size of each product in bytes.
+#  params_Latency : number of seconds before the server answers a request.
+#  params_Bandwidth : bytes per second sent by the server on each connection
+#                     (None for no limit).
+#  params_ErrorRates : probability of each error status in the responses to
+#                      the downloads, e.g. { 429 : 0.01, 503 : 0.02 }.
+#  params_RetryAfter : Retry-After header of the 429 responses, in seconds.
+#  params_TokenLifetime : life time of the access tokens in seconds.
+#  params_DownloadScript : OData_download script to benchmark.
+#  params_Results : file to which the results of each run are appended as a
+#                   JSON record, to compare versions of the scripts.
+#  params_KeepWorkDir : keep the directory in which the products were
+#                       downloaded.
+#
+
+##  Please set the following:
+
+params_CatalogueRecords = 10000
+params_PageSize = 1000
+params_Products = 32
+params_ProductSize = 16777216
+params_Latency = 0.02
+params_Bandwidth = 50e6
+params_ErrorRates = { 401 : 0.0, 429 : 0.0, 500 : 0.0, 503 : 0.0 }
+params_RetryAfter = 1
+params_TokenLifetime = 600
+params_DownloadScript = "OData_download_v4.15.py"
+params_Results = "OData_benchmark.jsonl"
+params_KeepWorkDir = False
+
+###  END Set Benchmark Parameters  ###
+
+
+#  Load libraries
+from sys import argv, executable
+import os
+from os.path import abspath, dirname, isfile, join, getsize
+from time import time, strftime, localtime
+import json
+import multiprocessing
+import resource
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+import requests
+from OData_mockserver import serve
+
+
+###  BEGIN Parsing of command line arguments  ###
+if (len(argv) > 1):
+    params_DownloadScript = argv[1]
+
+# Scripts are looked for next to this one
+DownloadScript = params_DownloadScript
+if not isfile(DownloadScript):
+    DownloadScript = join(dirname(abspath(argv[0])), params_DownloadScript)
+if not isfile(DownloadScript):
+    print("Cannot access {:s}!\n".format(params_DownloadScript))
+    exit(1)
+###  END Parsing of command line arguments  ###
+
+
+
+def percentile(values, q):
+    """
+    q-th percentile of a list of values, None if it is empty.
+    """
+    if (len(values) == 0):
+        return None
+    return float(np.percentile(values, q))
+
+
+def ms(seconds):
+    return "n/a" if (seconds is None) else "{:.1f} ms".format(1000 * seconds)
+
+
+def peak_rss_MB(who):
+    """
+    Peak resident set size in MB of this process (resource.RUSAGE_SELF) or
+    of the child processes waited for (resource.RUSAGE_CHILDREN).
+    """
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+
+###  BEGIN Start mock server  ###
+
+# The server runs in a process of its own, so that it does not compete with
+# the code being measured for the interpreter and does not count in its
+# memory use
+conn, child_conn = multiprocessing.Pipe()
+server = multiprocessing.get_context("fork").Process(target=serve,
+                                                     args=(child_conn,),
+                                                     kwargs={ 'products'        : params_CatalogueRecords,
+                                                              'product_size'    : params_ProductSize,
+                                                              'latency'         : params_Latency,
+                                                              'bandwidth'       : params_Bandwidth,
+                                                              'error_rates'     : params_ErrorRates,
+                                                              'error_endpoints' : ("zipper",),
+                                                              'retry_after'     : params_RetryAfter,
+                                                              'token_lifetime'  : params_TokenLifetime },
+                                                     daemon=True)
+server.start()
+ServerURL, ServerEnv = conn.recv()
+
+# Point the OData modules to the mock server before they are imported
+os.environ.update(ServerEnv)
+from OData_transport import PooledSession, IDENTITY_URL
+from OData_search import build_filter, iter_pages, page_records
+from OData_logfile import write_log
+
+print("\n# Mock server on {:s}: {:d} products of {:.1f} MB, latency {:s}, bandwidth {:s} per connection".format(
+      ServerURL, params_CatalogueRecords, params_ProductSize / 1e6, ms(params_Latency),
+      "unlimited" if not params_Bandwidth else "{:.1f} MB/s".format(params_Bandwidth / 1e6)))
+
+WorkDir = tempfile.mkdtemp(prefix="OData_benchmark_")
+
+###  END Start mock server  ###
+
+
+
+###  BEGIN Query benchmark  ###
+print("\n# Querying {:d} records, {:d} per page ...".format(params_CatalogueRecords, params_PageSize))
+
+session = PooledSession(pool_size=1)
+flt = build_filter("SENTINEL-2", "(57.0 -20.8, 58.1 -20.8, 58.1 -19.6, 57.0 -19.6, 57.0 -20.8)",
+                   "2021-08-01T00:00:00.000", "2021-08-31T23:59:59.999", "50.00")
+
+PageTimes = []
+Selected = []
+count_records = 0
+start = time()
+stamp = start
+for page in iter_pages(session, flt, page_size=params_PageSize):
+    log_df = page_records(page)
+    if (len(Selected) * params_PageSize < params_Products):
+        Selected.append(log_df)
+    count_records += log_df.shape[0]
+
+    now = time()
+    PageTimes.append(now - stamp)
+    stamp = now
+
+QueryElapsed = time() - start
+QueryRSS = peak_rss_MB(resource.RUSAGE_SELF)
+
+Query = { 'records'   : count_records,
+          'seconds'   : QueryElapsed,
+          'records/s' : count_records / QueryElapsed,
+          'page_p50'  : percentile(PageTimes, 50),
+          'page_p99'  : percentile(PageTimes, 99),
+          'peak_rss_MB' : QueryRSS }
+
+###  END Query benchmark  ###
+
+
+
+###  BEGIN Download benchmark  ###
+
+# Log file of the first params_Products records, and a token from the mock
+# identity service
+log_df = pd.concat(Selected, ignore_index=True).iloc[:params_Products]
+LogFile = join(WorkDir, "OData_benchmark.log")
+write_log(LogFile, "Collection = SENTINEL-2\nBenchmark = {:s}\n".format(ServerURL), log_df)
+
+token = session.post(IDENTITY_URL, data={ "grant_type" : "password" }).json()
+token['fetched_at'] = time()
+with open(join(WorkDir, "CopernicusDataspace_token.json"), 'w') as f:
+    json.dump(token, f)
+
+print("# Downloading {:d} products with {:s} ...".format(log_df.shape[0], params_DownloadScript))
+
+start = time()
+with open(join(WorkDir, "download.out"), 'w') as f:
+    status = subprocess.run([executable, abspath(DownloadScript), LogFile], cwd=WorkDir, stdout=f, stderr=subprocess.STDOUT).returncode
+DownloadElapsed = time() - start
+DownloadRSS = peak_rss_MB(resource.RUSAGE_CHILDREN)
+
+count_products = 0
+count_bytes = 0
+for Name in log_df['Name']:
+    DataFile = join(WorkDir, Name + ".zip")
+    if isfile(DataFile):
+        count_products += 1
+        count_bytes += getsize(DataFile)
+
+# Time to first byte and status of the downloads, as seen by the server
+Requests = requests.get(ServerURL + "/mock/requests").json()
+Zipper = [ Request for Request in Requests if Request[0] == "zipper" ]
+TTFB = [ first_byte - arrival for endpoint, code, arrival, first_byte, sent in Zipper if code in (200, 206) ]
+Errors = {}
+for endpoint, code, arrival, first_byte, sent in Zipper:
+    if (code >= 400):
+        Errors[str(code)] = Errors.get(str(code), 0) + 1
+
+Download = { 'script'      : params_DownloadScript,
+             'status'      : status,
+             'products'        : count_products,
+             'bytes'       : count_bytes,
+             'seconds'     : DownloadElapsed,
+             'products/s'  : count_products / DownloadElapsed,
+             'MB/s'        : count_bytes / 1e6 / DownloadElapsed,
+             'ttfb_p50'    : percentile(TTFB, 50),
+             'ttfb_p99'    : percentile(TTFB, 99),
+             'requests'    : len(Zipper),
+             'errors'      : Errors,
+             'token_refreshes' : sum(1 for Request in Requests if Request[0] == "identity") - 1,
+             'peak_rss_MB' : DownloadRSS }
+
+###  END Download benchmark  ###
+
+
+
+###  BEGIN Report  ###
+
+server.terminate()
+
+print("\n------------------------------------------------------------------------------")
+print("Query    : {:d} records in {:.2f} s, {:.0f} records/s".format(count_records, QueryElapsed, Query['records/s']))
+print("           page time p50 {:s}, p99 {:s}, peak RSS {:.0f} MB".format(ms(Query['page_p50']), ms(Query['page_p99']), QueryRSS))
+print("Download : {:d}/{:d} products, {:.1f} MB in {:.2f} s (exit status {:d})".format(count_products, log_df.shape[0], count_bytes / 1e6, DownloadElapsed, status))
+print("           {:.2f} products/s, {:.1f} MB/s".format(Download['products/s'], Download['MB/s']))
+print("           TTFB p50 {:s}, p99 {:s} (server side), {:d} requests".format(ms(Download['ttfb_p50']), ms(Download['ttfb_p99']), len(Zipper)))
+print("           errors {:s}, {:d} token refresh(es), peak RSS {:.0f} MB".format(json.dumps(Errors), Download['token_refreshes'], DownloadRSS))
+print("------------------------------------------------------------------------------")
+
+with open(params_Results, 'a') as f:
+    f.write(json.dumps({ 'time'     : strftime("%Y-%m-%dT%H:%M:%S", localtime()),
+                         'server'   : { 'products'        : params_CatalogueRecords,
+                                        'product_size'    : params_ProductSize,
+                                        'latency'         : params_Latency,
+                                        'bandwidth'       : params_Bandwidth,
+                                        'error_rates'     : params_ErrorRates },
+                         'query'    : Query,
+                         'download' : Download }) + "\n")
+print("Results appended to {:s}".format(params_Results))
+
+if params_KeepWorkDir:
+    print("Downloads and output of the script kept in {:s}\n".format(WorkDir))
+else:
+    shutil.rmtree(WorkDir)
+    print()
+
+if (status != 0) or (count_products < log_df.shape[0]):
+    exit(2)
+
+exit(0)
+
+###  END Report  ###
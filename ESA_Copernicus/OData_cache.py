@@ -0,0 +1,243 @@
+#
+#  On-disk cache of the responses of the catalogue of the Copernicus
+#  Dataspace Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: query pages cached under a key built from the
+#         normalized request, with a time to live and LRU eviction.
+#
+#  1.1: 17.10.2026
+#       * Keep a running total of the size of the cache, and only scan the
+#         directory when it goes over max_bytes, or every SCAN_INTERVAL
+#         entries stored, instead of at each put(). A cache over the limit
+#         is brought back to LOW_WATER of it. The counts of hits and
+#         misses are kept under the lock, the cache being shared by threads.
+#
+#
+#  Usage:
+#      from OData_cache import QueryCache
+#
+#      cache = QueryCache(".OData_cache", ttl=86400, max_bytes=512*2**20)
+#      page = cache.get(url, params)
+#      if page is None:
+#          page = session.get(url, params=params).json()
+#          cache.put(url, params, page)
+#
+
+
+#  Load libraries
+import os
+from os.path import join, isdir, getsize
+from time import time
+from hashlib import sha256
+import gzip
+import json
+import re
+import threading
+
+
+#  Cache modes:
+#    "use"     : answer from the cache when possible and store new responses,
+#    "refresh" : always ask the server but store the responses,
+#    "bypass"  : do not touch the cache at all.
+CACHE_MODES = ("use", "refresh", "bypass")
+
+#  Number of entries stored between two scans of the directory, which bring
+#  the running total of the size of the cache back in line with the entries
+#  written or removed by other processes
+SCAN_INTERVAL = 256
+
+#  Share of max_bytes to which a cache over its size limit is brought back,
+#  so that a full cache is not scanned again at the next put()
+LOW_WATER = 0.9
+
+
+def normalize_filter(flt):
+    """
+    Normalized form of an OData $filter: runs of white space are reduced to
+    a single space, and the spaces next to commas and brackets are removed,
+    so that e.g. two ways of writing the same polygon give the same key.
+    """
+    flt = re.sub(r"\s+", " ", flt.strip())
+    flt = re.sub(r"\s*([,()])\s*", r"\1", flt)
+    return flt
+
+
+def request_key(url, params=None):
+    """
+    Cache key of a GET request: SHA-256 of the URL and of its parameters,
+    sorted by name, with the $filter normalized.
+    """
+    items = []
+    if params:
+        for name in sorted(params):
+            value = str(params[name])
+            if (name == "$filter"):
+                value = normalize_filter(value)
+            items.append("{:s}={:s}".format(name, value))
+
+    return sha256("\n".join([url] + items).encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """
+    Cache of JSON responses stored as gzipped files in a directory, one file
+    per request.
+
+    ttl : number of seconds after which an entry is considered stale.
+    max_bytes : total size of the cache directory, beyond which the least
+                recently used entries are removed. The modification time of
+                an entry is updated each time it is read and serves as last
+                access time.
+    mode : one of CACHE_MODES.
+
+    The total size of the cache is kept as entries are stored, so that the
+    directory is only scanned to evict entries when the total goes over
+    max_bytes (and every SCAN_INTERVAL entries stored).
+    """
+
+    def __init__(self, directory, ttl=86400, max_bytes=512*2**20, mode="use"):
+        if mode not in CACHE_MODES:
+            raise ValueError("cache mode must be one of {:s}".format(", ".join(CACHE_MODES)))
+
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        # Total size of the entries, None until the directory is scanned,
+        # and number of entries stored
+        self.total = None
+        self.puts = 0
+
+        if (mode != "bypass") and not isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+
+    def path(self, url, params=None):
+        return join(self.directory, request_key(url, params) + ".json.gz")
+
+
+    def get(self, url, params=None):
+        """
+        Cached response of a request, or None if there is none, if it is
+        stale or if the mode is not "use".
+        """
+        if (self.mode != "use"):
+            return None
+
+        path = self.path(url, params)
+        try:
+            with gzip.open(path, 'rt') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if (time() - entry['stored_at'] > self.ttl):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        # Mark entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self.lock:
+            self.hits += 1
+        return entry['response']
+
+
+    def put(self, url, params, response):
+        """
+        Store the response of a request, then evict the least recently used
+        entries if the cache is over its size limit.
+        """
+        if (self.mode == "bypass"):
+            return
+
+        path = self.path(url, params)
+        tmp = "{:s}.{:d}.{:d}.tmp".format(path, os.getpid(), threading.get_ident())
+        with gzip.open(tmp, 'wt') as f:
+            json.dump({ 'stored_at' : time(), 'response' : response }, f)
+        size = getsize(tmp)
+
+        # Size of the entry replaced, if any
+        try:
+            size -= getsize(path)
+        except OSError:
+            pass
+        os.replace(tmp, path)
+
+        with self.lock:
+            self.puts += 1
+            if (self.total is not None):
+                self.total += size
+
+            if (self.total is None) or (self.total > self.max_bytes) or (self.puts % SCAN_INTERVAL == 0):
+                self._evict()
+
+
+    def evict(self):
+        """
+        Remove the least recently used entries if the total size of the
+        cache is over max_bytes, until it is within LOW_WATER of max_bytes.
+        """
+        with self.lock:
+            self._evict()
+
+
+    def _evict(self):
+        """
+        evict(), with the lock held. Scans the directory and sets the
+        running total.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json.gz"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        entries.sort()
+        limit = self.max_bytes if (total <= self.max_bytes) else LOW_WATER * self.max_bytes
+        for mtime, size, path in entries:
+            if (total <= limit):
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+        self.total = total
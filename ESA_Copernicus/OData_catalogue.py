@@ -0,0 +1,163 @@
+#
+#  Local mirror of the catalogue of the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/): every product returned by the queries
+#  is kept with its attributes, so that a query is answered locally and only
+#  the products published since it was last run are asked from the catalogue.
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: products stored in SQLite with their attributes,
+#         indexed by collection, tile, sensing date and cloud cover, and
+#         synchronization marks of the queries.
+#
+#
+#  Usage:
+#      from OData_catalogue import Catalogue
+#
+#      catalogue = Catalogue(".OData_catalogue.sqlite")
+#
+#      mark = catalogue.sync_mark(flt)    # flt: $filter of the query
+#      mark.load()
+#      if (mark.mark is not None):
+#          Records = catalogue.search(Poly, StartTime, StopTime, Cloud, "SENTINEL-2")
+#          flt = mark.restrict(flt)       # only products published since
+#
+#      for page in iter_pages(session, flt, expand="Attributes"):
+#          catalogue.add_page(page, "SENTINEL-2")
+#          for record in page['value']:
+#              mark.update(record['Id'], record['PublicationDate'])
+#      mark.save()                        # once all the pages are stored
+#
+#      Records = catalogue.search(Collection="SENTINEL-2", Tile="40KEC",
+#                                 StartTime="2021-08-01T00:00:00.000", Cloud=20)
+#
+#  A synchronization mark is kept for each query ($filter): it is the
+#  high-water mark of the publication dates of the products the catalogue
+#  returned for it, as OData_watermark keeps for the saved queries. All the
+#  products matching the query and published up to the mark are in the
+#  mirror.
+#
+
+
+#  Load libraries
+from datetime import datetime, timezone
+from hashlib import sha256
+import json
+from OData_spatial import FootprintIndex, normalize_date, mgrs_tile
+from OData_watermark import Watermark
+from OData_cache import normalize_filter
+
+
+def product_attributes(Product):
+    """
+    Attributes of a product as a dictionary name -> value, from the list
+    returned by the catalogue with $expand=Attributes, e.g.
+    [{"Name": "cloudCover", "Value": 12.5, "ValueType": "Double"}, ...].
+    """
+    return { Attribute['Name'] : Attribute.get('Value') for Attribute in Product.get('Attributes') or []
+             if isinstance(Attribute, dict) and ('Name' in Attribute) }
+
+
+class Catalogue(FootprintIndex):
+    """
+    Products returned by the catalogue, kept in an SQLite database with
+    their footprint (R-tree of OData_spatial), their attributes and their
+    JSON record. Besides the sensing start, cloud cover and collection of
+    FootprintIndex, the table holds the name, MGRS tile, relative orbit,
+    size and publication date of each product, and is indexed by
+    collection with sensing date, tile or cloud cover, so that lookups stay
+    well under a second with hundreds of thousands of products.
+    """
+
+    TABLE = "products"
+    COLUMNS = [ ("Name",            "TEXT"),
+                ("Tile",            "TEXT"),
+                ("RelativeOrbit",   "INTEGER"),
+                ("ContentLength",   "INTEGER"),
+                ("PublicationDate", "TEXT") ]
+    INDEXES = { 'start'       : ("Collection", "ContentStart"),
+                'tile'        : ("Collection", "Tile", "ContentStart"),
+                'cloud'       : ("Collection", "Cloud"),
+                'publication' : ("PublicationDate",) }
+
+    def __init__(self, path, timeout=30):
+        FootprintIndex.__init__(self, path, timeout)
+
+        con = self.connection()
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS syncs (
+                Key             TEXT PRIMARY KEY,
+                Filter          TEXT NOT NULL,
+                PublicationDate TEXT,
+                Ids             TEXT NOT NULL,
+                Updated         TEXT NOT NULL
+            )""")
+        con.commit()
+
+
+    def columns(self, Product):
+        Attributes = product_attributes(Product)
+        Orbit = Attributes.get('relativeOrbitNumber')
+        return { 'Name'            : Product.get('Name'),
+                 'Tile'            : Attributes.get('tileId') or mgrs_tile(Product.get('Name')) or None,
+                 'RelativeOrbit'   : int(Orbit) if (Orbit is not None) else None,
+                 'ContentLength'   : Product.get('ContentLength'),
+                 'PublicationDate' : normalize_date(Product['PublicationDate']) if Product.get('PublicationDate') else None }
+
+
+    def sync_mark(self, flt):
+        """
+        Synchronization mark of the query with the $filter flt, to be
+        load()-ed.
+        """
+        return SyncMark(self, flt)
+
+
+class SyncMark(Watermark):
+    """
+    High-water mark of the publication dates of the products returned for
+    a query, kept in the table 'syncs' of the catalogue under a hash of the
+    normalized $filter instead of a JSON file.
+    """
+
+    def __init__(self, catalogue, flt):
+        self.catalogue = catalogue
+        self.filter = normalize_filter(flt)
+        Watermark.__init__(self, "", sha256(self.filter.encode()).hexdigest())
+
+
+    def load(self):
+        row = self.catalogue.connection().execute("SELECT PublicationDate, Ids FROM syncs WHERE Key = ?", (self.name,)).fetchone()
+        if (row is not None):
+            self.mark = row[0]
+            self.ids = set(json.loads(row[1]))
+
+
+    def save(self):
+        """
+        Write the mark. To be called only once all the products returned for
+        the query are stored in the catalogue.
+        """
+        con = self.catalogue.connection()
+        with con:
+            con.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?, ?)",
+                        (self.name, self.filter, self.mark, json.dumps(sorted(self.ids)),
+                         datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")))
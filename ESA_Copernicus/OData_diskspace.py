@@ -0,0 +1,212 @@
+#
+#  Free disk space checks, reservations and preallocation for the downloads
+#  of the OData scripts for the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/).
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: free space of a volume, reservations of space shared
+#         by the workers of a script and preallocation of files.
+#
+#
+#  Usage:
+#      from OData_diskspace import SpaceReserver, InsufficientSpaceError, preallocate
+#
+#      space = SpaceReserver(".", margin=2**30)
+#      with space.reserve(ContentLength, StopEvent) as reservation:
+#          with open("product.zip.part", 'wb') as f:
+#              if preallocate(f.fileno(), 0, ContentLength):
+#                  reservation.release()  # the blocks are now allocated
+#              ...
+#
+
+
+#  Load libraries
+import os
+import errno
+import ctypes
+import ctypes.util
+import threading
+
+
+###  BEGIN Define custom exceptions  ###
+
+class InsufficientSpaceError(OSError):
+    pass
+
+###  END Define custom exceptions  ###
+
+
+#  fallocate() of the C library, which can allocate blocks beyond the end of
+#  a file without changing its size (Linux only)
+FALLOC_FL_KEEP_SIZE = 0x01
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _fallocate = _libc.fallocate64
+    _fallocate.argtypes = [ ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64 ]
+    _fallocate.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError):
+    _fallocate = None
+
+
+def free_bytes(path="."):
+    """
+    Number of bytes available to unprivileged users on the volume holding
+    path.
+    """
+    st = os.statvfs(path)
+    return st.f_bavail * st.f_frsize
+
+
+def allocated_bytes(Filename):
+    """
+    Number of bytes of disk blocks allocated to a file, which is less than
+    its size for a sparse file and more if blocks were allocated beyond its
+    end. 0 if the file does not exist.
+    """
+    try:
+        return os.stat(Filename).st_blocks * 512
+    except FileNotFoundError:
+        return 0
+
+
+def preallocate(fd, offset, length, keep_size=False):
+    """
+    Allocate the disk blocks of the byte range [offset, offset + length) of
+    the file open as fd, so that the file is not fragmented as it is written
+    and a lack of space shows up at once. With keep_size, the size of the
+    file is left unchanged, so that it can still be appended to.
+
+    Returns False if the file system or the platform does not support it,
+    and raises InsufficientSpaceError if the volume is full.
+    """
+    if (length <= 0):
+        return True
+
+    try:
+        if keep_size:
+            if (_fallocate is None):
+                return False
+            if (_fallocate(fd, FALLOC_FL_KEEP_SIZE, offset, length) != 0):
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+        else:
+            if not hasattr(os, 'posix_fallocate'):
+                return False
+            os.posix_fallocate(fd, offset, length)
+
+    except OSError as err:
+        if (err.errno == errno.ENOSPC):
+            raise InsufficientSpaceError(errno.ENOSPC, "no space left to preallocate {:d} bytes".format(length))
+        if (err.errno in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL)):
+            return False
+        raise
+
+    return True
+
+
+class Reservation:
+    """
+    Bytes reserved on a volume by a SpaceReserver, until they are released.
+    Releasing it twice has no effect, so that it can be released as soon as
+    the space is allocated to the file and again when the download ends.
+    """
+
+    def __init__(self, reserver, nbytes):
+        self.reserver = reserver
+        self.nbytes = nbytes
+
+    def release(self):
+        if self.nbytes:
+            self.reserver.release(self.nbytes)
+            self.nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SpaceReserver:
+    """
+    Admission control of the downloads onto a volume, shared by the workers
+    of a script. Before it starts, a download reserves the bytes it still
+    has to allocate. The reservation is granted as long as the free space
+    of the volume, less the bytes reserved by the other downloads and a
+    safety margin, can hold it. Otherwise the download waits until other
+    reservations are released, at which point the space they were holding
+    shows up in the free space or is given back. If the download cannot fit
+    even though nothing else is reserved, InsufficientSpaceError is raised.
+
+    path : file or directory on the volume.
+    margin : number of bytes left free on the volume.
+    poll : number of seconds between checks of the free space while waiting,
+           since space may be freed by other programs.
+    """
+
+    def __init__(self, path=".", margin=0, poll=5.0):
+        self.path = path
+        self.margin = margin
+        self.poll = poll
+        self.reserved = 0
+        self.cond = threading.Condition()
+
+
+    def available(self):
+        """
+        Number of bytes which can still be reserved.
+        """
+        with self.cond:
+            return free_bytes(self.path) - self.margin - self.reserved
+
+
+    def reserve(self, nbytes, stop_event=None):
+        """
+        Reservation of nbytes on the volume, waiting for the reservations of
+        the other downloads if needed. Returns None if stop_event is set
+        while waiting.
+        """
+        nbytes = max(0, nbytes)
+
+        with self.cond:
+            while True:
+                if (stop_event is not None) and stop_event.is_set():
+                    return None
+
+                available = free_bytes(self.path) - self.margin - self.reserved
+                if (nbytes <= available):
+                    self.reserved += nbytes
+                    return Reservation(self, nbytes)
+
+                if (self.reserved == 0):
+                    raise InsufficientSpaceError(errno.ENOSPC,
+                                                 "{:d} bytes needed, {:d} bytes available on the volume of {:s}".format(
+                                                 nbytes, max(0, available), self.path))
+
+                self.cond.wait(self.poll)
+
+
+    def release(self, nbytes):
+        with self.cond:
+            self.reserved -= nbytes
+            self.cond.notify_all()
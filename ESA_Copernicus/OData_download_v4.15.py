@@ -0,0 +1,1469 @@
+#!/usr/bin/env python3
+#
+#  Script to download data from the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/).
+#  Version 4.15
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 02.03.2024
+#       * Initial script.
+#
+#  1.1: 03.03.2024
+#       * Loading token from file using the json library and parameterize the
+#         query request URL.
+#
+#  2.0: 08.03.2024
+#       * Refresh token on the fly during downloads.
+#
+#  2.1: 12.03.2024
+#       * Check MD5 checksum after downloading.
+#
+#  3.0: 16.03.2024
+#       * Separate query database and data download. From this version onwards,
+#         the OData_query script must be run first. The latter outputs the
+#         records to a log file and the OData_download script will only
+#         download data by reading this log file.
+#
+#  3.1: 18.03.2024
+#       * Handle errors and other issues as custom exceptions and ensure log
+#         file is updated even if an unknown error occurs.
+#
+#  4.0: 17.10.2026
+#       * Download several products concurrently using a pool of worker
+#         threads. The number of products in flight is set by params_Workers.
+#       * A 429 response (rate limiting) pauses all the workers together
+#         instead of each worker retrying on its own.
+#       * The log file is also written out when exiting on a session error.
+#
+#  4.1: 17.10.2026
+#       * Compute the MD5 checksum chunk by chunk while the data is being
+#         downloaded instead of reading the whole file back from disk. When
+#         a file has to be verified after an interruption, it is read in
+#         chunks so that memory use does not depend on the size of the file.
+#
+#  4.2: 17.10.2026
+#       * Download to a '.part' file which is renamed only after the MD5
+#         checksum is verified. An existing '.part' file is resumed with an
+#         HTTP Range request, the checksum being seeded with the bytes
+#         already on disk. Partial files are kept on interruption.
+#
+#  4.3: 17.10.2026
+#       * Optionally split the download of a product in params_Segments byte
+#         ranges fetched in parallel and written at their offsets into a
+#         preallocated file. Falls back to a single stream when the server
+#         does not accept Range requests.
+#
+#  4.4: 17.10.2026
+#       * Use one long-lived session with a pool of keep-alive connections for
+#         all the records instead of opening a new session per record. The
+#         Authorization header of the session is updated in place when the
+#         token is refreshed.
+#
+#  4.5: 17.10.2026
+#       * Refresh the token in-process through the TokenManager of OData_token
+#         instead of running curl. The access token is refreshed ahead of its
+#         expiry, and a new token is requested with the username and password
+#         (if set) once the refresh token has expired. Only one worker
+#         refreshes the token at a time.
+#
+#  4.6: 17.10.2026
+#       * Rate limiting and retries through the RateLimiter of OData_ratelimit:
+#         requests are spread out by a token bucket, a 429 pauses all workers
+#         for the time given by the Retry-After header, 5xx responses and
+#         connection errors are retried with exponential backoff up to
+#         params_RetryBudget times per record, and a circuit breaker pauses
+#         all workers when failures pile up instead of exiting.
+#       * Other error responses (e.g. 404) skip the record instead of ending
+#         the batch. Exit status 5 now means the server kept failing.
+#
+#  4.7: 17.10.2026
+#       * Optionally keep the state of the records in the SQLite job store of
+#         OData_jobstore (params_JobStore). Each change of state of a record
+#         (in progress, downloaded, failed) is committed as it happens, so
+#         that it survives a crash, and the log file is brought up to date
+#         from the store on the next run. The log file itself is now written
+#         under a temporary name and renamed.
+#
+#  4.8: 17.10.2026
+#       * Keep the MD5 checksum of each verified download in the hash cache of
+#         OData_hashing (params_HashCache). A record whose file is already on
+#         disk is checked against the cache, or hashed once if the file is not
+#         in it, and marked as downloaded without downloading it again.
+#
+#  4.9: 17.10.2026
+#       * Close the responses with an unexpected status. They were requested
+#         as streams, and each one kept a connection of the pool busy until
+#         all the workers were blocked waiting for a connection.
+#
+#  4.10: 17.10.2026
+#       * Metrics of the downloads through OData_metrics: bytes, throughput,
+#         time to first byte, duration and hashing time of each record,
+#         response status codes, token refreshes and their latency. They are
+#         appended as JSON-lines events to params_MetricsEvents and written
+#         to the Prometheus textfile params_MetricsTextfile after each record.
+#
+#  4.11: 17.10.2026
+#       * Check the free disk space before each download, using the
+#         'ContentLength' column of the log file. The workers reserve the
+#         bytes their download still needs (OData_diskspace), a download
+#         waiting while the space reserved by the others would overflow the
+#         volume. A product which cannot fit is left for a later run and the
+#         batch goes on with the next records.
+#       * Preallocate the partial files (fallocate) so that they are not
+#         fragmented and a full volume shows up before any byte is fetched.
+#
+#  4.12: 17.10.2026
+#       * Order of the downloads set by params_Schedule (OData_scheduler):
+#         smallest or newest products first, by a 'Priority' column added to
+#         the log file, or in turn over the MGRS tiles, instead of the order
+#         of the log file only.
+#
+#  4.13: 17.10.2026
+#       * Selective mode (params_Members): only the members of the archive
+#         of each product matching glob patterns, e.g. a few band files, are
+#         fetched with Range requests after reading the central directory of
+#         the archive (OData_remotezip), and decompressed into a directory
+#         named after the product.
+#
+#  4.14: 17.10.2026
+#       * The files selected by params_Members can also be downloaded one by
+#         one through the 'Nodes' of each product (params_MemberSource =
+#         "nodes"), several files at a time, each resuming from its partial
+#         file. The listings of the nodes are cached (OData_nodes), so that a
+#         second run does not walk the tree of the products again.
+#
+#  4.15: 17.10.2026
+#       * Optional store of products shared by the users of a file system
+#         (params_ProductStore, OData_store). A product found in the store,
+#         by its checksum or else by its Id, is linked into place
+#         instead of being downloaded (hard link, reflink or copy), and every
+#         verified download is published into the store.
+#       * Close the streamed responses however the download ends, also when
+#         the partial file was already complete (416) or the batch stops.
+#       * Option --export-log: write the log file back from the job store,
+#         e.g. after a crash, without downloading anything. The job store
+#         keeps the records of each log file apart (OData_jobstore 1.1).
+#       * Verify the downloads with the algorithm of the checksums given by
+#         the preamble of the log file (MD5 or BLAKE3, OData_query 2.7)
+#         instead of always with MD5. Log files without it hold MD5
+#         checksums.
+#       * An invalid params_MemberSource is reported with an error message
+#         and the exit status 9, instead of an exception.
+#       * A product is read-only before it appears in the product store. When
+#         it is published with a hard link, the message says that the
+#         downloaded file, being the same file, is now read-only too.
+#       * params_BreakerCooldown may be a fraction of a second, e.g. 0.5,
+#         without the message of the pause failing (OData_ratelimit 1.1).
+#       * Write the segments file as soon as the partial file of a segmented
+#         download is preallocated, and download again a partial file as
+#         large as the product which has no segments file, instead of
+#         resuming it as a single stream.
+#       * Count and time a token refresh only in the worker which made it,
+#         not in those which waited for it (OData_token 1.1).
+#       * The records of which only the files selected by params_Members
+#         were fetched, from the archive or through the nodes, are flagged
+#         in the column 'Extracted' of the log file (state 'extracted' of
+#         OData_jobstore 1.2) instead of 'Downloaded', which is kept for the
+#         whole archives verified against their checksum.
+#
+#
+#  Usage: ./OData_download_vx.x.py INPUTLOGFILE [--export-log]
+#
+#      --export-log : update INPUTLOGFILE from the job store (params_JobStore)
+#                     and exit.
+#
+#  Exit status:
+#      0      if OK,
+#      1      no argument was passed on the command line,
+#      2      cannot access log file passed to script,
+#      3      cannot access file containing token,
+#      4      could not refresh token on the fly,
+#      5      server kept failing although all workers paused several times
+#             (circuit breaker),
+#      6      error outside of exceptions handled in script,
+#      7      --export-log without a job store, or for a log file which
+#             was never imported into it,
+#      8      the checksums of the log file are of an unknown algorithm, or
+#             of one which cannot be computed here (BLAKE3 without the
+#             blake3 package),
+#      9      params_MemberSource is neither "zip" nor "nodes".
+#
+
+
+###  BEGIN Set Download Parameters  ###
+
+#  params_Workers : number of products downloaded concurrently. Setting it to
+#                   1 downloads the records one after the other as in
+#                   version 3.1.
+#  params_RateLimitWait : number of seconds during which all workers hold back
+#                         after the server has answered with status 429 without
+#                         a Retry-After header.
+#  params_RequestRate : average number of requests per second sent by all
+#                       workers together.
+#  params_RequestBurst : number of requests which can be sent at once before
+#                        params_RequestRate applies.
+#  params_RetryBudget : number of times the download of a record is retried
+#                       after a 5xx response or a connection error before the
+#                       record is skipped.
+#  params_BackoffBase : base in seconds of the exponential backoff between
+#                       retries (the wait before retry n is drawn between 0
+#                       and params_BackoffBase * 2^(n-1)).
+#  params_BackoffCap : maximum wait in seconds between retries.
+#  params_BreakerThreshold : number of consecutive failures, from any worker,
+#                            after which all workers pause.
+#  params_BreakerCooldown : number of seconds of such a pause.
+#  params_BreakerMaxTrips : number of pauses in a row, without any success in
+#                           between, after which the script gives up.
+#  params_ChunkSize : number of bytes handled at a time when writing data to
+#                     disk and computing the checksum.
+#  params_Segments : number of byte ranges of a single product downloaded in
+#                    parallel. Setting it to 1 downloads each product as a
+#                    single stream.
+#  params_MinSegmentSize : products smaller than params_Segments times this
+#                          number of bytes are downloaded as a single stream.
+#  params_NodeWorkers : number of files of a product downloaded in parallel
+#                       through its nodes (see params_MemberSource).
+#  params_PoolSize : maximum number of connections kept open to the server.
+#  params_Timeout : (connect, read) timeout in seconds of the HTTP requests.
+#  params_KeepAlive : keep connections open between requests.
+#  params_TokenMargin : number of seconds before its expiry at which the
+#                       access token is refreshed.
+#  params_JobStore : SQLite file in which the state of each record is stored
+#                    as soon as it changes. Leave empty to keep the state in
+#                    the log file only.
+#  params_HashCache : SQLite file caching the checksums of the files on disk,
+#                     shared with OData_verify. Leave empty to disable.
+#  params_MetricsEvents : JSON-lines file to which an event is appended for
+#                         each record, retry and token refresh. Leave empty
+#                         to disable.
+#  params_MetricsTextfile : file to which the metrics are written in the text
+#                           format of Prometheus, e.g. in the directory of
+#                           the textfile collector of the node exporter.
+#                           Leave empty to disable.
+#  params_FreeSpaceMargin : number of bytes always left free on the volume
+#                           receiving the downloads.
+#  params_Preallocate : allocate the disk blocks of each product before it
+#                       is downloaded.
+#  params_Schedule : order in which the records are downloaded, as a
+#                    comma-separated list of policies (see OData_scheduler):
+#                    "csv" (order of the log file), "smallest", "largest",
+#                    "newest", "oldest" (sensing date), "priority" (highest
+#                    value of a 'Priority' column first) and "tile" (one
+#                    record of each MGRS tile in turn), e.g. "newest,tile".
+#  params_Members : glob patterns of the files of the archives to extract
+#                   into a directory named after each product, e.g.
+#                   ["*_B04_10m.jp2", "*_B08_10m.jp2", "*_SCL_20m.jp2"],
+#                   instead of downloading the whole archives. Leave empty
+#                   to download the whole archives.
+#  params_MemberSource : how the files selected by params_Members are
+#                        fetched: "zip" (members of the archive read with
+#                        Range requests) or "nodes" (files of the product
+#                        listed and downloaded through its 'Nodes').
+#  params_NodeCacheDir : directory of the cache of the listings of nodes.
+#  params_NodeCacheTTL : number of seconds after which a cached listing is
+#                        stale.
+#  params_ProductStore : directory of the store of products shared with
+#                        other users and working directories (see
+#                        OData_store). Leave empty to disable.
+#  params_StoreLink : first way tried to link a product between the store
+#                     and the working directory: "hardlink", "reflink" (copy
+#                     on write) or "copy". The next ones are tried if it
+#                     cannot be used, e.g. across file systems. The files
+#                     of the store, hence their hard links, are read-only.
+#
+#  Username and password of the Copernicus Dataspace account (optional). They
+#  are only used to fetch a new token when the refresh token has expired.
+#
+
+##  Please set the following:
+
+params_Workers = 4
+params_RateLimitWait = 61
+params_RequestRate = 10
+params_RequestBurst = 20
+params_RetryBudget = 5
+params_BackoffBase = 2
+params_BackoffCap = 300
+params_BreakerThreshold = 10
+params_BreakerCooldown = 300
+params_BreakerMaxTrips = 3
+params_ChunkSize = 1048576
+params_Segments = 1
+params_MinSegmentSize = 16777216
+params_NodeWorkers = 4
+params_PoolSize = params_Workers * max(params_Segments, params_NodeWorkers)
+params_Timeout = (10, 120)
+params_KeepAlive = True
+params_TokenMargin = 60
+params_JobStore = ""
+params_HashCache = ".OData_hashes.sqlite"
+params_MetricsEvents = ""
+params_MetricsTextfile = ""
+params_FreeSpaceMargin = 1073741824
+params_Preallocate = True
+params_Schedule = "csv"
+params_Members = []
+params_MemberSource = "zip"
+params_NodeCacheDir = ".OData_nodes"
+params_NodeCacheTTL = 2592000
+params_ProductStore = ""
+params_StoreLink = "hardlink"
+
+Username = ""
+Password = ""
+
+###  END Set Download Parameters  ###
+
+
+#  Load libraries
+from sys import argv
+import os
+from os import replace
+import errno
+from os.path import isfile, getsize
+import json
+import subprocess
+import threading
+from time import time, perf_counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from OData_transport import PooledSession, ZIPPER_URL
+from OData_token import TokenManager, TokenRefreshError
+from OData_ratelimit import RateLimiter, CircuitOpenError
+from OData_logfile import read_log, write_log, checksum_algorithm
+from OData_jobstore import JobStore
+from OData_hashing import new_hash, hash_file, file_digest, HashCache
+from OData_metrics import Metrics, Transfer
+from OData_scheduler import schedule
+from OData_remotezip import RemoteZip, RemoteZipError, MemberIntegrityError
+from OData_nodes import product_url, walk_nodes, local_path
+from OData_cache import QueryCache
+from OData_diskspace import SpaceReserver, InsufficientSpaceError, preallocate, allocated_bytes, free_bytes
+from OData_store import ProductStore
+
+
+#  File containing token as a JSON record
+TokenFile = "CopernicusDataspace_token.json"
+
+
+###  BEGIN Parsing of command line arguments and load Token file  ###
+try:
+    # Check if there is an argument
+    if len(argv) <= 1:
+        raise OSError
+
+    # Check if the argument points to a file
+    if isfile(argv[1]):
+        LogFile = argv[1]
+    else:
+        raise FileNotFoundError
+
+except OSError:
+    print("Usage: {:s} ODATA_QUERY_LOG".format(argv[0]))
+    print("The file ODATA_QUERY_LOG is a log file output by the OData_query.py script.")
+    print("The basic format of this input file is CSV with a few lines for preamble")
+    print("where the database query parameters are specified.\n")
+    exit(1)
+except FileNotFoundError:
+    print("Cannot access {:s}!\n".format(argv[1]))
+    exit(2)
+
+# Source of the files of the selective mode
+if params_Members and (params_MemberSource not in ("zip", "nodes")):
+    print("***  Error: params_MemberSource must be \"zip\" or \"nodes\", not \"{:s}\".\n".format(str(params_MemberSource)))
+    exit(9)
+
+# Bring the log file up to date from the job store, without downloading
+if "--export-log" in argv[2:]:
+    try:
+        if not params_JobStore:
+            raise KeyError("--export-log needs a job store, params_JobStore")
+        JobStore(params_JobStore).export_log(LogFile)
+    except KeyError as err:
+        print("***  Error: {:s}\n".format(err.args[0]))
+        exit(7)
+
+    print("Log file {:s} written from the job store {:s}.\n".format(LogFile, params_JobStore))
+    exit(0)
+
+# Token file
+try:
+    # Long-lived session shared by all the workers, authorized with the token
+    session = PooledSession(pool_size=params_PoolSize, timeout=params_Timeout, keepalive=params_KeepAlive)
+
+    tokens = TokenManager(session, TokenFile, Username, Password, margin=params_TokenMargin)
+    tokens.load()
+
+except FileNotFoundError:
+    print("Cannot access token file '{:s}'".format(TokenFile))
+    exit(3)
+
+###  END Parsing of command line arguments and load Token file  ###
+
+
+###  BEGIN Define custom exceptions  ###
+
+class ChecksumError(Exception):
+    pass
+
+class TokenExpiredError(Exception):
+    pass
+
+class RateLimitError(Exception):
+    pass
+
+class SessionError(Exception):
+    pass
+
+class ServerError(Exception):
+    pass
+
+class DownloadInterrupted(Exception):
+    pass
+
+class SegmentError(Exception):
+    pass
+
+class SelectionError(Exception):
+    pass
+
+###  END Define custom exceptions  ###
+
+
+###  BEGIN Open log file, parse header and load records in dataframe  ###
+
+#  With a job store, the records of the log file are merged into the store
+#  and the 'Downloaded' flags are taken from the store, which may be ahead of
+#  the log file if the last run did not exit cleanly.
+if params_JobStore:
+    store = JobStore(params_JobStore)
+    log_hdr, log_df = store.import_log(LogFile)
+else:
+    store = None
+    log_hdr, log_df = read_log(LogFile)
+
+#  Algorithm of the checksums of the records, given by the preamble
+ChecksumAlgorithm = checksum_algorithm(log_hdr)
+try:
+    new_hash(ChecksumAlgorithm)
+except ValueError as err:
+    print("***  Error: cannot verify the checksums of {:s}: {:s}\n".format(LogFile, str(err)))
+    exit(8)
+
+#  In selective mode, the records whose files were fetched are flagged in a
+#  column of their own, 'Downloaded' being left to the whole archives
+#  verified against their checksum
+if params_Members:
+    log_df['Extracted'] = (log_df['Extracted'] == True) if ('Extracted' in log_df.columns) else False
+
+###  END Open log file, parse header and load records in dataframe  ###
+
+
+
+###  BEGIN State shared between the download workers  ###
+
+#  Serialize updates to log_df
+LogLock = threading.Lock()
+
+#  Request budget, pauses and retry policy common to all workers
+limiter = RateLimiter(rate=params_RequestRate,
+                      burst=params_RequestBurst,
+                      default_wait=params_RateLimitWait,
+                      backoff_base=params_BackoffBase,
+                      backoff_cap=params_BackoffCap,
+                      breaker_threshold=params_BreakerThreshold,
+                      breaker_cooldown=params_BreakerCooldown,
+                      breaker_max_trips=params_BreakerMaxTrips)
+
+#  Errors worth retrying: 5xx responses, connections reset or timed out and
+#  segments or archive members cut short
+TransientErrors = ( ServerError,
+                    SegmentError,
+                    MemberIntegrityError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError )
+
+#  Set when the batch has to stop, workers give up as soon as they see it
+StopEvent = threading.Event()
+
+#  Records currently being written to disk: RecordIdx -> (PartFile, Checksum)
+InFlightLock = threading.Lock()
+InFlight = {}
+
+#  Checksums of the files on disk
+hashes = HashCache(params_HashCache) if params_HashCache else None
+
+#  Bytes reserved on the volume receiving the downloads (the current
+#  directory) by the downloads in flight
+space = SpaceReserver(".", margin=params_FreeSpaceMargin)
+
+#  Listings of the nodes of the products, which do not change
+node_cache = None
+if params_Members and (params_MemberSource == "nodes"):
+    node_cache = QueryCache(params_NodeCacheDir, ttl=params_NodeCacheTTL)
+
+#  Products shared with other working directories
+products = ProductStore(params_ProductStore, params_StoreLink, ChecksumAlgorithm) if params_ProductStore else None
+
+#  Measurements of the downloads
+metrics = Metrics(params_MetricsEvents, params_MetricsTextfile)
+metrics.set("odata_batch_start_timestamp_seconds", time())
+
+###  END State shared between the download workers  ###
+
+
+
+###  BEGIN Functions used by the download workers  ###
+
+def checksum_file(Filename):
+    """
+    Hash object of the algorithm of the log file fed with the content of a
+    file on disk, read params_ChunkSize bytes at a time. The object can be
+    updated further, e.g. with the bytes of a resumed download.
+    """
+    return hash_file(Filename, ChecksumAlgorithm, params_ChunkSize)
+
+
+def timed_checksum_file(Filename, transfer):
+    """
+    checksum_file(), the time spent being added to the measurements of the
+    transfer.
+    """
+    start = perf_counter()
+    file_hash = checksum_file(Filename)
+    transfer.hashed(perf_counter() - start)
+
+    return file_hash
+
+
+def cached_checksum(Filename):
+    """
+    Checksum of a complete file, taken from the hash cache if the file
+    did not change since it was last hashed.
+    """
+    if (hashes is None):
+        return file_digest(Filename, ChecksumAlgorithm, params_ChunkSize)
+    return hashes.digest(Filename, ChecksumAlgorithm, params_ChunkSize)
+
+
+def content_length(RecordIdx):
+    """
+    Size in bytes of the product of a record according to the catalogue,
+    None if the log file has no 'ContentLength' column or no value for it.
+    """
+    if ('ContentLength' not in log_df.columns):
+        return None
+
+    try:
+        return int(log_df.loc[RecordIdx, 'ContentLength'])
+    except (TypeError, ValueError):
+        return None
+
+
+def response_size(session_res):
+    """
+    Size in bytes of the whole product according to the headers of a
+    response with status 200 or 206, None if they do not tell.
+    """
+    if (session_res.status_code == 206):
+        TotalSize = session_res.headers.get("Content-Range", "").rpartition("/")[2]
+    else:
+        TotalSize = session_res.headers.get("Content-Length", "")
+
+    return int(TotalSize) if TotalSize.isdigit() else None
+
+
+def preallocate_part(fd, Offset, TotalSize, reservation, keep_size):
+    """
+    Allocate the blocks of the file open as fd from Offset to TotalSize if
+    params_Preallocate is set. Once they are allocated, they are counted in
+    the free space of the volume, so the reservation is released. Returns
+    True if the blocks were allocated.
+    """
+    if not params_Preallocate or (TotalSize is None):
+        return False
+
+    if not preallocate(fd, Offset, TotalSize - Offset, keep_size=keep_size):
+        return False
+
+    reservation.release()
+    return True
+
+
+def mark_downloaded(RecordIdx):
+    """
+    Set the 'Downloaded' flag of a record in the log dataframe.
+    """
+    with LogLock:
+        log_df.loc[RecordIdx, 'Downloaded'] = True
+
+
+def mark_extracted(RecordIdx):
+    """
+    Set the 'Extracted' flag of a record in the log dataframe.
+    """
+    with LogLock:
+        log_df.loc[RecordIdx, 'Extracted'] = True
+
+
+def set_state(RecordId, State, **fields):
+    """
+    Commit the new state of a record to the job store, if there is one.
+    """
+    if (store is not None):
+        store.mark(RecordId, State, **fields)
+
+
+def refresh_token(expired_auth=None):
+    """
+    Refresh the access token, either ahead of its expiry (expired_auth is
+    None) or after a 401. In the latter case the Authorization header used
+    for the failed request is passed in so that, when several workers hit a
+    401 at the same time, only the first one actually requests a new token.
+    """
+    if (expired_auth is not None):
+        print("\nAccess token expired (response status code = 401)")
+        print("Attempting to refresh the token ...")
+
+    start = perf_counter()
+    try:
+        refreshed = tokens.refresh(expired_auth)
+
+    except TokenRefreshError as err:
+        metrics.inc("odata_token_refreshes_total", result="error")
+        metrics.event("token_refresh", result="error", error=str(err), seconds=perf_counter() - start)
+        metrics.write_textfile()
+
+        print("\n***  Error: {:s}".format(str(err)))
+        print("***  Please resolve the issue and re-run the script.")
+        raise
+
+    # Nothing to measure if another worker refreshed the token meanwhile
+    if refreshed:
+        seconds = perf_counter() - start
+        metrics.inc("odata_token_refreshes_total", result="ok")
+        metrics.observe("odata_token_refresh_duration_seconds", seconds)
+        metrics.event("token_refresh", result="ok", seconds=seconds, after_401=(expired_auth is not None))
+
+
+def get(url_data, transfer=None, **kwargs):
+    """
+    Send a GET request through the shared session once the rate limiter lets
+    it through. Responses other than 429 and 5xx reset the circuit breaker.
+    If the request is for the data of a record, its Transfer is given to
+    measure the time to first byte.
+    """
+    limiter.acquire(StopEvent)
+    if StopEvent.is_set():
+        raise DownloadInterrupted
+
+    if (transfer is not None):
+        transfer.requested()
+
+    session_res = session.get(url_data, **kwargs)
+    metrics.inc("odata_responses_total", status=str(session_res.status_code))
+    if (session_res.status_code != 429) and (session_res.status_code < 500):
+        limiter.record_success()
+
+    return session_res
+
+
+def check_status(RecordIdx, session_res):
+    """
+    Raise the exception corresponding to an unexpected response status.
+    The response is closed first, so that its connection goes back to the
+    pool.
+    """
+    session_res.close()
+
+    if (session_res.status_code == 401):  # token expired
+        raise TokenExpiredError
+
+    elif (session_res.status_code == 429):  # Rate limiting
+        raise RateLimitError(session_res.headers.get("Retry-After"))
+
+    else:
+        print("\n[{:3d}] Session response status_code: {:d}".format(RecordIdx, session_res.status_code))
+        print("[{:3d}] Session response reason: {:s}".format(RecordIdx, session_res.reason))
+        if (session_res.status_code >= 500):
+            raise ServerError
+        raise SessionError
+
+
+def probe_size(RecordIdx, url_data):
+    """
+    Ask for the first byte of the product to find out whether the server
+    accepts Range requests. Returns the size of the product in bytes if it
+    does, None otherwise.
+    """
+    session_res = get(url_data, headers={ "Range" : "bytes=0-0" }, stream=True)
+    session_res.close()
+
+    if (session_res.status_code == 206):
+        # Content-Range: bytes 0-0/TOTAL
+        TotalSize = session_res.headers.get("Content-Range", "").rpartition("/")[2]
+        if TotalSize.isdigit():
+            return int(TotalSize)
+        return None
+
+    elif (session_res.status_code == 200):
+        return None
+
+    else:
+        check_status(RecordIdx, session_res)
+
+
+def download_single(RecordIdx, url_data, PartFile, TotalSize, reservation, transfer):
+    """
+    Download the product as a single stream into PartFile and return the
+    hash object computed on the fly. If PartFile already exists, the
+    download resumes from its end. The blocks of the rest of the product
+    (TotalSize bytes, or the size given by the server if None) are
+    preallocated without changing the size of PartFile, which is appended
+    to.
+    """
+
+    # Resume from the end of the partial file if there is one. The
+    # checksum is seeded with the bytes already on disk.
+    if isfile(PartFile):
+        Offset = getsize(PartFile)
+        file_hash = timed_checksum_file(PartFile, transfer)
+        range_hdrs = { "Range" : "bytes={:d}-".format(Offset) }
+    else:
+        Offset = 0
+        file_hash = new_hash(ChecksumAlgorithm)
+        range_hdrs = {}
+
+    # The response is closed however the download ends, so that its
+    # connection goes back to the pool
+    with get(url_data, transfer=transfer, headers=range_hdrs, stream=True) as session_res:
+
+        # 416: the partial file already holds every byte of the product
+        if (session_res.status_code == 416):
+            print("\n[{:3d}] Partial file {:s} is already complete.".format(RecordIdx, PartFile))
+            return file_hash
+
+        # 206: append to the partial file, 200: the server sent the whole
+        # product so start again from byte zero
+        if (session_res.status_code == 206):
+            print("\n[{:3d}] Resuming download of {:s} from byte {:d} ...".format(RecordIdx, PartFile, Offset))
+            mode = 'ab'
+        elif (session_res.status_code == 200):
+            print("\n[{:3d}] Downloading {:s} ...".format(RecordIdx, PartFile))
+            file_hash = new_hash(ChecksumAlgorithm)
+            mode = 'wb'
+        else:
+            check_status(RecordIdx, session_res)
+
+        if (TotalSize is None):
+            TotalSize = response_size(session_res)
+
+        # The checksum is updated as the bytes arrive
+        with open(PartFile, mode) as f:
+            preallocate_part(f.fileno(), f.tell(), TotalSize, reservation, keep_size=True)
+
+            for chunk in session_res.iter_content(chunk_size=params_ChunkSize):
+                if StopEvent.is_set():
+                    raise DownloadInterrupted
+                if chunk:
+                    transfer.received(len(chunk))
+                    f.write(chunk)
+
+                    start = perf_counter()
+                    file_hash.update(chunk)
+                    transfer.hashed(perf_counter() - start)
+
+    return file_hash
+
+
+def fetch_segment(RecordIdx, url_data, fd, Segment, transfer):
+    """
+    Download the byte range [Segment[0], Segment[1]] of the product and
+    write it at the same offset in the file open as fd.
+    """
+    with get(url_data, transfer=transfer, headers={ "Range" : "bytes={:d}-{:d}".format(Segment[0], Segment[1]) }, stream=True) as session_res:
+        if (session_res.status_code != 206):
+            check_status(RecordIdx, session_res)
+
+        Position = Segment[0]
+        for chunk in session_res.iter_content(chunk_size=params_ChunkSize):
+            if StopEvent.is_set():
+                raise DownloadInterrupted
+            if chunk:
+                transfer.received(len(chunk))
+                os.pwrite(fd, chunk, Position)
+                Position += len(chunk)
+
+    if (Position != Segment[1] + 1):
+        raise SegmentError
+
+
+def download_segmented(RecordIdx, url_data, PartFile, TotalSize, reservation, transfer):
+    """
+    Download the product as params_Segments byte ranges fetched in parallel
+    and written at their offsets into PartFile, which is preallocated to
+    the size of the product. The segments already completed are recorded
+    in PartFile + ".segments" so that an interrupted download only fetches
+    the missing ones. Returns the hash object of the complete file.
+    """
+    SegFile = PartFile + ".segments"
+
+    def write_segments():
+        with open(SegFile + ".tmp", 'w') as f:
+            json.dump({ "size" : TotalSize, "segments" : Segments }, f)
+        replace(SegFile + ".tmp", SegFile)
+
+    if isfile(SegFile) and isfile(PartFile):
+        with open(SegFile) as f:
+            Segments = json.load(f)['segments']
+        print("\n[{:3d}] Resuming segmented download of {:s} ...".format(RecordIdx, PartFile))
+
+    else:
+        # Split the product in params_Segments ranges of (nearly) equal size
+        Bounds = [ (TotalSize * i) // params_Segments for i in range(params_Segments + 1) ]
+        Segments = [ [Bounds[i], Bounds[i+1] - 1, False] for i in range(params_Segments) if Bounds[i+1] > Bounds[i] ]
+
+        # Preallocate file, or at least set its size if the blocks cannot
+        # be allocated
+        try:
+            with open(PartFile, 'wb') as f:
+                if not preallocate_part(f.fileno(), 0, TotalSize, reservation, keep_size=False):
+                    f.truncate(TotalSize)
+        except InsufficientSpaceError:
+            os.remove(PartFile)
+            raise
+
+        # The segments file goes with the preallocated file from the start,
+        # so that a retry never takes the file for a single stream download
+        write_segments()
+
+        print("\n[{:3d}] Downloading {:s} in {:d} segments ...".format(RecordIdx, PartFile, len(Segments)))
+
+    SegLock = threading.Lock()
+
+    def run_segment(Segment):
+        fetch_segment(RecordIdx, url_data, fd, Segment, transfer)
+
+        # Record completed segment
+        with SegLock:
+            Segment[2] = True
+            write_segments()
+
+    fd = os.open(PartFile, os.O_WRONLY)
+    try:
+        with ThreadPoolExecutor(max_workers=params_Segments) as seg_pool:
+            seg_futures = [ seg_pool.submit(run_segment, Segment) for Segment in Segments if not Segment[2] ]
+            for fut in seg_futures:
+                fut.result()
+    finally:
+        os.close(fd)
+
+    # The segments arrive out of order, so the checksum is computed on the
+    # complete file
+    file_hash = timed_checksum_file(PartFile, transfer)
+    os.remove(SegFile)
+
+    return file_hash
+
+
+def fetch_range(RecordIdx, url_data, transfer):
+    """
+    Function returning the chunks of the bytes start to end (inclusive) of
+    the product, as needed by RemoteZip.
+    """
+    def fetch(start, end):
+        session_res = get(url_data, transfer=transfer, headers={ "Range" : "bytes={:d}-{:d}".format(start, end) }, stream=True)
+        if (session_res.status_code != 206):
+            check_status(RecordIdx, session_res)
+
+        try:
+            for chunk in session_res.iter_content(chunk_size=params_ChunkSize):
+                if StopEvent.is_set():
+                    raise DownloadInterrupted
+                if chunk:
+                    transfer.received(len(chunk))
+                    yield chunk
+        finally:
+            session_res.close()
+
+    return fetch
+
+
+def extract_members(RecordIdx, url_data, ProductDir, TotalSize, transfer):
+    """
+    Extract the members of the archive of the product which match
+    params_Members into ProductDir. Only the central directory of the
+    archive and the selected members are fetched. The members already
+    extracted by a previous run are not fetched again. Returns the number
+    of bytes of the members.
+    """
+    if (TotalSize is None):
+        TotalSize = probe_size(RecordIdx, url_data)
+        if (TotalSize is None):
+            print("\n[{:3d}] ***  Server does not accept Range requests, cannot extract members.".format(RecordIdx))
+            raise SessionError
+
+    archive = RemoteZip(fetch_range(RecordIdx, url_data, transfer), TotalSize)
+    Members = archive.select(params_Members)
+    if (len(Members) == 0):
+        raise SelectionError("no member of the archive matches {:s}".format(str(params_Members)))
+
+    Pending = [ member for member in Members if not archive.extracted(member, archive.member_path(member, ProductDir)) ]
+    print("\n[{:3d}] Extracting {:d} of {:d} matching member(s) into {:s} ...".format(RecordIdx, len(Pending), len(Members), ProductDir))
+
+    reservation = space.reserve(sum(member.usize for member in Pending), StopEvent)
+    if (reservation is None):
+        raise DownloadInterrupted
+
+    with reservation:
+        for member in Pending:
+            if StopEvent.is_set():
+                raise DownloadInterrupted
+
+            print("[{:3d}] {:s} ({:.1f} MB)".format(RecordIdx, member.name, member.usize / 1e6))
+            archive.extract(member, archive.member_path(member, ProductDir))
+
+    return sum(member.usize for member in Members)
+
+
+def list_nodes(RecordIdx, url):
+    """
+    JSON listing of the nodes at url, from the cache if it holds it.
+    """
+    listing = node_cache.get(url)
+    if (listing is None):
+        session_res = get(url)
+        if (session_res.status_code != 200):
+            check_status(RecordIdx, session_res)
+
+        listing = session_res.json()
+        node_cache.put(url, None, listing)
+
+    return listing
+
+
+def download_node(RecordIdx, node, Filename, transfer):
+    """
+    Download a file of a product through its node into Filename + ".part",
+    resuming from the end of the partial file if there is one, and rename
+    it to Filename once it has the size given by the listing.
+    """
+    PartFile = Filename + ".part"
+    if isfile(PartFile):
+        Offset = getsize(PartFile)
+        range_hdrs = { "Range" : "bytes={:d}-".format(Offset) }
+    else:
+        Offset = 0
+        range_hdrs = {}
+
+    with get(node.url + "/$value", transfer=transfer, headers=range_hdrs, stream=True) as session_res:
+
+        # 416: the partial file is already complete, 200: the server sent
+        # the whole file
+        if (session_res.status_code == 416):
+            mode = None
+        elif (session_res.status_code == 206):
+            mode = 'ab'
+        elif (session_res.status_code == 200):
+            mode = 'wb'
+        else:
+            check_status(RecordIdx, session_res)
+
+        if (mode is not None):
+            with open(PartFile, mode) as f:
+                for chunk in session_res.iter_content(chunk_size=params_ChunkSize):
+                    if StopEvent.is_set():
+                        raise DownloadInterrupted
+                    if chunk:
+                        transfer.received(len(chunk))
+                        f.write(chunk)
+
+    # A file cut short is resumed on the next attempt
+    if (getsize(PartFile) != node.size):
+        raise SegmentError
+
+    replace(PartFile, Filename)
+
+
+def fetch_nodes(RecordIdx, RecordId, ProductDir, transfer):
+    """
+    Download the files of the product which match params_Members into
+    ProductDir, params_NodeWorkers at a time, after walking the nodes of the
+    product. The files already downloaded by a previous run are not fetched
+    again. Returns the number of bytes of the files.
+    """
+    Files = walk_nodes(lambda url: list_nodes(RecordIdx, url), product_url(ZIPPER_URL, RecordId), params_Members)
+    if (len(Files) == 0):
+        raise SelectionError("no file of the product matches {:s}".format(str(params_Members)))
+
+    Pending = [ node for node in Files
+                if not (isfile(local_path(node.path, ProductDir)) and (getsize(local_path(node.path, ProductDir)) == node.size)) ]
+    print("\n[{:3d}] Downloading {:d} of {:d} matching file(s) into {:s} ...".format(RecordIdx, len(Pending), len(Files), ProductDir))
+
+    reservation = space.reserve(sum(node.size - allocated_bytes(local_path(node.path, ProductDir) + ".part") for node in Pending), StopEvent)
+    if (reservation is None):
+        raise DownloadInterrupted
+
+    def run_node(node):
+        Filename = local_path(node.path, ProductDir)
+        os.makedirs(os.path.dirname(Filename), exist_ok=True)
+        print("[{:3d}] {:s} ({:.1f} MB)".format(RecordIdx, node.path, node.size / 1e6))
+        download_node(RecordIdx, node, Filename, transfer)
+
+    with reservation:
+        with ThreadPoolExecutor(max_workers=params_NodeWorkers) as node_pool:
+            node_futures = [ node_pool.submit(run_node, node) for node in Pending ]
+            for fut in node_futures:
+                fut.result()
+
+    return sum(node.size for node in Files)
+
+
+def report_download(RecordIdx, RecordId, transfer, result, Attempts):
+    """
+    Add the measurements of a record which is dealt with to the metrics,
+    append its event and write the textfile.
+    """
+    seconds = transfer.elapsed()
+
+    metrics.inc("odata_downloads_total", result=result)
+    metrics.inc("odata_download_bytes_total", transfer.bytes)
+    metrics.observe("odata_download_duration_seconds", seconds)
+    metrics.observe("odata_hash_duration_seconds", transfer.hash_seconds)
+    if (transfer.ttfb is not None):
+        metrics.observe("odata_download_ttfb_seconds", transfer.ttfb)
+
+    if (result == "downloaded"):
+        metrics.set("odata_last_download_timestamp_seconds", time())
+        metrics.set("odata_last_download_bytes_per_second", transfer.bytes / seconds)
+
+    with InFlightLock:
+        metrics.set("odata_downloads_in_flight", len(InFlight))
+
+    metrics.event("download",
+                  record=RecordIdx,
+                  id=RecordId,
+                  result=result,
+                  bytes=transfer.bytes,
+                  seconds=seconds,
+                  MBps=transfer.bytes / 1e6 / seconds,
+                  ttfb=transfer.ttfb,
+                  hash_seconds=transfer.hash_seconds,
+                  retries=Attempts)
+    metrics.write_textfile()
+
+
+def download_record(RecordIdx, RecordId, OutFile, Checksum, ContentLength):
+    """
+    Download the data product of one record, verify its checksum and
+    update the log dataframe. This runs in a worker thread and returns once
+    the record is dealt with. TokenRefreshError and CircuitOpenError are
+    passed on to the main thread since they stop the whole batch.
+
+    The bytes are written to OutFile + ".part", which is renamed to OutFile
+    only once the checksum is verified. If a partial file is found from a
+    previous run, the download resumes where it stopped. The space still
+    needed on disk, according to ContentLength (size of the product in the
+    catalogue, None if unknown), is reserved before the download starts.
+    """
+
+    print("\n------------------------------------------------------------------------------")
+    print("#  Working on record with index {:3d}".format(RecordIdx))
+    print("#  {:s}".format(RecordId))
+    print("#  {:s}".format(OutFile))
+
+    # Build URL for data product
+    url_data = ZIPPER_URL + "/Products({:s})/$value".format(RecordId)
+
+    # File receiving the bytes until the download is verified
+    PartFile = OutFile + ".part"
+    SegFile = PartFile + ".segments"
+
+    # Number of retries after transient errors
+    Attempts = 0
+
+    # Bytes, timings and hashing time of the record
+    transfer = Transfer()
+
+    # A file left by an earlier run whose log file was not updated is not
+    # downloaded again if it matches the checksum
+    if isfile(OutFile) and (Checksum != "--------------------------------"):
+        start = perf_counter()
+        Digest = cached_checksum(OutFile)
+        transfer.hashed(perf_counter() - start)
+
+        if (Digest == Checksum):
+            print("[{:3d}] {:s} is already on disk and matches {:s} from query record.".format(RecordIdx, OutFile, ChecksumAlgorithm))
+            mark_downloaded(RecordIdx)
+            set_state(RecordId, "downloaded", Bytes=getsize(OutFile), Digest=Checksum)
+            report_download(RecordIdx, RecordId, transfer, "on_disk", Attempts)
+            return
+
+    # A product already in the store is linked into place instead of being
+    # downloaded. The store only holds verified products.
+    if (products is not None) and not params_Members:
+        StoreChecksum = Checksum if (Checksum != "--------------------------------") else None
+        try:
+            method = products.fetch(RecordId, StoreChecksum, OutFile, ContentLength)
+        except OSError as err:
+            print("[{:3d}] ***  Cannot take {:s} from the product store: {:s}".format(RecordIdx, OutFile, str(err)))
+            method = None
+
+        if (method is not None):
+            print("[{:3d}] {:s} taken from the product store ({:s}).".format(RecordIdx, OutFile, method))
+            mark_downloaded(RecordIdx)
+            if (hashes is not None) and (StoreChecksum is not None):
+                hashes.put(OutFile, ChecksumAlgorithm, StoreChecksum)
+            set_state(RecordId, "downloaded", Bytes=getsize(OutFile), Digest=StoreChecksum)
+            report_download(RecordIdx, RecordId, transfer, "from_store", Attempts)
+            return
+
+    while True:
+        if StopEvent.is_set():
+            return
+
+        # Refresh the token ahead of its expiry. The header used for this
+        # request is kept, to be compared in refresh_token() after a 401.
+        if tokens.access_expired():
+            refresh_token()
+        req_auth = session.authorization()
+
+        try:
+            with InFlightLock:
+                InFlight[RecordIdx] = (PartFile, Checksum)
+
+            set_state(RecordId, "in-progress", attempt=True)
+
+            # Selective mode: fetch some files of the product into a
+            # directory named after the product
+            if params_Members:
+                if (params_MemberSource == "nodes"):
+                    Bytes = fetch_nodes(RecordIdx, RecordId, os.path.splitext(OutFile)[0], transfer)
+                    print("[{:3d}] Files downloaded and checked against their sizes. Updating log dataframe ...".format(RecordIdx))
+                else:
+                    Bytes = extract_members(RecordIdx, url_data, os.path.splitext(OutFile)[0], ContentLength, transfer)
+                    print("[{:3d}] Members extracted and checked against their CRC-32. Updating log dataframe ...".format(RecordIdx))
+
+                mark_extracted(RecordIdx)
+                set_state(RecordId, "extracted", Bytes=Bytes)
+
+                with InFlightLock:
+                    del InFlight[RecordIdx]
+
+                report_download(RecordIdx, RecordId, transfer, "extracted", Attempts)
+                return
+
+
+            ###  BEGIN Download file and write bytes to file  ###
+
+            # Split the download in segments if asked to and if the server
+            # accepts Range requests. A partial file left by a single stream
+            # download is resumed as a single stream.
+            TotalSize = None
+            Probed = False
+
+            # A partial file as large as the product without a segments
+            # file is the preallocated file of a segmented download which
+            # did not record any segment: its bytes may be zeros, so it is
+            # not resumed but downloaded again
+            if isfile(PartFile) and not isfile(SegFile):
+                ProbedSize = probe_size(RecordIdx, url_data)
+                Probed = True
+                if (ProbedSize is not None) and (getsize(PartFile) == ProbedSize):
+                    print("\n[{:3d}] Partial file {:s} has the size of the product but no segments file, starting again.".format(RecordIdx, PartFile))
+                    os.remove(PartFile)
+
+            if isfile(SegFile) and isfile(PartFile):
+                with open(SegFile) as f:
+                    TotalSize = json.load(f)['size']
+            elif (params_Segments > 1) and not isfile(PartFile):
+                TotalSize = ProbedSize if Probed else probe_size(RecordIdx, url_data)
+                if (TotalSize is None):
+                    print("\n[{:3d}] Server does not accept Range requests, falling back to a single stream.".format(RecordIdx))
+                elif (TotalSize < params_Segments * params_MinSegmentSize):
+                    TotalSize = None
+
+            # Wait until the bytes not yet allocated to the partial file fit
+            # on the volume next to those reserved by the other workers
+            Size = ContentLength if (ContentLength is not None) else TotalSize
+            Needed = 0 if (Size is None) else Size - allocated_bytes(PartFile)
+
+            reservation = space.reserve(Needed, StopEvent)
+            if (reservation is None):
+                raise DownloadInterrupted
+
+            with reservation:
+                if (TotalSize is None):
+                    file_hash = download_single(RecordIdx, url_data, PartFile, Size, reservation, transfer)
+                else:
+                    file_hash = download_segmented(RecordIdx, url_data, PartFile, TotalSize, reservation, transfer)
+
+            ###  END Download file and write bytes to file  ###
+
+
+            ###  BEGIN Verify download using checksum  ###
+
+            # If checksum is not available, move on else, check
+            if (Checksum == "--------------------------------"):
+                print("[{:3d}] **  Cannot verify data integrity since {:s} not available for this record.".format(RecordIdx, ChecksumAlgorithm))
+                print("[{:3d}] Marking as \'Downloaded\' and moving on.".format(RecordIdx))
+            else:
+                print("[{:3d}] Verifying {:s} checksum of download ...".format(RecordIdx, ChecksumAlgorithm))
+                Digest = file_hash.hexdigest()
+                print("[{:3d}] {:s} checksum = {:s}".format(RecordIdx, ChecksumAlgorithm, Digest))
+
+                # If checksums do not match the one in the record, delete the bytes downloaded
+                if (Digest != Checksum):
+                    raise ChecksumError
+
+                else:  # if everything OK
+                    print("[{:3d}] Checksum matches {:s} from query record. Updating log dataframe ...".format(RecordIdx, ChecksumAlgorithm))
+
+            ###  END Verify download using checksum  ###
+
+            replace(PartFile, OutFile)
+            mark_downloaded(RecordIdx)
+            if (hashes is not None):
+                hashes.put(OutFile, ChecksumAlgorithm, file_hash.hexdigest())
+            set_state(RecordId, "downloaded", Bytes=getsize(OutFile), Digest=file_hash.hexdigest())
+
+            # Share the verified product with the other working directories.
+            # The download itself is done whether or not this works.
+            if (products is not None) and (Checksum != "--------------------------------"):
+                try:
+                    method = products.publish(OutFile, RecordId, Checksum)
+                    if (method == "hardlink"):
+                        print("[{:3d}] Published to the product store, hard linked: {:s} is now read-only.".format(RecordIdx, OutFile))
+                    elif (method is not None):
+                        print("[{:3d}] Published to the product store ({:s}).".format(RecordIdx, method))
+                except OSError as err:
+                    print("[{:3d}] ***  Cannot publish {:s} to the product store: {:s}".format(RecordIdx, OutFile, str(err)))
+
+            with InFlightLock:
+                del InFlight[RecordIdx]
+
+            report_download(RecordIdx, RecordId, transfer, "downloaded", Attempts)
+            return
+
+        except ChecksumError:
+            print("\n[{:3d}] ***  Checksum does not match {:s} from query record!".format(RecordIdx, ChecksumAlgorithm))
+            print("[{:3d}] ***  Error in downloading and/or writing file to disk!".format(RecordIdx))
+            print("[{:3d}] ***  Deleting downloaded data for this record and skipping it ...".format(RecordIdx))
+
+            rm_res = subprocess.run(['rm', PartFile])
+            if (rm_res.returncode != 0):  # if rm command returns error
+                print("\nrm {:s}".format(PartFile))
+                print("Return code: {:d}".format(rm_res.returncode))
+
+            set_state(RecordId, "failed", Bytes=0, Digest=Digest)
+
+            with InFlightLock:
+                del InFlight[RecordIdx]
+
+            report_download(RecordIdx, RecordId, transfer, "checksum_mismatch", Attempts)
+            return
+
+        except TokenExpiredError:
+            refresh_token(req_auth)
+
+        except RateLimitError as err:
+            wait = limiter.rate_limited(err.args[0])
+            if (wait is not None):
+                print("\nConnection denied due to rate limiting (response status code = 429).")
+                print("All workers will retry in {:.0f} seconds ...".format(wait))
+                metrics.event("rate_limited", record=RecordIdx, wait=wait)
+
+        except SessionError:
+            print("[{:3d}] ***  Skipping this record.".format(RecordIdx))
+            set_state(RecordId, "failed")
+
+            with InFlightLock:
+                del InFlight[RecordIdx]
+
+            report_download(RecordIdx, RecordId, transfer, "skipped", Attempts)
+            return
+
+        except TransientErrors as err:
+            print("\n[{:3d}] Transient error: {:s}".format(RecordIdx, repr(err)))
+            metrics.event("transient_error", record=RecordIdx, error=repr(err), retry=Attempts + 1)
+
+            wait = limiter.record_failure()
+            if (wait is not None):
+                print("\n***  Too many failures in a row, all workers pause for {:g} seconds ...".format(wait))
+
+            Attempts += 1
+            if (Attempts > params_RetryBudget):
+                print("[{:3d}] ***  Giving up on this record after {:d} retries.".format(RecordIdx, params_RetryBudget))
+                set_state(RecordId, "failed")
+
+                with InFlightLock:
+                    del InFlight[RecordIdx]
+
+                report_download(RecordIdx, RecordId, transfer, "failed", Attempts)
+                return
+
+            wait = limiter.backoff(Attempts)
+            print("[{:3d}] Retry {:d}/{:d} in {:.1f} seconds ...".format(RecordIdx, Attempts, params_RetryBudget, wait))
+            StopEvent.wait(wait)
+
+        except (RemoteZipError, SelectionError) as err:
+            print("\n[{:3d}] ***  Cannot fetch the selected files: {:s}".format(RecordIdx, str(err)))
+            print("[{:3d}] ***  Skipping this record.".format(RecordIdx))
+            set_state(RecordId, "failed")
+
+            with InFlightLock:
+                del InFlight[RecordIdx]
+
+            report_download(RecordIdx, RecordId, transfer, "skipped", Attempts)
+            return
+
+        except OSError as err:
+            # Volume full: the partial file is kept and the record is left
+            # for a later run, smaller products may still fit
+            if (err.errno != errno.ENOSPC):
+                raise
+
+            print("\n[{:3d}] ***  Not enough disk space: {:s}".format(RecordIdx, str(err)))
+            print("[{:3d}] ***  Leaving this record for a later run.".format(RecordIdx))
+            set_state(RecordId, "queued")
+
+            with InFlightLock:
+                del InFlight[RecordIdx]
+
+            report_download(RecordIdx, RecordId, transfer, "no_space", Attempts)
+            return
+
+
+def stop_workers(pool):
+    """
+    Tell the workers to give up, drop the records still queued and wait for
+    the records in flight to return.
+    """
+    StopEvent.set()
+    pool.shutdown(wait=True, cancel_futures=True)
+
+###  END Functions used by the download workers  ###
+
+
+
+###  BEGIN Select records to download  ###
+Queue = []
+for RecordIdx in range(log_df.shape[0]):
+
+    # Check if file has already been downloaded, according to the log
+    if (log_df.loc[RecordIdx, 'Downloaded'] == True):
+        continue
+
+    # In selective mode, check if its files have already been extracted
+    if params_Members and (log_df.loc[RecordIdx, 'Extracted'] == True):
+        continue
+
+    if (log_df.loc[RecordIdx, 'Online'] == False):
+        print("\n***  NOTE: data for record with index {:3d} not found online!".format(RecordIdx))
+        print("***  {:s}".format(log_df.loc[RecordIdx, 'Name']))
+        continue
+
+    Queue.append(RecordIdx)
+
+# The workers take the records in the order in which they are submitted
+Queue = schedule(log_df, Queue, params_Schedule)
+
+print("\n# {:d} record(s) to download using {:d} worker(s), schedule {:s}.".format(len(Queue), params_Workers, params_Schedule))
+
+# Compare the size of the batch with the free space, the records which do
+# not fit are left for a later run as the volume fills up
+BatchSize = sum(content_length(RecordIdx) or 0 for RecordIdx in Queue)
+if (BatchSize > 0):
+    FreeSpace = free_bytes(".") - params_FreeSpaceMargin
+    print("# {:.1f} GB to download, {:.1f} GB free on the volume (less the margin).".format(BatchSize / 1e9, FreeSpace / 1e9))
+    if (BatchSize > FreeSpace):
+        print("***  NOTE: not every record will fit on the volume!")
+###  END Select records to download  ###
+
+
+
+###  BEGIN Download records using a pool of workers  ###
+pool = ThreadPoolExecutor(max_workers=params_Workers)
+try:
+    futures = [ pool.submit(download_record,
+                            RecordIdx,
+                            log_df.loc[RecordIdx, 'Id'],
+                            log_df.loc[RecordIdx, 'Name'] + ".zip",
+                            log_df.loc[RecordIdx, 'Checksum'],
+                            content_length(RecordIdx))
+                for RecordIdx in Queue ]
+
+    for fut in as_completed(futures):
+        fut.result()
+
+    pool.shutdown()
+
+except TokenRefreshError:
+    stop_workers(pool)
+    print("\n# Updating log file {:s} and exiting.\n".format(LogFile))
+    write_log(LogFile, log_hdr, log_df)
+    metrics.close()
+    exit(4)
+
+except CircuitOpenError as err:
+    print("\n***  Error: {:s}".format(str(err)))
+    stop_workers(pool)
+    print("\n# Updating log file {:s} and exiting.\n".format(LogFile))
+    write_log(LogFile, log_hdr, log_df)
+    metrics.close()
+    exit(5)
+
+
+###  BEGIN Handle all exceptions and keep partial downloads  ###
+except:
+    print("\n***  Unknown error or keyboard interrupt!")
+    print("***  If there is a traceback output above, please fix the issue the re-run this")
+    print("***  script.")
+
+    stop_workers(pool)
+
+    # The partial files of the records which were in flight are kept, their
+    # download resumes from where it stopped on the next run
+    for RecordIdx, (PartFile, Checksum) in InFlight.items():
+        if isfile(PartFile):
+            print("***  Keeping partial download {:s} ({:d} bytes).".format(PartFile, getsize(PartFile)))
+            set_state(log_df.loc[RecordIdx, 'Id'], "queued", Bytes=getsize(PartFile))
+        else:
+            set_state(log_df.loc[RecordIdx, 'Id'], "queued")
+
+
+    print("\n# Updating log file {:s} and exiting.\n".format(LogFile))
+    write_log(LogFile, log_hdr, log_df)
+    metrics.close()
+
+    exit(6)
+###  END Handle all exceptions and keep partial downloads  ###
+
+###  END Download records using a pool of workers  ###
+
+
+print("\n------------------------------------------------------------------------------")
+print("# Downloads complete.")
+print("# Updating log file {:s} and exiting.\n".format(LogFile))
+write_log(LogFile, log_hdr, log_df)
+metrics.close()
+
+exit(0)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+#  Script to fetch a fresh token for the OData API of the
+#  Copernicus Dataspace Ecosystem
+#  Version 2.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 02.03.2024
+#       * Initial script.
+#
+#  2.0: 17.10.2026
+#       * Request the token in-process through the TokenManager of OData_token
+#         instead of running curl as a subprocess. The time at which the token
+#         was fetched is stored in the token file so that the download script
+#         can refresh it ahead of its expiry.
+#
+#
+#  Exit status:
+#      0      if OK,
+#      1      cannot access token file,
+#      2      could not reach identity.dataspace.copernicus.eu,
+#      3      the identity service refused to deliver a token.
+#
+
+
+#  Load libraries
+from os.path import isfile
+from OData_transport import PooledSession
+from OData_token import TokenManager, TokenRefreshError, IdentityUnreachableError
+
+
+###  BEGIN Check if token file exists for output  ###
+
+#  Username and password of the Copernicus Dataspace account
+Username = ""  ## PLEASE ADD USERNAME STRING
+Password = ""  ## PLEASE ADD PASSWORD STRING
+
+# Path for token file
+TokenFile = "CopernicusDataspace_token.json"
+
+
+if not isfile(TokenFile):
+    print("Cannot access token file '{:s}'".format(TokenFile))
+    exit(1)
+
+###  END Check if token file exists for output  ###
+
+
+
+###  BEGIN Fetch token from Copernicus Dataspace  ###
+try:
+    print("Requesting token from Copernicus Dataspace ...")
+    session = PooledSession(pool_size=1)
+    tokens = TokenManager(session, TokenFile, Username, Password)
+    tokens.password_grant()
+
+    # Print results
+    print("\nAccess token expires in {:d} s, refresh token in {:d} s.".format(tokens.token['expires_in'], tokens.token['refresh_expires_in']))
+    print("\nSuccessfully wrote token to file {:s}\n".format(TokenFile))
+    exit(0)
+
+except IdentityUnreachableError as err:
+    print("\nError: {:s}\n".format(str(err)))
+    exit(2)
+except TokenRefreshError as err:
+    print("\nError: {:s}\n".format(str(err)))
+    exit(3)
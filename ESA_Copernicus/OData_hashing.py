@@ -0,0 +1,210 @@
+#
+#  Checksums of the files downloaded from the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/).
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: hash files with large sequential reads, with MD5 or
+#         BLAKE3 (if the blake3 package is installed).
+#
+#  1.1: 17.10.2026
+#       * Persistent cache of the digests of files, keyed by the path and the
+#         identity (size, modification time, inode) of each file.
+#
+#
+#  Usage:
+#      from OData_hashing import hash_file, file_digest, HashCache
+#
+#      md5_hash = hash_file("product.zip")        # hash object
+#      md5_hash.update(more_bytes)
+#      md5sum = file_digest("product.zip", "MD5") # hexadecimal digest
+#
+#      hashes = HashCache(".OData_hashes.sqlite")
+#      md5sum = hashes.digest("product.zip", "MD5") # read only if changed
+#
+
+
+#  Load libraries
+import os
+from time import time
+from hashlib import md5
+import sqlite3
+import threading
+
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+
+#  Number of bytes read at a time
+READ_SIZE = 8 * 2**20
+
+
+def new_hash(algorithm="MD5"):
+    """
+    Empty hash object for one of the algorithms of the checksums given by
+    the catalogue.
+    """
+    if (algorithm == "MD5"):
+        return md5()
+
+    elif (algorithm == "BLAKE3"):
+        if (blake3 is None):
+            raise ValueError("BLAKE3 checksums need the blake3 package")
+        return blake3()
+
+    raise ValueError("unknown checksum algorithm {:s}".format(algorithm))
+
+
+def hash_file(Filename, algorithm="MD5", read_size=READ_SIZE):
+    """
+    Hash object fed with the content of a file, read read_size bytes at a
+    time into a single buffer. The object can be updated further, e.g. with
+    the bytes of a resumed download.
+    """
+    file_hash = new_hash(algorithm)
+    buf = bytearray(read_size)
+    view = memoryview(buf)
+
+    with open(Filename, 'rb', buffering=0) as f:
+        # Tell the kernel to read ahead
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            file_hash.update(view[:n])
+
+    return file_hash
+
+
+def file_digest(Filename, algorithm="MD5", read_size=READ_SIZE):
+    """
+    Hexadecimal digest of a file. Meant to be run in a pool of processes,
+    since a hash object cannot be passed back from a worker process.
+    """
+    return hash_file(Filename, algorithm, read_size).hexdigest()
+
+
+def file_identity(Filename):
+    """
+    (size, modification time in ns, inode) of a file. Any write to the file
+    or its replacement by another file changes it.
+    """
+    st = os.stat(Filename)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class HashCache:
+    """
+    Digests of files kept in an SQLite database, keyed by the absolute path
+    of the file and the algorithm. Each digest is stored with the identity
+    of the file (see file_identity()) at the time it was computed, and is
+    only returned as long as the file has the same identity. The cache can
+    be shared by the threads of a script, each using a connection of its
+    own, and by several scripts at the same time.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+        con = self.connection()
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                Path      TEXT NOT NULL,
+                Algorithm TEXT NOT NULL,
+                Size      INTEGER NOT NULL,
+                MtimeNs   INTEGER NOT NULL,
+                Inode     INTEGER NOT NULL,
+                Digest    TEXT NOT NULL,
+                Stored    REAL,
+                PRIMARY KEY (Path, Algorithm)
+            )""")
+        con.commit()
+
+
+    def connection(self):
+        """
+        Connection of the calling thread, opened on first use.
+        """
+        con = getattr(self.local, 'con', None)
+        if (con is None):
+            con = sqlite3.connect(self.path, timeout=self.timeout)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+
+        return con
+
+
+    def get(self, Filename, algorithm="MD5"):
+        """
+        Cached digest of a file, or None if there is none or if the file
+        changed since it was computed.
+        """
+        try:
+            identity = file_identity(Filename)
+        except OSError:
+            return None
+
+        row = self.connection().execute(
+            "SELECT Size, MtimeNs, Inode, Digest FROM hashes WHERE Path = ? AND Algorithm = ?",
+            (os.path.abspath(Filename), algorithm)).fetchone()
+
+        if (row is None) or (tuple(row[:3]) != identity):
+            return None
+
+        return row[3]
+
+
+    def put(self, Filename, algorithm, Digest, identity=None):
+        """
+        Store the digest of a file. If the identity of the file when the
+        hashing started is given, the digest is only stored if the file did
+        not change while it was being read.
+        """
+        current = file_identity(Filename)
+        if (identity is not None) and (tuple(identity) != current):
+            return
+
+        con = self.connection()
+        with con:
+            con.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (os.path.abspath(Filename), algorithm) + current + (Digest, time()))
+
+
+    def digest(self, Filename, algorithm="MD5", read_size=READ_SIZE):
+        """
+        Digest of a file, from the cache if the file did not change, else
+        computed and stored.
+        """
+        Digest = self.get(Filename, algorithm)
+        if (Digest is None):
+            identity = file_identity(Filename)
+            Digest = file_digest(Filename, algorithm, read_size)
+            self.put(Filename, algorithm, Digest, identity)
+
+        return Digest
@@ -0,0 +1,271 @@
+#
+#  SQLite store of the state of the downloads of the OData_download script
+#  for the Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.2
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: records of a log file kept in an SQLite database in
+#         WAL mode, each change of state committed on its own.
+#
+#  1.1: 17.10.2026
+#       * Several log files can share a store: the preamble, the columns
+#         and the records of each log file are kept under its path, and
+#         export_log() writes back the records of the given log file only.
+#         The state of a product is still shared by all of them.
+#
+#  1.2: 17.10.2026
+#       * State 'extracted' of the records of which only some files were
+#         fetched (selective mode of OData_download), kept in the column
+#         'Extracted' of the log files, 'Downloaded' being left to the
+#         records whose whole archive was verified.
+#
+#
+#  Usage:
+#      from OData_jobstore import JobStore
+#
+#      store = JobStore("downloads.sqlite")
+#      store.import_log(LogFile)          # new records are queued
+#      store.mark(Id, "in-progress", attempt=True)
+#      store.mark(Id, "downloaded", Bytes=1234, Digest=md5sum)
+#      store.export_log(LogFile)          # back to preamble + CSV
+#
+#  or, from the command line, after a crash:
+#      ./OData_download_vx.x.py LogFile --export-log
+#
+
+
+#  Load libraries
+import os
+from time import time
+import json
+import sqlite3
+import threading
+import pandas as pd
+from OData_logfile import read_log, write_log
+
+
+#  States of a record in the store
+JOB_STATES = ("queued", "in-progress", "downloaded", "extracted", "failed")
+
+
+#  Tables of the store:
+#    meta    : preamble and columns of each log file, under the keys
+#              'preamble:PATH' and 'columns:PATH',
+#    jobs    : one row per product, keyed by its Id, holding its state.
+#              'Checksum' is the checksum of the catalogue, 'Digest' the one
+#              computed on the download,
+#    members : records of each log file, keyed by the path of the log file
+#              and the Id. 'Record' holds the row of the log file as JSON,
+#              so that columns unknown to the store are exported unchanged.
+#  The columns 'Position' and 'Record' of jobs are those of the log file
+#  imported last, as in version 1.0, whose single 'preamble' and 'columns'
+#  of meta are no longer used.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    Key   TEXT PRIMARY KEY,
+    Value TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    Id       TEXT PRIMARY KEY,
+    Position INTEGER NOT NULL,
+    Name     TEXT,
+    Checksum TEXT,
+    Online   INTEGER,
+    State    TEXT NOT NULL DEFAULT 'queued',
+    Bytes    INTEGER NOT NULL DEFAULT 0,
+    Digest   TEXT,
+    Attempts INTEGER NOT NULL DEFAULT 0,
+    Updated  REAL,
+    Record   TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (State);
+CREATE INDEX IF NOT EXISTS jobs_position ON jobs (Position);
+CREATE TABLE IF NOT EXISTS members (
+    Source   TEXT NOT NULL,
+    Id       TEXT NOT NULL,
+    Position INTEGER NOT NULL,
+    Record   TEXT,
+    PRIMARY KEY (Source, Id)
+);
+"""
+
+
+def record_state(Record):
+    """
+    State of a record of a log file, as given by its 'Downloaded' and
+    'Extracted' columns.
+    """
+    if (Record['Downloaded'] == True):
+        return "downloaded"
+    if (Record.get('Extracted') == True):
+        return "extracted"
+    return "queued"
+
+
+class JobStore:
+    """
+    State of the records of a log file kept in an SQLite database, so that
+    the state of each record is on disk as soon as it changes instead of
+    when the whole log file is written back at exit.
+
+    The database is in WAL mode: the workers commit their updates
+    concurrently, each on a connection of its own (one per thread), while
+    readers are never blocked. A record imported again from a log file keeps
+    its state, unless the log file says it is downloaded, or extracted
+    while the store does not know it as downloaded.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+        con = self.connection()
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(SCHEMA)
+
+
+    def connection(self):
+        """
+        Connection of the calling thread, opened on first use.
+        """
+        con = getattr(self.local, 'con', None)
+        if (con is None):
+            con = sqlite3.connect(self.path, timeout=self.timeout)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+
+        return con
+
+
+    def import_log(self, LogFile):
+        """
+        Add the records of a log file (OData_query format) to the store, in
+        a single transaction. Returns the preamble and the dataframe of the
+        records, with the 'Downloaded' and 'Extracted' columns set from the
+        store.
+        """
+        log_hdr, log_df = read_log(LogFile)
+        Records = json.loads(log_df.to_json(orient='records'))
+        Source = os.path.abspath(LogFile)
+        now = time()
+
+        con = self.connection()
+        with con:
+            con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("preamble:" + Source, log_hdr))
+            con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("columns:" + Source, json.dumps(list(log_df.columns))))
+
+            # The records of this log file replace those it had before
+            con.execute("DELETE FROM members WHERE Source = ?", (Source,))
+            con.executemany("INSERT INTO members VALUES (?, ?, ?, ?)",
+                            [ (Source, Record['Id'], Position, json.dumps(Record)) for Position, Record in enumerate(Records) ])
+            con.executemany("""
+                INSERT INTO jobs (Id, Position, Name, Checksum, Online, State, Updated, Record)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (Id) DO UPDATE SET
+                    Position = excluded.Position,
+                    Name     = excluded.Name,
+                    Checksum = excluded.Checksum,
+                    Online   = excluded.Online,
+                    Record   = excluded.Record,
+                    State    = CASE WHEN excluded.State = 'downloaded'
+                                    THEN 'downloaded'
+                                    WHEN excluded.State = 'extracted' AND jobs.State != 'downloaded'
+                                    THEN 'extracted' ELSE jobs.State END
+                """,
+                [ ( Record['Id'], Position, Record['Name'], Record['Checksum'],
+                    int(bool(Record['Online'])),
+                    record_state(Record),
+                    now, json.dumps(Record) )
+                  for Position, Record in enumerate(Records) ])
+
+        States = self.states()
+        log_df['Downloaded'] = log_df['Id'].map(States).eq("downloaded")
+        if ('Extracted' in log_df.columns) or ("extracted" in States.values()):
+            log_df['Extracted'] = log_df['Id'].map(States).eq("extracted")
+
+        return log_hdr, log_df
+
+
+    def export_log(self, LogFile):
+        """
+        Write the records of a log file imported into the store back to it,
+        in the OData_query format and in the order in which they were
+        imported, with the 'Downloaded' and 'Extracted' columns set from the
+        store. Raises KeyError if the log file was never imported.
+        """
+        Source = os.path.abspath(LogFile)
+        con = self.connection()
+        log_hdr = con.execute("SELECT Value FROM meta WHERE Key = ?", ("preamble:" + Source,)).fetchone()
+        if (log_hdr is None):
+            raise KeyError("{:s} was never imported into the job store {:s}".format(LogFile, self.path))
+        Columns = json.loads(con.execute("SELECT Value FROM meta WHERE Key = ?", ("columns:" + Source,)).fetchone()[0])
+
+        Records = []
+        for Record, State in con.execute("""
+                SELECT m.Record, j.State FROM members m JOIN jobs j ON j.Id = m.Id
+                WHERE m.Source = ? ORDER BY m.Position""", (Source,)):
+            Record = json.loads(Record)
+            Record['Downloaded'] = (State == "downloaded")
+            Record['Extracted'] = (State == "extracted")
+            Records.append(Record)
+
+        # The column is added once files of a record were extracted
+        if ('Extracted' not in Columns) and any(Record['Extracted'] for Record in Records):
+            Columns.append('Extracted')
+
+        write_log(LogFile, log_hdr[0], pd.DataFrame(Records, columns=Columns))
+
+
+    def mark(self, Id, State, Bytes=None, Digest=None, attempt=False):
+        """
+        Change the state of a record and commit at once. Bytes and Digest
+        are left unchanged when not given, and the number of attempts is
+        incremented if attempt is True.
+        """
+        if State not in JOB_STATES:
+            raise ValueError("job state must be one of {:s}".format(", ".join(JOB_STATES)))
+
+        con = self.connection()
+        with con:
+            con.execute("""
+                UPDATE jobs SET
+                    State    = ?,
+                    Bytes    = COALESCE(?, Bytes),
+                    Digest   = COALESCE(?, Digest),
+                    Attempts = Attempts + ?,
+                    Updated  = ?
+                WHERE Id = ?
+                """, (State, Bytes, Digest, int(attempt), time(), Id))
+
+
+    def states(self):
+        """
+        Dictionary Id -> state of all the records in the store.
+        """
+        return dict(self.connection().execute("SELECT Id, State FROM jobs"))
+
+
+    def counts(self):
+        """
+        Number of records in each state.
+        """
+        return dict(self.connection().execute("SELECT State, COUNT(*) FROM jobs GROUP BY State"))
@@ -0,0 +1,130 @@
+#
+#  Read and write the log files (preamble + CSV records) of the OData scripts
+#  for the Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.2
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module, taken from the OData_download script.
+#
+#  1.1: 17.10.2026
+#       * log_columns() reads the CSV header of a log file only.
+#
+#  1.2: 17.10.2026
+#       * checksum_algorithm() gives the algorithm of the 'Checksum' column
+#         from the preamble, MD5 for the log files which do not say.
+#
+#
+#  Usage:
+#      from OData_logfile import read_log, write_log
+#
+#      log_hdr, log_df = read_log(LogFile)
+#      Algorithm = checksum_algorithm(log_hdr)    # "MD5" or "BLAKE3"
+#      write_log(LogFile, log_hdr, log_df)
+#
+
+
+#  Load libraries
+import os
+import pandas as pd
+
+
+#  Line separating the preamble from the CSV records
+SEPARATOR = "---------------------\n"
+
+#  Template for writing preamble into log CSV file
+log_template = """\
+{0}---------------------
+{1}"""
+
+#  Line of the preamble giving the algorithm of the 'Checksum' column
+CHECKSUM_KEY = "Checksum ="
+
+
+def read_log(LogFile):
+    """
+    Read a log file written by the OData_query script. Returns the preamble,
+    as a string without the separator line, and a dataframe with the
+    records.
+    """
+
+    #  Retrieve header
+    log_hdr = read_preamble(LogFile)
+    count_hdr = log_hdr.count("\n") + 1
+
+    #  Load records into dataframe
+    log_df = pd.read_csv(LogFile, skiprows=count_hdr)
+
+    return log_hdr, log_df
+
+
+def read_preamble(LogFile):
+    """
+    Preamble of a log file, as a string without the separator line.
+    """
+    with open(LogFile) as f:
+        line = ""
+        log_hdr = ""
+        while line != SEPARATOR:
+            log_hdr += line
+            line = f.readline()
+
+            # No separator in the file
+            if (line == ""):
+                raise ValueError("{:s} is not an OData query log file".format(LogFile))
+
+    return log_hdr
+
+
+def checksum_algorithm(log_hdr):
+    """
+    Algorithm of the checksums of the 'Checksum' column, as written to the
+    preamble by the OData_query script, e.g. "Checksum = BLAKE3". The log
+    files written before it did so hold MD5 checksums.
+    """
+    for line in log_hdr.splitlines():
+        if line.startswith(CHECKSUM_KEY):
+            return line[len(CHECKSUM_KEY):].strip()
+
+    return "MD5"
+
+
+def log_columns(LogFile):
+    """
+    Names of the columns of the records of a log file, read from the CSV
+    header which follows the preamble.
+    """
+    with open(LogFile) as f:
+        for line in f:
+            if (line == SEPARATOR):
+                return f.readline().rstrip("\n").split(",")
+
+    raise ValueError("{:s} is not an OData query log file".format(LogFile))
+
+
+def write_log(LogFile, log_hdr, log_df):
+    """
+    Write the preamble and the records to the log file. The file is first
+    written under a temporary name and then renamed, so that an interrupted
+    write does not leave a truncated log behind.
+    """
+    with open(LogFile + ".tmp", 'w') as f:
+        f.write(log_template.format(log_hdr, log_df.to_csv(index=False)))
+    os.replace(LogFile + ".tmp", LogFile)
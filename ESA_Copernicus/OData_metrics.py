@@ -0,0 +1,209 @@
+#
+#  Metrics of the downloads from the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/), written as JSON-lines events and as a
+#  Prometheus textfile.
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: counters, summaries and gauges exported in the text
+#         format of Prometheus, events appended to a JSON-lines file.
+#
+#
+#  Usage:
+#      from OData_metrics import Metrics, Transfer
+#
+#      metrics = Metrics("downloads.jsonl", "odata_download.prom")
+#      metrics.inc("odata_responses_total", status="429")
+#      metrics.observe("odata_download_duration_seconds", 12.5)
+#      metrics.event("download", record=3, bytes=1234)
+#      metrics.write_textfile()
+#
+#  The textfile is meant for the textfile collector of the Prometheus node
+#  exporter (--collector.textfile.directory).
+#
+
+
+#  Load libraries
+import os
+from time import time, perf_counter
+import json
+import threading
+
+
+#  Description of the metrics written by the OData_download script:
+#  name -> (type, help)
+METRICS = {
+    'odata_download_bytes_total'             : ("counter", "Bytes of product data received."),
+    'odata_downloads_total'                  : ("counter", "Records dealt with, by result."),
+    'odata_download_duration_seconds'        : ("summary", "Time from the first request of a record to its result."),
+    'odata_download_ttfb_seconds'            : ("summary", "Time from a download request to the first byte of data."),
+    'odata_hash_duration_seconds'            : ("summary", "Time spent computing checksums, per record."),
+    'odata_responses_total'                  : ("counter", "Responses of the download service, by status code."),
+    'odata_token_refreshes_total'            : ("counter", "Token refreshes, by result."),
+    'odata_token_refresh_duration_seconds'   : ("summary", "Time taken by a token refresh."),
+    'odata_last_download_timestamp_seconds'  : ("gauge",   "Time at which the last record was downloaded."),
+    'odata_last_download_bytes_per_second'   : ("gauge",   "Throughput of the last record downloaded."),
+    'odata_downloads_in_flight'              : ("gauge",   "Records being downloaded."),
+    'odata_batch_start_timestamp_seconds'    : ("gauge",   "Time at which the batch started."),
+}
+
+
+def format_labels(labels):
+    """
+    Labels of a sample in the text format, e.g. '{status="429"}'.
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join('{:s}="{:s}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels) + "}"
+
+
+class Transfer:
+    """
+    Measurements of the download of one record, updated by the threads which
+    fetch its bytes: bytes received, time to first byte of the latest
+    request and time spent hashing.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = perf_counter()
+        self.bytes = 0
+        self.ttfb = None
+        self.hash_seconds = 0.0
+        self.request_time = None
+
+    def requested(self):
+        """
+        Called when a request for the data of the record is sent.
+        """
+        with self.lock:
+            self.request_time = perf_counter()
+
+    def received(self, n):
+        """
+        Called for each chunk of n bytes received.
+        """
+        with self.lock:
+            if (self.request_time is not None):
+                self.ttfb = perf_counter() - self.request_time
+                self.request_time = None
+            self.bytes += n
+
+    def hashed(self, seconds):
+        with self.lock:
+            self.hash_seconds += seconds
+
+    def elapsed(self):
+        return perf_counter() - self.start
+
+
+class Metrics:
+    """
+    Counters, summaries (sum and count) and gauges, keyed by name and labels,
+    shared by the threads of a script.
+
+    events_file : JSON-lines file to which events are appended ("" for none).
+    textfile : file to which the metrics are written in the text format of
+               Prometheus by write_textfile() ("" for none). It is written
+               under a temporary name and renamed, so that the collector
+               never reads a partial file.
+    """
+
+    def __init__(self, events_file="", textfile="", descriptions=METRICS):
+        self.textfile = textfile
+        self.descriptions = descriptions
+        self.lock = threading.Lock()
+
+        self.values = {}   # (name, labels) -> value, or [sum, count] for summaries
+        self.events = open(events_file, 'a') if events_file else None
+
+
+    def key(self, name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            key = self.key(name, labels)
+            self.values[key] = self.values.get(key, 0) + value
+
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            summary = self.values.setdefault(self.key(name, labels), [0.0, 0])
+            summary[0] += value
+            summary[1] += 1
+
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[self.key(name, labels)] = value
+
+
+    def event(self, kind, **fields):
+        """
+        Append an event, with its time and kind, to the events file.
+        """
+        if (self.events is None):
+            return
+
+        line = json.dumps(dict({ 'time' : time(), 'event' : kind }, **fields), default=str)
+        with self.lock:
+            self.events.write(line + "\n")
+            self.events.flush()
+
+
+    def write_textfile(self):
+        """
+        Write all the metrics to the textfile, if there is one.
+        """
+        if not self.textfile:
+            return
+
+        with self.lock:
+            Lines = []
+            for name in sorted({ name for name, labels in self.values }):
+                kind, help = self.descriptions.get(name, ("untyped", ""))
+                if help:
+                    Lines.append("# HELP {:s} {:s}".format(name, help))
+                Lines.append("# TYPE {:s} {:s}".format(name, kind))
+
+                for (sample, labels), value in sorted(self.values.items()):
+                    if (sample != name):
+                        continue
+                    if (kind == "summary"):
+                        Lines.append("{:s}_sum{:s} {:.6f}".format(name, format_labels(labels), value[0]))
+                        Lines.append("{:s}_count{:s} {:d}".format(name, format_labels(labels), value[1]))
+                    else:
+                        Lines.append("{:s}{:s} {:s}".format(name, format_labels(labels), repr(float(value)) if isinstance(value, float) else str(value)))
+
+            tmp = "{:s}.{:d}.tmp".format(self.textfile, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write("\n".join(Lines) + "\n")
+            os.replace(tmp, self.textfile)
+
+
+    def close(self):
+        self.write_textfile()
+        if (self.events is not None):
+            self.events.close()
+            self.events = None
@@ -0,0 +1,570 @@
+#
+#  Local stand-in for the catalogue, zipper and identity services of the
+#  Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/), used to
+#  test and benchmark the OData scripts without network access.
+#  Version 1.4
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: catalogue 'Products' endpoint with pagination,
+#         zipper '$value' endpoint with Range requests, identity token
+#         endpoint, with latency, bandwidth and error injection. The
+#         requests served are listed by GET /mock/requests.
+#
+#  1.1: 17.10.2026
+#       * Products can be given the content of an archive (argument archive),
+#         e.g. to extract members from them with Range requests.
+#
+#  1.2: 17.10.2026
+#       * 'Nodes' endpoint listing the files of a product given as a ZIP
+#         archive, and '$value' of each of these files.
+#
+#  1.3: 17.10.2026
+#       * Attributes of the products (cloud cover, tile, relative orbit),
+#         returned with $expand=Attributes. The condition on the publication
+#         date of the $filter is applied, for incremental queries.
+#
+#  1.4: 17.10.2026
+#       * Errors are injected into the responses of every endpoint, the
+#         catalogue, the listings of the nodes and the identity service as
+#         well as the downloads, or of those given (error_endpoints). The
+#         listings of the nodes also check the access tokens.
+#
+#
+#  Usage:
+#      from OData_mockserver import MockServer
+#
+#      server = MockServer(products=100, product_size=16*2**20,
+#                          latency=0.05, bandwidth=50e6,
+#                          error_rates={ 503 : 0.02, 429 : 0.01 },
+#                          error_endpoints=("zipper", "identity"))
+#      server.start()
+#      os.environ.update(server.environ())   # before importing OData_transport
+#      ...
+#      server.stop()
+#
+#  or in a process of its own:
+#      conn, child_conn = multiprocessing.Pipe()
+#      multiprocessing.Process(target=serve, args=(child_conn,), kwargs=config).start()
+#      url, environ = conn.recv()
+#
+#  or, to run the scripts against it from another shell:
+#      python OData_mockserver.py [PORT]
+#
+
+
+#  Load libraries
+from sys import argv
+from time import time, sleep
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, parse_qsl, urlencode
+import io
+import json
+import random
+import re
+import threading
+import zipfile
+
+
+#  Paths of the endpoints, as on the Copernicus servers
+CATALOGUE_PATH = "/odata/v1"
+ZIPPER_PATH = "/odata/v1"
+IDENTITY_PATH = "/auth/realms/CDSE/protocol/openid-connect/token"
+
+#  Endpoints, as recorded in MockServer.requests
+ENDPOINTS = ("catalogue", "nodes", "zipper", "identity")
+
+#  Number of bytes written to the socket at a time
+WRITE_SIZE = 65536
+
+
+def product_records(n, product_size, checksum, start=datetime(2021, 8, 1, tzinfo=timezone.utc)):
+    """
+    Catalogue records of n products, all of the same size and checksum,
+    sensed and published one hour apart.
+    """
+    Records = []
+    for i in range(n):
+        Date = start + timedelta(hours=i)
+        Records.append({
+            'Id'              : "00000000-0000-0000-0000-{:012d}".format(i),
+            'Name'            : "S2A_MSIL1C_{:s}_N0500_R{:03d}_T40KEC_MOCK{:06d}.SAFE".format(Date.strftime("%Y%m%dT%H%M%S"), i % 143, i),
+            'Online'          : True,
+            'ContentLength'   : product_size,
+            'ContentDate'     : { 'Start' : Date.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                                  'End'   : (Date + timedelta(seconds=5)).strftime("%Y-%m-%dT%H:%M:%S.000Z") },
+            'PublicationDate' : (Date + timedelta(hours=6)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            'S3Path'          : "/eodata/Sentinel-2/MSI/L1C/mock/{:06d}".format(i),
+            'Footprint'       : "geography'SRID=4326;POLYGON ((57.0 -20.8, 58.1 -20.8, 58.1 -19.6, 57.0 -19.6, 57.0 -20.8))'",
+            'Checksum'        : [ { 'Value' : checksum, 'Algorithm' : "MD5" } ],
+            'Attributes'      : [ { 'Name' : "cloudCover",          'Value' : float(i * 7 % 50), 'ValueType' : "Double" },
+                                  { 'Name' : "tileId",              'Value' : "40KEC",           'ValueType' : "String" },
+                                  { 'Name' : "relativeOrbitNumber", 'Value' : i % 143,           'ValueType' : "Integer" } ] })
+
+    return Records
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    Requests to the mock server. The configuration and the statistics are
+    held by the server (self.server).
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def send_injected_error(self, endpoint, arrival, check_token=False):
+        """
+        Answer the request with an error drawn for the endpoint, or with a
+        401 if check_token and the access token is unknown or expired.
+        Returns False if the request is to be answered normally.
+        """
+        server = self.server
+        status = server.draw_error(endpoint)
+        if (status is None) and check_token and server.check_tokens and not server.token_valid(self.headers.get("Authorization")):
+            status = 401
+
+        if (status is None):
+            return False
+
+        headers = { "Retry-After" : str(server.retry_after) } if (status == 429) else None
+        self.send_empty(status, headers)
+        server.record(endpoint, status, arrival, time(), 0)
+        return True
+
+
+    def do_GET(self):
+        server = self.server
+        arrival = time()
+        url = urlparse(self.path)
+
+        # Latency of the service, before any byte of the response
+        if (server.latency > 0) and not url.path.startswith("/mock/"):
+            sleep(server.latency)
+
+        if (url.path == "/mock/requests"):
+            with server.lock:
+                requests = list(server.requests)
+            self.send_json(requests)
+            return
+
+        if (url.path == CATALOGUE_PATH + "/Products"):
+            if self.send_injected_error("catalogue", arrival):
+                return
+            self.get_products(url)
+            server.record("catalogue", 200, arrival, time(), 0)
+            return
+
+        m = re.fullmatch(re.escape(ZIPPER_PATH) + r"/Products\(([^)]+)\)((?:/Nodes\([^)]+\))*)/(Nodes|\$value)", url.path)
+        if (m is None):
+            self.send_empty(404)
+            server.record("other", 404, arrival, time(), 0)
+            return
+
+        # Path of the node in the product, e.g. ("S2A_...SAFE", "MTD_MSIL2A.xml")
+        Path = tuple(re.findall(r"/Nodes\(([^)]+)\)", m.group(2)))
+        if (m.group(3) == "Nodes"):
+            if self.send_injected_error("nodes", arrival, check_token=True):
+                return
+            self.get_nodes(m.group(1), Path)
+            server.record("nodes", 200, arrival, time(), 0)
+            return
+
+        # Errors injected at random, then tokens which are unknown or expired
+        if self.send_injected_error("zipper", arrival, check_token=True):
+            return
+
+        status, first_byte, sent = self.get_value(m.group(1), Path)
+        server.record("zipper", status, arrival, first_byte, sent)
+
+
+    def get_products(self, url):
+        """
+        Send one page of the catalogue, with $top, $skip, $count and the link
+        to the next page. Of the $filter, only a condition 'PublicationDate
+        ge ...' is applied: every query matches all the products published
+        since. The attributes are sent with $expand=Attributes only.
+        """
+        server = self.server
+        params = dict(parse_qsl(url.query))
+        top = int(params.get("$top", 20))
+        skip = int(params.get("$skip", 0))
+
+        records = server.records
+        match = re.search(r"PublicationDate ge (\S+)", params.get("$filter", ""))
+        if match:
+            since = datetime.fromisoformat(match.group(1).replace("Z", "+00:00"))
+            records = [ Record for Record in records
+                        if datetime.fromisoformat(Record['PublicationDate'].replace("Z", "+00:00")) >= since ]
+
+        page = { 'value' : records[skip:skip + top] }
+        if (params.get("$expand") != "Attributes"):
+            page['value'] = [ { Key : Value for Key, Value in Record.items() if (Key != "Attributes") } for Record in page['value'] ]
+        if (params.get("$count") == "true"):
+            page['@odata.count'] = len(records)
+
+        if (skip + top < len(records)):
+            params["$skip"] = str(skip + top)
+            params.pop("$count", None)
+            page['@odata.nextLink'] = server.url + CATALOGUE_PATH + "/Products?" + urlencode(params)
+
+        self.send_json(page)
+
+
+    def get_nodes(self, Id, Path):
+        """
+        Send the list of the nodes (files and directories) under the node at
+        Path in the product, the top node being the SAFE directory.
+        """
+        server = self.server
+        Prefix = "".join(Name + "/" for Name in Path)
+        if (Id not in server.ids) or (Path and (Prefix not in server.node_dirs)):
+            self.send_json({ 'detail' : "Not found" }, 404)
+            return
+
+        Base = server.url + ZIPPER_PATH + "/Products({:s})".format(Id) + "".join("/Nodes({:s})".format(Name) for Name in Path)
+        Nodes = []
+        for Name in server.node_children(Prefix):
+            Nodes.append({ 'Id'             : Name,
+                           'Name'           : Name,
+                           'ContentLength'  : len(server.node_files.get(Prefix + Name, b"")),
+                           'ChildrenNumber' : len(server.node_children(Prefix + Name + "/")),
+                           'Nodes'          : { 'uri' : Base + "/Nodes({:s})/Nodes".format(Name) } })
+
+        self.send_json({ 'result' : Nodes })
+
+
+    def get_value(self, Id, Path=()):
+        """
+        Bytes of a product, or of the file at Path in the product, or of the
+        byte range asked for. Returns the status, the time at which the first
+        byte was sent and the number of bytes sent.
+        """
+        server = self.server
+        if (Id not in server.ids) or (Path and ("/".join(Path) not in server.node_files)):
+            self.send_empty(404)
+            return 404, time(), 0
+
+        if Path:
+            data = server.node_files["/".join(Path)]
+            size = len(data)
+            content = lambda position, length: data[position:position + length]
+        else:
+            size = server.product_size
+            content = server.content
+        first, last = 0, size - 1
+        status = 200
+
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if (m is not None):
+            first = int(m.group(1))
+            if m.group(2):
+                last = min(int(m.group(2)), size - 1)
+            if (first >= size):
+                self.send_empty(416, { "Content-Range" : "bytes */{:d}".format(size) })
+                return 416, time(), 0
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if (status == 206):
+            self.send_header("Content-Range", "bytes {:d}-{:d}/{:d}".format(first, last, size))
+        self.end_headers()
+
+        # Stream the bytes at the configured bandwidth
+        start = time()
+        first_byte = None
+        sent = 0
+        position = first
+        try:
+            while (position <= last):
+                chunk = content(position, min(WRITE_SIZE, last - position + 1))
+                self.wfile.write(chunk)
+                if (first_byte is None):
+                    first_byte = time()
+
+                position += len(chunk)
+                sent += len(chunk)
+                if server.bandwidth:
+                    delay = start + sent / server.bandwidth - time()
+                    if (delay > 0):
+                        sleep(delay)
+
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+        return status, first_byte or time(), sent
+
+
+    def do_POST(self):
+        """
+        Token endpoint: any refresh token or username and password is
+        accepted.
+        """
+        server = self.server
+        arrival = time()
+        if (urlparse(self.path).path != IDENTITY_PATH):
+            self.send_empty(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if self.send_injected_error("identity", arrival):
+            return
+
+        if form.get("grant_type", [""])[0] not in ("refresh_token", "password"):
+            self.send_json({ 'error' : "unsupported_grant_type" }, status=400)
+        else:
+            self.send_json(server.issue_token())
+
+        server.record("identity", 200, arrival, time(), 0)
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Mock of the Copernicus Dataspace services listening on host:port (port 0
+    picks a free port).
+
+    products, product_size : number of products in the catalogue and size of
+                             each of them in bytes. All the products have the
+                             same content, so that their MD5 checksum is
+                             computed only once.
+    archive : content of every product, e.g. the bytes of a ZIP archive,
+              instead of random bytes of size product_size. The files of a
+              ZIP archive are also served as the nodes of each product.
+    latency : number of seconds before the response to each GET request.
+    bandwidth : bytes per second sent on each connection (None for no limit).
+    error_rates : probability of each error status (e.g. 401, 429, 500, 503)
+                  in the responses of the endpoints error_endpoints.
+    error_endpoints : endpoints (of ENDPOINTS) whose responses get the
+                      errors of error_rates, all of them by default.
+    retry_after : value of the Retry-After header of the 429 responses.
+    token_lifetime : life time in seconds of the access tokens issued.
+    check_tokens : answer 401 to downloads and listings of nodes with an
+                   unknown or expired token.
+
+    Each request is recorded in self.requests as a tuple (endpoint, status,
+    arrival time, time of the first byte, bytes sent).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, products=100, product_size=2**20,
+                 latency=0.0, bandwidth=None, error_rates=None, retry_after=1,
+                 token_lifetime=600, check_tokens=True, seed=0, archive=None,
+                 error_endpoints=ENDPOINTS):
+        for endpoint in error_endpoints:
+            if endpoint not in ENDPOINTS:
+                raise ValueError("error endpoints must be among {:s}".format(", ".join(ENDPOINTS)))
+
+        super().__init__((host, port), MockHandler)
+
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rates = error_rates or {}
+        self.error_endpoints = tuple(error_endpoints)
+        self.retry_after = retry_after
+        self.token_lifetime = token_lifetime
+        self.check_tokens = check_tokens
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.tokens = {}
+        self.requests = []
+        self.thread = None
+
+        # Content of the products: a block of random bytes repeated, or the
+        # archive given
+        self.block = random.Random(seed).randbytes(WRITE_SIZE)
+        self.archive = archive
+        self.product_size = product_size if (archive is None) else len(archive)
+
+        # Files and directories of the archive: path -> bytes, and paths of
+        # the directories ending with "/"
+        self.node_files = {}
+        self.node_dirs = set()
+        if (archive is not None) and zipfile.is_zipfile(io.BytesIO(archive)):
+            with zipfile.ZipFile(io.BytesIO(archive)) as z:
+                for name in z.namelist():
+                    if not name.endswith("/"):
+                        self.node_files[name] = z.read(name)
+                    Parts = name.rstrip("/").split("/")
+                    for i in range(1, len(Parts) if not name.endswith("/") else len(Parts) + 1):
+                        self.node_dirs.add("/".join(Parts[:i]) + "/")
+        self.checksum = self.product_md5()
+
+        self.records = product_records(products, self.product_size, self.checksum)
+        self.ids = { Record['Id'] for Record in self.records }
+
+
+    @property
+    def url(self):
+        return "http://{:s}:{:d}".format(*self.server_address[:2])
+
+
+    def environ(self):
+        """
+        Environment variables pointing the OData scripts to this server.
+        """
+        return { "CDSE_CATALOGUE_URL" : self.url + CATALOGUE_PATH,
+                 "CDSE_ZIPPER_URL"    : self.url + ZIPPER_PATH,
+                 "CDSE_IDENTITY_URL"  : self.url + IDENTITY_PATH }
+
+
+    def content(self, position, length):
+        """
+        length bytes of a product from the given position.
+        """
+        if (self.archive is not None):
+            return self.archive[position:position + length]
+
+        offset = position % WRITE_SIZE
+        chunk = self.block[offset:offset + length]
+        while (len(chunk) < length):
+            chunk += self.block[:length - len(chunk)]
+        return chunk
+
+
+    def node_children(self, Prefix):
+        """
+        Names of the files and directories right under the directory Prefix
+        of the archive ("" for its top).
+        """
+        return sorted({ path[len(Prefix):].rstrip("/").split("/")[0]
+                        for path in list(self.node_files) + list(self.node_dirs)
+                        if path.startswith(Prefix) and (len(path) > len(Prefix)) })
+
+
+    def product_md5(self):
+        md5_hash = md5()
+        for position in range(0, self.product_size, WRITE_SIZE):
+            md5_hash.update(self.content(position, min(WRITE_SIZE, self.product_size - position)))
+        return md5_hash.hexdigest()
+
+
+    def draw_error(self, endpoint="zipper"):
+        """
+        Status of an error injected into a response of the endpoint, or
+        None.
+        """
+        if endpoint not in self.error_endpoints:
+            return None
+
+        with self.lock:
+            x = self.random.random()
+
+        for status, rate in sorted(self.error_rates.items()):
+            if (x < rate):
+                return status
+            x -= rate
+
+        return None
+
+
+    def issue_token(self):
+        """
+        New token record, in the format of the identity service.
+        """
+        with self.lock:
+            access_token = "mock-access-{:d}".format(len(self.tokens))
+            self.tokens[access_token] = time() + self.token_lifetime
+
+        return { 'access_token'       : access_token,
+                 'refresh_token'      : "mock-refresh",
+                 'expires_in'         : self.token_lifetime,
+                 'refresh_expires_in' : 3600,
+                 'token_type'         : "Bearer" }
+
+
+    def token_valid(self, authorization):
+        if not authorization or not authorization.startswith("Bearer "):
+            return False
+        with self.lock:
+            return self.tokens.get(authorization[7:], 0) > time()
+
+
+    def record(self, endpoint, status, arrival, first_byte, sent):
+        with self.lock:
+            self.requests.append((endpoint, status, arrival, first_byte, sent))
+
+
+    def start(self):
+        """
+        Serve in a background thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def serve(conn, **kwargs):
+    """
+    Run a MockServer built with the given arguments until the process is
+    terminated, after sending its URL and environment variables through
+    the connection conn (see multiprocessing.Pipe).
+    """
+    server = MockServer(**kwargs)
+    conn.send((server.url, server.environ()))
+    conn.close()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    port = int(argv[1]) if (len(argv) > 1) else 8080
+    server = MockServer(port=port, check_tokens=False)
+
+    print("Mock Copernicus Dataspace services on {:s}".format(server.url))
+    print("Point the OData scripts to it with:\n")
+    for name, value in server.environ().items():
+        print("    export {:s}={:s}".format(name, value))
+    print()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
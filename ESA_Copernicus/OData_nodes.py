@@ -0,0 +1,120 @@
+#
+#  Files of a product of the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/) listed through the 'Nodes' navigation
+#  of the OData API, to download some of them instead of the whole archive.
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: walk of the node tree of a product, files selected
+#         with glob patterns.
+#
+#
+#  Usage:
+#      from OData_nodes import product_url, walk_nodes, local_path
+#
+#      def list_nodes(url):
+#          # JSON listing of url, e.g. .../Products(Id)/Nodes(X)/Nodes
+#          return session.get(url).json()
+#
+#      for node in walk_nodes(list_nodes, product_url(ZIPPER_URL, Id), ["*_B04_10m.jp2"]):
+#          # node.url + "/$value" gives the bytes of the file
+#          Filename = local_path(node.path, "S2A_...SAFE")
+#
+#  The listing of a product, Products(Id)/Nodes, holds its SAFE directory.
+#  Each node is a file or a directory, whose children are listed by
+#  appending /Nodes to its URL, e.g.
+#      Products(Id)/Nodes(S2A_...SAFE)/Nodes(GRANULE)/Nodes
+#
+
+
+#  Load libraries
+import os
+from os.path import join, normpath, isabs
+from urllib.parse import quote
+from fnmatch import fnmatchcase
+from collections import namedtuple
+
+
+#  File of a product: path in the product (e.g. "S2A_...SAFE/MTD_MSIL2A.xml"),
+#  URL of its node and size in bytes
+NodeFile = namedtuple("NodeFile", ["path", "url", "size"])
+
+
+def product_url(base_url, ProductId):
+    """
+    URL of a product, whose nodes are listed under product_url + "/Nodes".
+    """
+    return base_url + "/Products({:s})".format(ProductId)
+
+
+def child_url(url, Name):
+    return url + "/Nodes({:s})".format(quote(Name, safe=""))
+
+
+def node_list(listing):
+    """
+    Nodes of a listing: the "result" of the Copernicus Dataspace, or
+    "value" as in the other OData responses.
+    """
+    if isinstance(listing, dict):
+        return listing.get('result', listing.get('value', []))
+    return listing
+
+
+def walk_nodes(list_nodes, url, patterns):
+    """
+    Files under the node at url whose path matches any of the glob
+    patterns, '*' matching across directories as well. list_nodes(url)
+    returns the JSON listing of url, e.g. from a cache. The directories are
+    recognized by their number of children.
+    """
+    Files = []
+    Stack = [ (url, "") ]
+    while Stack:
+        url, Prefix = Stack.pop()
+        for node in node_list(list_nodes(url + "/Nodes")):
+            Path = Prefix + node['Name']
+            Url = child_url(url, node.get('Id') or node['Name'])
+
+            if (node.get('ChildrenNumber') or 0) > 0:
+                Stack.append((Url, Path + "/"))
+            elif any(fnmatchcase(Path, pattern) for pattern in patterns):
+                Files.append(NodeFile(Path, Url, int(node.get('ContentLength') or 0)))
+
+    return sorted(Files)
+
+
+def local_path(Path, Directory):
+    """
+    Path under Directory to which a file of a product is written. The SAFE
+    directory at the top of the product is dropped if it has the name of
+    Directory, so that the files land where unzipping the whole archive
+    would put them.
+    """
+    Top = os.path.basename(normpath(Directory)) + "/"
+    if Path.startswith(Top):
+        Path = Path[len(Top):]
+
+    Path = normpath(Path)
+    if isabs(Path) or (Path == "..") or Path.startswith("../"):
+        raise ValueError("unsafe node path {:s}".format(Path))
+
+    return join(Directory, Path)
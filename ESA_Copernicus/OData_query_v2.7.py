@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+#
+#  Script to query the databases of the Copernicus Dataspace and output the
+#  resulting records to a log file.
+#  Version 2.7
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.1: 20.03.2024
+#       * When MD5 is not available from query output a series of '-'.
+#
+#  1.2: 17.10.2026
+#       * Send the query through the pooled session of OData_transport.
+#
+#  2.0: 17.10.2026
+#       * Follow the pagination of the catalogue ('@odata.nextLink', or $skip)
+#         instead of stopping after the first $top records. The pages are
+#         written to the log file as they arrive, so that memory use does not
+#         grow with the number of products.
+#       * Ask for the total number of matching products with $count=true.
+#       * The query functions now live in the module OData_search.
+#
+#  2.1: 17.10.2026
+#       * Optionally split the sensing window into params_TimeShards intervals
+#         and the polygon into a grid of params_PolyShards cells, and run the
+#         queries of all the shards concurrently. The records are merged into
+#         a single log file, without duplicates.
+#
+#  2.2: 17.10.2026
+#       * Keep the responses of the catalogue in an on-disk cache, keyed by
+#         the normalized request, with a time to live and a size limit. The
+#         cache can be refreshed or bypassed from the preamble or from the
+#         command line.
+#
+#  2.3: 17.10.2026
+#       * Incremental mode: when params_QueryName is set, a high-water mark of
+#         the publication dates already seen is kept for the query, only
+#         the products published since are requested, and they are appended
+#         to a log file kept for the query in params_StateDir.
+#
+#  2.4: 17.10.2026
+#       * The records are built column by column (OData_search 1.3). The
+#         checksum is selected by algorithm (params_Checksum), and the log
+#         file has the new columns 'ContentLength', 'ContentStart',
+#         'ContentEnd', 'S3Path' and 'Footprint'. Records appended to a log
+#         file written by an earlier version keep the columns of that file.
+#
+#  2.5: 17.10.2026
+#       * Batch mode over several areas of interest: with params_AOIFile, the
+#         named polygons of the file are queried concurrently instead of
+#         params_Poly, and the records are merged into a single log file
+#         without duplicates. The 'AOI' column lists the areas covered by
+#         each product, so that it is downloaded only once.
+#
+#  2.6: 17.10.2026
+#       * The footprints of the products returned by the catalogue are kept
+#         in a local R-tree index (OData_spatial), params_FootprintIndex.
+#         With --offline, the query is answered from this index, without
+#         contacting the catalogue.
+#
+#  2.7: 17.10.2026
+#       * The footprint index becomes a local mirror of the catalogue
+#         (OData_catalogue), params_Catalogue, which keeps the products with
+#         their attributes ($expand=Attributes). A query which was run
+#         before is answered from the mirror, and only the products
+#         published since are asked from the catalogue.
+#       * The algorithm of the checksums is written to the preamble of the
+#         log file ("Checksum = ..."), for OData_download and OData_verify.
+#         Records appended to a log file keep the algorithm of that file.
+#       * The local catalogue is off by default, and the responses for the
+#         products published since the synchronization mark are taken from
+#         the cache within params_CacheTTL, as the other responses.
+#       * params_MaxRecords applies to each area of interest, instead of to
+#         all of them together, so that the areas no longer compete for
+#         the records. All the areas in which a product is found are listed
+#         in its 'AOI' column, also once the records of an area are capped.
+#
+#
+#  Usage: ./OData_query_vx.x.py [--refresh-cache | --no-cache | --offline]
+#
+#      --refresh-cache : query the catalogue again, in full, and update the
+#                        cache and the local catalogue,
+#      --no-cache      : neither read nor write the cache,
+#      --offline       : find the products in the local catalogue only.
+#
+#
+
+###  BEGIN Set Data Query Parameters  ###
+
+#  Input parameters for querying the database:
+#
+#  params_Collect : name of collection
+#  params_Poly : coordinates of vertices constituting the polygon covering the
+#                Area of Interest
+#  params_StartTime : start date and time of sensing,
+#                     format = "%Y-%m-%dT%H:%M:%S.000"
+#  params_StopTime : end date and time of sensing,
+#                     format = "%Y-%m-%dT%H:%M:%S.000"
+#  params_Cloud : maximum percentage of cloud cover in image
+#  params_MaxRecords : maximum number of records to retrieve from database
+#                      matching the input parameters ("" for no limit), for
+#                      each area of interest with params_AOIFile
+#  params_PageSize : number of records requested per page (at most 1000)
+#  params_TimeShards : number of intervals the sensing window is split into
+#  params_PolyShards : (nx, ny), number of columns and rows of the grid the
+#                      bounding box of the polygon is split into
+#  params_QueryWorkers : number of shards queried concurrently
+#  params_CacheDir : directory of the cache of query responses
+#  params_CacheTTL : number of seconds after which a cached response is stale
+#  params_CacheMaxMB : size limit of the cache in MB, the least recently used
+#                      responses being removed beyond it
+#  params_CacheMode : "use", "refresh" (ask the catalogue again and update the
+#                     cache) or "bypass" (do not use the cache at all)
+#  params_QueryName : name under which the query is saved for incremental
+#                     runs ("" to write a new log file with all the records
+#                     at each run)
+#  params_StateDir : directory holding the high-water mark and the log file of
+#                    the saved queries
+#  params_Checksum : algorithm of the checksum written to the 'Checksum'
+#                    column, "MD5" or "BLAKE3", also written to the preamble
+#                    of the log file. OData_download and OData_verify check
+#                    the files with the algorithm of the log file.
+#  params_AOIFile : file of named areas of interest queried instead of
+#                   params_Poly ("" to query params_Poly), either GeoJSON
+#                   (polygons named by their 'name' property) or text with
+#                   one area per line, NAME = (lon lat, lon lat, ...)
+#  params_Catalogue : SQLite file of the local catalogue, which keeps all the
+#                     products returned by the catalogue with their
+#                     attributes ("" to keep none), e.g.
+#                     ".OData_catalogue.sqlite"
+#
+
+##  Please set the following:
+
+params_Collect = "SENTINEL-2"
+params_Poly = "(58.0586 -19.6394, 58.0586 -20.7519,57.06282 -20.7519,57.06282 -19.6394, 58.0586 -19.6394)"
+params_StartTime = "2021-08-01T00:00:00.000"
+params_StopTime  = "2021-08-31T23:59:59.999"
+params_Cloud = "50.00"
+params_MaxRecords = "100"
+params_PageSize = "1000"
+params_TimeShards = 1
+params_PolyShards = (1, 1)
+params_QueryWorkers = 4
+params_CacheDir = ".OData_cache"
+params_CacheTTL = 86400
+params_CacheMaxMB = 512
+params_CacheMode = "use"
+params_QueryName = ""
+params_StateDir = "OData_state"
+params_Checksum = "MD5"
+params_AOIFile = ""
+params_Catalogue = ""
+
+###  END Set Data Query Parameters  ###
+
+
+#
+#  Output: after querying the database, the script writes a log file named with
+#          the time interval defining the data search and the current date and
+#          time (at the time the script is run). The log file contains a
+#          preamble with the query parameters. The rest of the file is a set of
+#          records listing the data files which match the input query
+#          parameters. The preamble and the records are separated by the
+#          following string: "---------------------"
+#          The records are in a CSV format with the following header:
+#          'Id', 'Name', 'Checksum', 'Online', 'Downloaded', 'ContentLength',
+#          'ContentStart', 'ContentEnd', 'S3Path', 'Footprint'
+#          followed, with params_AOIFile, by 'AOI': the names of the areas
+#          covered by the product, separated by ';'.
+#
+#          In incremental mode (params_QueryName set), the log file is
+#          params_StateDir/params_QueryName.log and each run appends the
+#          records of the products published since the previous run.
+#
+#          With params_Catalogue, the records of a query run before are
+#          first taken from the local catalogue, then followed by those of
+#          the products published since. With --offline, the records are
+#          those of the local catalogue which match the query parameters.
+#
+
+
+###  Libraries
+from sys import argv
+from os import makedirs
+from os.path import isfile
+from time import localtime, strptime, strftime
+from OData_transport import PooledSession
+from OData_search import build_filter, split_time, split_polygon, query_concurrently, page_records, read_aois, DATE_FORMAT
+from OData_logfile import log_columns, read_log, write_log, read_preamble, checksum_algorithm
+from OData_cache import QueryCache
+from OData_watermark import Watermark
+from OData_catalogue import Catalogue
+
+
+
+###  BEGIN Parsing of command line arguments  ###
+
+if "--refresh-cache" in argv[1:]:
+    params_CacheMode = "refresh"
+if "--no-cache" in argv[1:]:
+    params_CacheMode = "bypass"
+
+# Refreshing asks the catalogue for all the products again, not only for
+# those published since the last run
+FullSync = (params_CacheMode == "refresh")
+
+Offline = ("--offline" in argv[1:])
+if Offline and (params_Catalogue == ""):
+    print("***  ERROR: --offline needs a local catalogue, params_Catalogue.")
+    exit(1)
+if Offline and (params_QueryName != ""):
+    print("***  NOTE: --offline ignores the incremental mode of query '{:s}'.".format(params_QueryName))
+    params_QueryName = ""
+
+###  END Parsing of command line arguments  ###
+
+
+
+###  BEGIN Construct output header for log file  ###
+
+##  Areas of interest: (name, polygon), a single unnamed one by default
+if (params_AOIFile != ""):
+    AOIs = read_aois(params_AOIFile)
+    Polygon = "{:d} polygon(s) of {:s}".format(len(AOIs), params_AOIFile)
+else:
+    AOIs = [ (None, params_Poly) ]
+    Polygon = params_Poly
+
+##  Make log file name
+LogFile  = "OData_"
+LogFile += strftime("%Y%m%d", strptime(params_StartTime, "%Y-%m-%dT%H:%M:%S.000"))
+LogFile += "-"
+LogFile += strftime("%Y%m%d", strptime(params_StopTime, "%Y-%m-%dT%H:%M:%S.999"))
+LogFile += "_query_"
+LogFile += strftime("%Y%m%d_%H%M%S", localtime())
+LogFile += ".log"
+
+##  In incremental mode, the records are appended to the log of the query
+if (params_QueryName != ""):
+    mark = Watermark(params_StateDir, params_QueryName)
+    mark.load()
+    LogFile = mark.log_file
+    NewLog = (mark.mark is None) or not isfile(LogFile)
+
+    # A cached response could miss the products published since it was stored
+    if (params_CacheMode == "use"):
+        params_CacheMode = "refresh"
+else:
+    mark = None
+    NewLog = True
+
+##  Records appended to an existing log file keep the columns and the
+##  checksum algorithm of that file
+Columns = None if NewLog else log_columns(LogFile)
+if not NewLog:
+    params_Checksum = checksum_algorithm(read_preamble(LogFile))
+
+
+##  Template for section preceding the CSV section
+log_template = """\
+Collection = {0:s}
+Polygon = {1:s}
+Sensing start = {2:s}
+Sensing stop  = {3:s}
+Cloud cover = {4:s}
+Max records = {5:s}
+Checksum = {6:s}
+---------------------
+"""
+
+###  END Construct output header for log file  ###
+
+
+
+###  BEGIN Query Copernicus database and write records to log file page by page  ###
+
+catalogue = Catalogue(params_Catalogue) if (params_Catalogue != "") else None
+
+# Areas of interest answered from the local catalogue first: all of them
+# offline, else those whose query was run before, outside of the incremental
+# mode. The synchronization mark of each area tells up to which publication
+# date the local catalogue holds all its products.
+Syncs = []
+LocalAOIs = []
+for AOIIdx, (AOI, Poly) in enumerate(AOIs):
+    sync = None
+    if (catalogue is not None) and not Offline and (mark is None):
+        sync = catalogue.sync_mark(build_filter(params_Collect, Poly, params_StartTime, params_StopTime, params_Cloud))
+        if not FullSync:
+            sync.load()
+    Syncs.append(sync)
+
+    if Offline or ((sync is not None) and (sync.mark is not None)):
+        LocalAOIs.append(AOIIdx)
+
+# Filters for the query, one per shard, and the area of interest of each
+# shard. Only the products published since the synchronization mark of the
+# area are asked from the catalogue.
+Shards = []
+ShardAOIs = []
+ShardAOIIdx = []
+for AOIIdx, (AOI, Poly) in enumerate(AOIs if not Offline else []):
+    for ShardStart, ShardStop in split_time(params_StartTime, params_StopTime, params_TimeShards):
+        for Cell in split_polygon(Poly, *params_PolyShards):
+            flt = build_filter(params_Collect, Poly, ShardStart, ShardStop, params_Cloud, Cell)
+            Shards.append(Syncs[AOIIdx].restrict(flt) if (Syncs[AOIIdx] is not None) else flt)
+            ShardAOIs.append(AOI)
+            ShardAOIIdx.append(AOIIdx)
+
+# In incremental mode only ask for the products published since the mark.
+# All of them are needed to move the mark forward, so there is no limit on
+# the number of records.
+if (mark is not None):
+    if (mark.mark is not None):
+        print("\nIncremental query '{:s}': products published since {:s}".format(params_QueryName, mark.mark))
+    Shards = [ mark.restrict(flt) for flt in Shards ]
+    MaxRecords = None
+elif (params_MaxRecords == ""):
+    MaxRecords = None
+else:
+    MaxRecords = int(params_MaxRecords)
+
+session = PooledSession(pool_size=params_QueryWorkers)
+cache = QueryCache(params_CacheDir, ttl=params_CacheTTL, max_bytes=params_CacheMaxMB * 2**20, mode=params_CacheMode)
+
+# Ids of the records already written, to drop the duplicates found by
+# overlapping shards, names of the areas of interest in which each product
+# was found, and Ids of the records taken for each area, at most MaxRecords
+SeenIds = set()
+MemberIds = {}
+TakenIds = {}
+PublishedIds = {}
+count_records = 0
+count_pages = 0
+
+
+def write_page(ShardIdx, page, AOI=None, remote=True):
+    """
+    Append the new records of a page to the log file. Called for each page
+    of each shard, one call at a time. Returns False once MaxRecords
+    records have been taken for the area of interest of the shard, to stop
+    its shards. The pages of the local catalogue are written with
+    remote=False and the name of their area of interest.
+    """
+    global count_records, count_pages
+
+    # All the products returned by the catalogue go to the local catalogue,
+    # whether or not the records are written
+    if remote:
+        AOI = ShardAOIs[ShardIdx]
+        if (catalogue is not None):
+            catalogue.add_page(page, params_Collect)
+            sync = Syncs[ShardAOIIdx[ShardIdx]]
+            if (sync is not None):
+                for record in page['value']:
+                    sync.update(record['Id'], record['PublicationDate'])
+
+    # Every area in which a product is found is recorded, even when the
+    # product was already written for another area or the area is capped
+    if (params_AOIFile != ""):
+        for record in page['value']:
+            MemberIds.setdefault(record['Id'], set()).add(AOI)
+
+    # Each area has MaxRecords records of its own, whatever the order in
+    # which the shards of the areas arrive
+    Taken = TakenIds.setdefault(AOI, set())
+    if (MaxRecords is not None) and (len(Taken) >= MaxRecords):
+        return False
+
+    if ('@odata.count' in page):
+        print("Shard {:3d}: {:d} product(s) matching the query".format(ShardIdx, page['@odata.count']))
+
+    # Records of this page which were not taken for this area yet
+    log_df = page_records(page, algorithm=params_Checksum)
+    if (params_AOIFile != ""):
+        log_df['AOI'] = AOI
+    log_df = log_df[~log_df['Id'].isin(Taken)].drop_duplicates('Id')
+    if (mark is not None):
+        NewIds = { record['Id'] for record in page['value'] if mark.is_new(record['Id'], record['PublicationDate']) }
+        log_df = log_df[log_df['Id'].isin(NewIds)]
+    if (MaxRecords is not None):
+        log_df = log_df.iloc[:MaxRecords - len(Taken)]
+    Taken.update(log_df['Id'])
+
+    # Records which were not written yet, for another area
+    log_df = log_df[~log_df['Id'].isin(SeenIds)]
+    SeenIds.update(log_df['Id'])
+
+    # The CSV header is written with the first page of a new log file
+    if (Columns is not None):
+        log_df = log_df.reindex(columns=Columns)
+    f.write(log_df.to_csv(index=False, header=(NewLog and (count_pages == 0)), date_format=DATE_FORMAT))
+    f.flush()
+
+    # Publication dates of the records written, to move the mark forward
+    if (mark is not None):
+        for record in page['value']:
+            if record['Id'] in SeenIds:
+                PublishedIds[record['Id']] = record['PublicationDate']
+
+    count_pages += 1
+    count_records += log_df.shape[0]
+    if remote:
+        print("Shard {:3d}: {:4d} new record(s), {:d} written so far".format(ShardIdx, log_df.shape[0], count_records))
+    else:
+        print("Local    : {:4d} new record(s), {:d} written so far".format(log_df.shape[0], count_records))
+
+
+print("\nWriting query parameters and results to file {:s}".format(LogFile))
+if (len(LocalAOIs) > 0):
+    print("Searching the local catalogue {:s} ({:d} product(s)) for {:d} area(s) ...".format(params_Catalogue, catalogue.count(), len(LocalAOIs)))
+if not Offline:
+    print("Querying {:d} shard(s) using {:d} worker(s) ...".format(len(Shards), params_QueryWorkers))
+print()
+if NewLog:
+    if (mark is not None):
+        makedirs(params_StateDir, exist_ok=True)
+    with open(LogFile, 'w') as f:
+        f.write(log_template.format(params_Collect, Polygon, params_StartTime, params_StopTime, params_Cloud, params_MaxRecords, params_Checksum))
+
+with open(LogFile, 'a') as f:
+    # Records of the local catalogue, written as the pages of the catalogue
+    # would be
+    for AOIIdx in LocalAOIs:
+        AOI, Poly = AOIs[AOIIdx]
+        Records = catalogue.search(Poly, params_StartTime, params_StopTime, params_Cloud, params_Collect)
+        if (Syncs[AOIIdx] is not None):
+            print("Local    : {:d} product(s) published until {:s}".format(len(Records), Syncs[AOIIdx].mark))
+        else:
+            print("Local    : {:d} product(s)".format(len(Records)))
+        for Start in range(0, max(len(Records), 1), int(params_PageSize)):
+            if write_page(None, { 'value' : Records[Start:Start + int(params_PageSize)] }, AOI=AOI, remote=False) is False:
+                break
+
+    if not Offline:
+        query_concurrently(session, Shards, write_page, workers=params_QueryWorkers, page_size=int(params_PageSize), cache=cache,
+                           expand="Attributes" if (catalogue is not None) else None)
+
+# The records were written with the first area they were found in, the
+# 'AOI' column is now filled in with all of them
+if (params_AOIFile != "") and (count_records > 0):
+    log_hdr, log_df = read_log(LogFile)
+    AOIColumn = log_df['Id'].map(lambda Id: ";".join(sorted(MemberIds[Id])) if Id in MemberIds else None)
+    log_df['AOI'] = AOIColumn.fillna(log_df['AOI']) if ('AOI' in log_df.columns) else AOIColumn
+    write_log(LogFile, log_hdr, log_df)
+
+    count_shared = sum(1 for Id in log_df['Id'] if len(MemberIds.get(Id, ())) > 1)
+    print("\n{:d} product(s) cover more than one of the {:d} area(s) of interest".format(count_shared, len(set(AOI for AOI, Poly in AOIs))))
+
+# Save the synchronization marks once all the products of an area are in
+# the local catalogue, which is not the case if its query stopped at
+# MaxRecords
+for AOIIdx, sync in enumerate(Syncs):
+    if (sync is not None) and ((MaxRecords is None) or (len(TakenIds.get(AOIs[AOIIdx][0], ())) < MaxRecords)):
+        sync.save()
+
+# Save the new mark once the records are in the log file
+if (mark is not None):
+    for Id, PublicationDate in PublishedIds.items():
+        mark.update(Id, PublicationDate)
+    mark.save()
+    print("\nHigh-water mark of query '{:s}' now at {:s}".format(params_QueryName, str(mark.mark)))
+
+print("\n------------------------------------------------------------------------------")
+print("{:d} record(s) written to file {:s}".format(count_records, LogFile))
+if (params_CacheMode == "use") and not Offline:
+    print("{:d} page(s) read from the cache, {:d} requested from the catalogue".format(cache.hits, cache.misses))
+print("------------------------------------------------------------------------------")
+
+###  END Query Copernicus database and write records to log file page by page  ###
+
+
+print()
+exit(0)
@@ -0,0 +1,223 @@
+#
+#  Rate limiting and retry policy shared by the workers of the OData scripts
+#  for the Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: token bucket, Retry-After, exponential backoff with
+#         jitter and circuit breaker.
+#
+#  1.1: 17.10.2026
+#       * The pause of the circuit breaker may be given in fractions of a
+#         second.
+#
+#
+#  Usage:
+#      from OData_ratelimit import RateLimiter, CircuitOpenError
+#
+#      limiter = RateLimiter(rate=10, burst=20)
+#      limiter.acquire()                  # before each request
+#      limiter.rate_limited(retry_after)  # after a 429
+#      limiter.record_failure()           # after a 5xx or connection reset
+#      StopEvent.wait(limiter.backoff(attempt))
+#      limiter.record_success()           # after any other response
+#
+
+
+#  Load libraries
+from time import time, sleep
+from email.utils import parsedate_to_datetime
+import random
+import threading
+
+
+###  BEGIN Define custom exceptions  ###
+
+class CircuitOpenError(Exception):
+    pass
+
+###  END Define custom exceptions  ###
+
+
+def parse_retry_after(value):
+    """
+    Number of seconds to wait according to a Retry-After header, which is
+    either a number of seconds or an HTTP date. None if the header is
+    missing or cannot be understood.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Request budget: up to 'burst' requests may be sent at once, after which
+    requests are let through at 'rate' per second.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.stamp = time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Take one token from the bucket. Returns 0 on success, otherwise the
+        number of seconds after which a token will be available.
+        """
+        with self.lock:
+            now = time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+            if (self.tokens >= 1.0):
+                self.tokens -= 1.0
+                return 0.0
+
+            return (1.0 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Shared by all the workers of a script. It combines:
+      * a token bucket limiting the rate at which requests are sent,
+      * a pause applied to every worker after a 429, whose length is taken
+        from the Retry-After header when the server sends one,
+      * exponential backoff with full jitter between the retries of a worker
+        after a 5xx response or a connection error,
+      * a circuit breaker: after 'breaker_threshold' consecutive failures
+        (from any worker) all the workers pause for 'breaker_cooldown'
+        seconds. If the breaker opens 'breaker_max_trips' times in a row
+        without any success in between, CircuitOpenError is raised.
+    """
+
+    def __init__(self, rate=10, burst=20, default_wait=61,
+                 backoff_base=2, backoff_cap=300,
+                 breaker_threshold=10, breaker_cooldown=300, breaker_max_trips=3):
+        self.bucket = TokenBucket(rate, burst)
+        self.default_wait = default_wait
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_max_trips = breaker_max_trips
+
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+        self.failures = 0
+        self.trips = 0
+
+
+    def pause(self, seconds):
+        """
+        Make every worker hold back for the given number of seconds. Returns
+        True if this extended the current pause.
+        """
+        with self.lock:
+            until = time() + seconds
+            if (until > self.paused_until):
+                self.paused_until = until
+                return True
+            return False
+
+
+    def remaining_pause(self):
+        with self.lock:
+            return max(0.0, self.paused_until - time())
+
+
+    def acquire(self, stop_event=None):
+        """
+        Block until a request may be sent: wait for the end of any pause,
+        then for a token from the bucket. Returns early if stop_event is set.
+        """
+        while (stop_event is None) or not stop_event.is_set():
+            wait = self.remaining_pause()
+            if (wait <= 0):
+                wait = self.bucket.take()
+                if (wait <= 0):
+                    return
+
+            if (stop_event is None):
+                sleep(wait)
+            else:
+                stop_event.wait(wait)
+
+
+    def rate_limited(self, retry_after=None):
+        """
+        Called after a 429. Pauses every worker for the time given by the
+        Retry-After header, or default_wait seconds. Returns the length of
+        the pause if it was extended, None otherwise.
+        """
+        wait = parse_retry_after(retry_after)
+        if (wait is None):
+            wait = self.default_wait
+
+        if self.pause(wait):
+            return wait
+        return None
+
+
+    def backoff(self, attempt):
+        """
+        Number of seconds to wait before retry number 'attempt' (from 1) of
+        a request: uniformly drawn between 0 and base * 2^(attempt-1),
+        capped at backoff_cap.
+        """
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trips = 0
+
+
+    def record_failure(self):
+        """
+        Count a transient failure. Opens the circuit breaker, i.e. pauses all
+        workers, once breaker_threshold failures have happened in a row.
+        Returns the length of the pause if the breaker opened, None otherwise.
+        """
+        with self.lock:
+            self.failures += 1
+            if (self.failures < self.breaker_threshold):
+                return None
+
+            self.failures = 0
+            self.trips += 1
+            if (self.trips > self.breaker_max_trips):
+                raise CircuitOpenError("server still failing after {:d} pauses of {:g} s".format(self.breaker_max_trips, self.breaker_cooldown))
+
+            self.paused_until = max(self.paused_until, time() + self.breaker_cooldown)
+            return self.breaker_cooldown
@@ -0,0 +1,290 @@
+#
+#  Selective extraction of the members of a ZIP archive read with HTTP Range
+#  requests, e.g. the band files of a product of the Copernicus Dataspace
+#  Ecosystem (https://dataspace.copernicus.eu/) without downloading the
+#  whole SAFE archive.
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: end of central directory (ZIP64 included), central
+#         directory, members selected with glob patterns, stored or deflated
+#         members decompressed on the fly and checked against their CRC-32.
+#
+#
+#  Usage:
+#      from OData_remotezip import RemoteZip
+#
+#      def fetch(start, end):
+#          # chunks of bytes start to end (inclusive) of the archive
+#          ...
+#
+#      archive = RemoteZip(fetch, size)
+#      for member in archive.select(["*_B04_10m.jp2", "*_SCL_20m.jp2"]):
+#          archive.extract(member, archive.member_path(member, "S2A_...SAFE"))
+#
+#  Only the end of the archive, the central directory and the selected
+#  members are read, with one request for the local header of each member
+#  and one for its data.
+#
+
+
+#  Load libraries
+import os
+from os.path import isfile, getsize, join, dirname, normpath, isabs
+import struct
+import zlib
+from fnmatch import fnmatchcase
+from collections import namedtuple
+
+
+###  BEGIN Define custom exceptions  ###
+
+class RemoteZipError(Exception):
+    pass
+
+class MemberIntegrityError(RemoteZipError):
+    pass
+
+###  END Define custom exceptions  ###
+
+
+#  Signatures and fixed-size parts of the ZIP records
+EOCD_SIGNATURE = b"PK\x05\x06"
+EOCD_FORMAT = "<4sHHHHIIH"
+EOCD64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+EOCD64_LOCATOR_FORMAT = "<4sIQI"
+EOCD64_SIGNATURE = b"PK\x06\x06"
+EOCD64_FORMAT = "<4sQHHIIQQQQ"
+CENTRAL_SIGNATURE = b"PK\x01\x02"
+CENTRAL_FORMAT = "<4sHHHHHHIIIHHHHHII"
+LOCAL_SIGNATURE = b"PK\x03\x04"
+LOCAL_FORMAT = "<4sHHHHHIIIHH"
+
+#  Compression methods which can be extracted
+STORED = 0
+DEFLATED = 8
+
+#  Number of bytes read from the end of the archive at first, enough for the
+#  end of central directory with the longest comment and, for most
+#  products, the whole central directory
+TAIL_SIZE = 2**20
+
+ZipMember = namedtuple("ZipMember", ["name", "method", "crc", "csize", "usize", "offset", "flags"])
+
+
+def unpack(fmt, data, offset=0):
+    return struct.unpack_from(fmt, data, offset)
+
+
+class RemoteZip:
+    """
+    ZIP archive of size bytes read through fetch(start, end), a function
+    returning an iterable of chunks of bytes start to end (inclusive) of
+    the archive, e.g. from an HTTP Range request.
+    """
+
+    def __init__(self, fetch, size, tail_size=TAIL_SIZE):
+        self.fetch = fetch
+        self.size = size
+        self.tail_size = tail_size
+        self.members = None
+
+
+    def read(self, start, end):
+        """
+        Bytes start to end (inclusive) of the archive.
+        """
+        data = b"".join(self.fetch(start, end))
+        if (len(data) != end - start + 1):
+            raise MemberIntegrityError("{:d} bytes received instead of {:d}".format(len(data), end - start + 1))
+        return data
+
+
+    def central_directory(self):
+        """
+        Bytes of the central directory, found from the end of central
+        directory record at the end of the archive.
+        """
+        TailStart = max(0, self.size - self.tail_size)
+        tail = self.read(TailStart, self.size - 1)
+
+        Position = tail.rfind(EOCD_SIGNATURE)
+        if (Position < 0):
+            raise RemoteZipError("end of central directory not found, not a ZIP archive")
+
+        (sig, disk, cd_disk, count_disk, count, cd_size, cd_offset, comment_len) = unpack(EOCD_FORMAT, tail, Position)
+
+        # ZIP64: the sizes and offsets are in the ZIP64 end of central
+        # directory record, located by the record before the end of central
+        # directory
+        LocatorPosition = Position - struct.calcsize(EOCD64_LOCATOR_FORMAT)
+        if (LocatorPosition >= 0) and (tail[LocatorPosition:LocatorPosition + 4] == EOCD64_LOCATOR_SIGNATURE):
+            eocd64_offset = unpack(EOCD64_LOCATOR_FORMAT, tail, LocatorPosition)[2]
+            if (eocd64_offset >= TailStart):
+                record = tail[eocd64_offset - TailStart:]
+            else:
+                record = self.read(eocd64_offset, eocd64_offset + struct.calcsize(EOCD64_FORMAT) - 1)
+
+            if (record[:4] != EOCD64_SIGNATURE):
+                raise RemoteZipError("ZIP64 end of central directory not found")
+            cd_size, cd_offset = unpack(EOCD64_FORMAT, record)[8:10]
+
+        if (cd_offset >= TailStart):
+            return tail[cd_offset - TailStart:cd_offset - TailStart + cd_size]
+
+        return self.read(cd_offset, cd_offset + cd_size - 1)
+
+
+    def list(self):
+        """
+        Members of the archive, read from its central directory once.
+        """
+        if (self.members is not None):
+            return self.members
+
+        directory = self.central_directory()
+        self.members = []
+        Position = 0
+        Size = struct.calcsize(CENTRAL_FORMAT)
+        while (Position + Size <= len(directory)):
+            (sig, made_by, needed, flags, method, mtime, mdate, crc, csize, usize,
+             name_len, extra_len, comment_len, disk, int_attr, ext_attr, offset) = unpack(CENTRAL_FORMAT, directory, Position)
+            if (sig != CENTRAL_SIGNATURE):
+                raise RemoteZipError("bad central directory entry at byte {:d}".format(Position))
+
+            Start = Position + Size
+            name = directory[Start:Start + name_len].decode("utf-8" if (flags & 0x800) else "cp437")
+            extra = directory[Start + name_len:Start + name_len + extra_len]
+
+            # ZIP64 extra field: the values which do not fit in 32 bits, in
+            # this order
+            ExtraPosition = 0
+            while (ExtraPosition + 4 <= len(extra)):
+                tag, length = unpack("<HH", extra, ExtraPosition)
+                if (tag == 0x0001):
+                    values = list(unpack("<{:d}Q".format(length // 8), extra, ExtraPosition + 4))
+                    if (usize == 0xFFFFFFFF):
+                        usize = values.pop(0)
+                    if (csize == 0xFFFFFFFF):
+                        csize = values.pop(0)
+                    if (offset == 0xFFFFFFFF):
+                        offset = values.pop(0)
+                    break
+                ExtraPosition += 4 + length
+
+            self.members.append(ZipMember(name, method, crc, csize, usize, offset, flags))
+            Position = Start + name_len + extra_len + comment_len
+
+        return self.members
+
+
+    def select(self, patterns):
+        """
+        Members (files, not directories) whose path matches any of the glob
+        patterns, '*' matching across directories as well.
+        """
+        return [ member for member in self.list()
+                 if not member.name.endswith("/") and any(fnmatchcase(member.name, pattern) for pattern in patterns) ]
+
+
+    def member_path(self, member, Directory):
+        """
+        Path under Directory to which a member is extracted. The top
+        directory of the archive is dropped if it has the name of Directory,
+        as the SAFE directory of a product does, so that the files land where
+        unzipping the whole archive would put them.
+        """
+        name = member.name
+        Top = os.path.basename(normpath(Directory)) + "/"
+        if name.startswith(Top):
+            name = name[len(Top):]
+
+        path = normpath(name)
+        if isabs(path) or (path == "..") or path.startswith("../"):
+            raise RemoteZipError("unsafe member path {:s}".format(member.name))
+
+        return join(Directory, path)
+
+
+    def extracted(self, member, Filename):
+        """
+        True if Filename already holds the content of the member.
+        """
+        if not isfile(Filename) or (getsize(Filename) != member.usize):
+            return False
+
+        crc = 0
+        with open(Filename, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                crc = zlib.crc32(block, crc)
+
+        return (crc == member.crc)
+
+
+    def extract(self, member, Filename):
+        """
+        Fetch the compressed bytes of a member, decompress them on the fly
+        into Filename + ".part" and rename it to Filename once the size and
+        the CRC-32 are checked. Returns the number of bytes written.
+        """
+        if (member.flags & 0x1):
+            raise RemoteZipError("{:s} is encrypted".format(member.name))
+        if (member.method not in (STORED, DEFLATED)):
+            raise RemoteZipError("{:s}: compression method {:d} not supported".format(member.name, member.method))
+
+        # The local header gives the length of the name and extra field which
+        # precede the data, which may differ from the central directory
+        header = self.read(member.offset, member.offset + struct.calcsize(LOCAL_FORMAT) - 1)
+        if (header[:4] != LOCAL_SIGNATURE):
+            raise RemoteZipError("bad local header for {:s}".format(member.name))
+        name_len, extra_len = unpack(LOCAL_FORMAT, header)[9:11]
+        DataStart = member.offset + len(header) + name_len + extra_len
+
+        if dirname(Filename):
+            os.makedirs(dirname(Filename), exist_ok=True)
+        PartFile = Filename + ".part"
+
+        decompressor = zlib.decompressobj(-15) if (member.method == DEFLATED) else None
+        crc = 0
+        written = 0
+        received = 0
+        with open(PartFile, 'wb') as f:
+            if (member.csize > 0):
+                for chunk in self.fetch(DataStart, DataStart + member.csize - 1):
+                    received += len(chunk)
+                    if (decompressor is not None):
+                        chunk = decompressor.decompress(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    written += len(chunk)
+                    f.write(chunk)
+
+            if (decompressor is not None):
+                chunk = decompressor.flush()
+                crc = zlib.crc32(chunk, crc)
+                written += len(chunk)
+                f.write(chunk)
+
+        if (received != member.csize) or (written != member.usize) or (crc != member.crc):
+            os.remove(PartFile)
+            raise MemberIntegrityError("{:s}: size or CRC-32 does not match the central directory".format(member.name))
+
+        os.replace(PartFile, Filename)
+        return written
@@ -0,0 +1,163 @@
+#
+#  Order in which the records of a log file of the OData scripts for the
+#  Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/) are
+#  downloaded.
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: policies ordering the download queue by priority,
+#         size or sensing date, and round-robin over the MGRS tiles.
+#
+#  1.1: 17.10.2026
+#       * mgrs_tile() moved to OData_spatial, next to the other functions on
+#         the geometry of the products.
+#
+#
+#  Usage:
+#      from OData_scheduler import schedule
+#
+#      Queue = schedule(log_df, Queue, "newest")          # latest scenes first
+#      Queue = schedule(log_df, Queue, "priority,smallest")
+#      Queue = schedule(log_df, Queue, "newest,tile")     # one tile after another
+#
+#  The policies are given as a comma-separated list. The sorting policies
+#  apply in turn, each one breaking the ties of the previous ones, and the
+#  records which are still tied keep the order of the log file. "tile" then
+#  deals the records out over the tiles in turn, keeping their order within
+#  each tile. Further sorting policies can be added to SORT_KEYS.
+#
+
+
+#  Load libraries
+import pandas as pd
+from OData_spatial import mgrs_tile
+
+
+def smallest_key(records):
+    return pd.to_numeric(records['ContentLength'], errors='coerce'), True
+
+
+def largest_key(records):
+    return pd.to_numeric(records['ContentLength'], errors='coerce'), False
+
+
+def newest_key(records):
+    return pd.to_datetime(records['ContentStart'], utc=True, format="ISO8601", errors='coerce'), False
+
+
+def oldest_key(records):
+    return pd.to_datetime(records['ContentStart'], utc=True, format="ISO8601", errors='coerce'), True
+
+
+def priority_key(records):
+    return pd.to_numeric(records['Priority'], errors='coerce').fillna(0), False
+
+
+#  Sorting policies: name -> (function of the records returning the sort key
+#  and whether it is ascending, column of the log file it needs). Records
+#  without a value sort last.
+SORT_KEYS = {
+    'smallest' : (smallest_key, 'ContentLength'),
+    'largest'  : (largest_key,  'ContentLength'),
+    'newest'   : (newest_key,   'ContentStart'),
+    'oldest'   : (oldest_key,   'ContentStart'),
+    'priority' : (priority_key, 'Priority'),
+}
+
+#  Policies which do not sort: "csv" keeps the order of the log file and
+#  "tile" interleaves the tiles
+OTHER_POLICIES = ("csv", "tile")
+
+
+def parse_policies(policies):
+    """
+    List of policy names from a comma-separated string or a list. Raises
+    ValueError for an unknown policy.
+    """
+    if isinstance(policies, str):
+        policies = [ policy.strip() for policy in policies.split(",") if policy.strip() ]
+
+    for policy in policies:
+        if (policy not in SORT_KEYS) and (policy not in OTHER_POLICIES):
+            raise ValueError("unknown schedule policy {:s} (one of {:s})".format(
+                             policy, ", ".join(list(SORT_KEYS) + list(OTHER_POLICIES))))
+
+    return list(policies)
+
+
+def round_robin(Queue, Tiles):
+    """
+    Records of Queue dealt out over their tiles in turn: the first record of
+    each tile, then the second one of each tile, and so on. The tiles come
+    in the order of their first record.
+    """
+    Groups = {}
+    for RecordIdx, Tile in zip(Queue, Tiles):
+        Groups.setdefault(Tile, []).append(RecordIdx)
+
+    Ordered = []
+    Rank = 0
+    while (len(Ordered) < len(Queue)):
+        for Group in Groups.values():
+            if (Rank < len(Group)):
+                Ordered.append(Group[Rank])
+        Rank += 1
+
+    return Ordered
+
+
+def schedule(log_df, Queue, policies="csv"):
+    """
+    Records of Queue (indices of log_df) in the order in which they are to
+    be downloaded according to the policies. A sorting policy whose column
+    is missing from the log file is skipped with a note.
+    """
+    policies = parse_policies(policies)
+    Queue = list(Queue)
+    records = log_df.loc[Queue]
+
+    # Sort keys, the index of the record in last position keeps ties in the
+    # order of the log file
+    keys = pd.DataFrame(index=records.index)
+    ascending = []
+    for policy in policies:
+        if (policy not in SORT_KEYS):
+            continue
+
+        key, column = SORT_KEYS[policy]
+        if (column not in records.columns):
+            print("***  NOTE: no '{:s}' column in the log file, ignoring schedule policy {:s}.".format(column, policy))
+            continue
+
+        keys[policy], order = key(records)
+        ascending.append(order)
+
+    if ascending:
+        keys['RecordIdx'] = records.index
+        Queue = list(keys.sort_values(by=list(keys.columns),
+                                      ascending=ascending + [True],
+                                      kind="stable",
+                                      na_position="last")['RecordIdx'])
+
+    if ("tile" in policies):
+        Queue = round_robin(Queue, [ mgrs_tile(Name) for Name in log_df.loc[Queue, 'Name'] ])
+
+    return Queue
@@ -0,0 +1,366 @@
+#
+#  Functions to query the catalogue of the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/) through the OData API.
+#  Version 1.5
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: build the query filter, follow the pagination of
+#         the catalogue and turn each page into log records.
+#
+#  1.1: 17.10.2026
+#       * Split the sensing window and the polygon into shards and run the
+#         queries of the shards concurrently.
+#
+#  1.2: 17.10.2026
+#       * Optionally answer the requests from the on-disk cache of OData_cache.
+#
+#  1.3: 17.10.2026
+#       * Build the records of a page column by column instead of patching
+#         the 'Checksum' of each row of a dataframe. The checksum is selected
+#         by algorithm, and the size, sensing dates, S3 path and footprint of
+#         the products are added as typed columns.
+#
+#  1.4: 17.10.2026
+#       * Read a file of named areas of interest (GeoJSON or one polygon per
+#         line) for batch queries.
+#
+#  1.5: 17.10.2026
+#       * Optionally ask for the navigation properties of the products with
+#         $expand, e.g. their attributes.
+#
+#
+#  Usage:
+#      from OData_search import build_filter, iter_pages, page_records
+#
+#      flt = build_filter(Collect, Poly, StartTime, StopTime, Cloud)
+#      for page in iter_pages(session, flt, page_size=1000):
+#          records = page_records(page, algorithm="MD5")
+#
+#      shards = [ build_filter(Collect, Poly, t0, t1, Cloud, Cell)
+#                 for t0, t1 in split_time(StartTime, StopTime, 12)
+#                 for Cell in split_polygon(Poly, 2, 2) ]
+#      query_concurrently(session, shards, on_page, workers=8)
+#
+#      for Name, Poly in read_aois("AOIs.geojson"):
+#          flt = build_filter(Collect, Poly, StartTime, StopTime, Cloud)
+#
+
+
+#  Load libraries
+from urllib.parse import urljoin
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import numpy as np
+import pandas as pd
+from OData_transport import CATALOGUE_URL
+
+
+#  Columns of the CSV section of the log files
+LOG_COLUMNS = ['Id', 'Name', 'Checksum', 'Online', 'Downloaded']
+
+#  Columns describing the products, written after LOG_COLUMNS
+DETAIL_COLUMNS = ['ContentLength', 'ContentStart', 'ContentEnd', 'S3Path', 'Footprint']
+
+#  Value of the 'Checksum' column when no checksum is available for a product
+NO_CHECKSUM = "--------------------------------"
+
+#  Algorithms of the checksums given by the catalogue
+CHECKSUM_ALGORITHMS = ("MD5", "BLAKE3")
+
+#  Format of the dates written to the log files
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+#  Format of the sensing times in the query parameters
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def build_filter(Collect, Poly, StartTime, StopTime, Cloud, Cell=None):
+    """
+    OData $filter selecting the products of collection Collect intersecting
+    the polygon Poly, sensed between StartTime and StopTime (format
+    "%Y-%m-%dT%H:%M:%S.000") with a cloud cover of at most Cloud percent.
+    If Cell, a second polygon given in the same format as Poly, is given,
+    the products must intersect it as well.
+    """
+    flt  = "Attributes/OData.CSC.DoubleAttribute/any(att:att/Name eq 'cloudCover' and att/OData.CSC.DoubleAttribute/Value le "
+    flt += Cloud  # cloud cover
+    flt += ") and Collection/Name eq '"
+    flt += Collect  # colletion
+    flt += "' and OData.CSC.Intersects(area=geography'SRID=4326;POLYGON("
+    flt += Poly  # coordinates for polygon
+    flt += ")') and ContentDate/Start gt "
+    flt += StartTime  # sensing time start
+    flt += "Z and ContentDate/Start lt "
+    flt += StopTime  # sensing time stop
+    flt += "Z"
+
+    if (Cell is not None):
+        flt += " and OData.CSC.Intersects(area=geography'SRID=4326;POLYGON("
+        flt += Cell  # coordinates for shard of the polygon
+        flt += ")')"
+
+    return flt
+
+
+def split_time(StartTime, StopTime, n):
+    """
+    Split the sensing window [StartTime, StopTime] into n intervals of equal
+    length, returned as a list of (start, stop) strings in the format of
+    the query parameters. Since the filter uses strict inequalities, each
+    interval overlaps the next one by a millisecond, the duplicate records
+    are to be removed by the caller.
+    """
+    t0 = datetime.strptime(StartTime, TIME_FORMAT)
+    t1 = datetime.strptime(StopTime, TIME_FORMAT)
+    step = (t1 - t0) / n
+    overlap = timedelta(milliseconds=1)
+
+    Bounds = [ t0 + i*step for i in range(n) ] + [ t1 ]
+    return [ ( Bounds[i].strftime(TIME_FORMAT)[:-3],
+               min(t1, Bounds[i+1] + overlap).strftime(TIME_FORMAT)[:-3] )
+             for i in range(n) ]
+
+
+def split_polygon(Poly, nx, ny):
+    """
+    Split the bounding box of the polygon Poly, given as in the query
+    parameters, i.e. "(lon lat, lon lat, ...)", into a grid of nx by ny
+    cells. The cells are returned as polygons in the same format. The
+    queries of the cells are combined with the polygon itself in
+    build_filter(), so that each shard covers the part of the polygon which
+    falls in its cell. Cells share their edges, the duplicate records are
+    to be removed by the caller.
+    """
+    if (nx == 1) and (ny == 1):
+        return [ None ]
+
+    Vertices = [ [ float(x) for x in v.split() ] for v in Poly.strip("() ").split(",") ]
+    lon0 = min(v[0] for v in Vertices)
+    lon1 = max(v[0] for v in Vertices)
+    lat0 = min(v[1] for v in Vertices)
+    lat1 = max(v[1] for v in Vertices)
+    dlon = (lon1 - lon0) / nx
+    dlat = (lat1 - lat0) / ny
+
+    Cells = []
+    for i in range(nx):
+        for j in range(ny):
+            x0, x1 = lon0 + i*dlon, lon0 + (i+1)*dlon
+            y0, y1 = lat0 + j*dlat, lat0 + (j+1)*dlat
+            Cells.append("({0} {2}, {1} {2}, {1} {3}, {0} {3}, {0} {2})".format(x0, x1, y0, y1))
+
+    return Cells
+
+
+def format_polygon(Ring):
+    """
+    Polygon in the format of the query parameters, "(lon lat, lon lat, ...)",
+    from a GeoJSON ring [[lon, lat], ...].
+    """
+    return "(" + ", ".join("{} {}".format(Vertex[0], Vertex[1]) for Vertex in Ring) + ")"
+
+
+def read_aois(Filename):
+    """
+    Named areas of interest of a file, as a list of (Name, Poly) with Poly
+    in the format of the query parameters. The file is either GeoJSON, a
+    FeatureCollection of Polygon or MultiPolygon features named by their
+    'name' property, or text with one area per line:
+        NAME = (lon lat, lon lat, ...)
+    Empty lines and lines starting with '#' are ignored. Only the outer ring
+    of a polygon is used, and a MultiPolygon gives one entry per polygon
+    under the same name.
+    """
+    with open(Filename) as f:
+        Text = f.read()
+
+    AOIs = []
+    if Text.lstrip().startswith("{"):
+        Collection = json.loads(Text)
+        Features = Collection.get('features', [ Collection ])
+        for i, Feature in enumerate(Features):
+            Properties = Feature.get('properties') or {}
+            Name = str(Properties.get('name', Properties.get('Name', Feature.get('id', "AOI{:d}".format(i)))))
+            Geometry = Feature.get('geometry') or {}
+
+            if (Geometry.get('type') == "Polygon"):
+                Polygons = [ Geometry['coordinates'] ]
+            elif (Geometry.get('type') == "MultiPolygon"):
+                Polygons = Geometry['coordinates']
+            else:
+                raise ValueError("{:s}: feature {:s} is not a polygon".format(Filename, Name))
+
+            AOIs.extend((Name, format_polygon(Polygon[0])) for Polygon in Polygons)
+
+    else:
+        for Line in Text.splitlines():
+            Line = Line.strip()
+            if (Line == "") or Line.startswith("#"):
+                continue
+
+            Name, Sep, Poly = Line.partition("=")
+            if (Sep == ""):
+                raise ValueError("{:s}: expected NAME = (lon lat, ...), got {:s}".format(Filename, Line))
+            AOIs.append((Name.strip(), Poly.strip()))
+
+    return AOIs
+
+
+def query_concurrently(session, filters, on_page, workers=4, page_size=1000, count=True, cache=None, expand=None):
+    """
+    Run the queries of a list of filters (shards) concurrently with a pool
+    of threads. Each page is passed to on_page(ShardIdx, page) as soon as it
+    arrives. The calls to on_page are serialized by a lock, so that it can
+    write to a single file. If on_page returns False, the shard stops
+    requesting pages. Exceptions raised by a shard are passed on once all
+    the shards have stopped.
+    """
+    lock = threading.Lock()
+
+    def run_shard(ShardIdx, flt):
+        for page in iter_pages(session, flt, page_size=page_size, count=count, cache=cache, expand=expand):
+            with lock:
+                if (on_page(ShardIdx, page) is False):
+                    return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [ pool.submit(run_shard, ShardIdx, flt) for ShardIdx, flt in enumerate(filters) ]
+        for fut in futures:
+            fut.result()
+
+
+def iter_pages(session, flt, page_size=1000, max_records=None, count=True, cache=None, expand=None):
+    """
+    Generator over the pages of JSON returned by the catalogue for the
+    filter flt. The link '@odata.nextLink' of each page is followed until
+    the last page. If the server does not provide it, the next page is
+    requested with $skip as long as full pages come back.
+
+    With count=True, the first page carries the total number of matching
+    products under '@odata.count'. At most max_records products are
+    returned in all (None for no limit), the last page being cut short if
+    needed. Only one page is held in memory at a time.
+
+    If cache, a QueryCache of OData_cache, is given, each page is looked up
+    in the cache before being requested from the server.
+
+    With expand, e.g. "Attributes", the products come with the given
+    navigation properties ($expand).
+    """
+    params = { "$filter"  : flt,
+               "$orderby" : "ContentDate/Start asc",
+               "$top"     : str(page_size) }
+    if count:
+        params["$count"] = "true"
+    if expand:
+        params["$expand"] = expand
+
+    url = CATALOGUE_URL + "/Products"
+    skip = 0
+    fetched = 0
+
+    while True:
+        page = None
+        if (cache is not None):
+            page = cache.get(url, params)
+
+        if (page is None):
+            res = session.get(url, params=params)
+            res.raise_for_status()
+            page = res.json()
+
+            if (cache is not None):
+                cache.put(url, params, page)
+
+        # Do not go beyond max_records
+        if (max_records is not None) and (fetched + len(page['value']) > max_records):
+            page['value'] = page['value'][:max_records - fetched]
+
+        fetched += len(page['value'])
+        yield page
+
+        if (max_records is not None) and (fetched >= max_records):
+            return
+
+        if ('@odata.nextLink' in page):
+            url = urljoin(url, page['@odata.nextLink'])
+            params = None
+        elif (len(page['value']) == page_size) and (params is not None):
+            skip += page_size
+            params = dict(params, **{ "$skip" : str(skip) })
+            params.pop("$count", None)
+        else:
+            return
+
+
+def select_checksum(Checksums, algorithm="MD5"):
+    """
+    Value of the checksum computed with the given algorithm from the list of
+    checksums of a product, as returned by the catalogue, e.g.
+    [{"Value": "...", "Algorithm": "MD5", ...}, ...]. NO_CHECKSUM if there is
+    none.
+    """
+    if isinstance(Checksums, list):
+        for Checksum in Checksums:
+            if isinstance(Checksum, dict) and (Checksum.get('Algorithm') == algorithm) and Checksum.get('Value'):
+                return Checksum['Value']
+
+    return NO_CHECKSUM
+
+
+def page_records(page, algorithm="MD5"):
+    """
+    Dataframe of log records (columns LOG_COLUMNS followed by
+    DETAIL_COLUMNS) for the products of one page returned by the catalogue.
+    The 'Checksum' column holds the checksum computed with the given
+    algorithm (one of CHECKSUM_ALGORITHMS), or NO_CHECKSUM.
+
+    Each column is built in a single pass over the products, without going
+    through a dataframe of the full JSON records.
+    """
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValueError("checksum algorithm must be one of {:s}".format(", ".join(CHECKSUM_ALGORITHMS)))
+
+    Products = page['value']
+    if (len(Products) == 0):
+        return pd.DataFrame(columns=LOG_COLUMNS + DETAIL_COLUMNS)
+
+    ContentDate = [ Product.get('ContentDate') or {} for Product in Products ]
+
+    log_df = pd.DataFrame({
+        'Id'            : [ Product['Id'] for Product in Products ],
+        'Name'          : [ Product['Name'] for Product in Products ],
+        'Checksum'      : [ select_checksum(Product.get('Checksum'), algorithm) for Product in Products ],
+        'Online'        : np.array([ Product.get('Online', True) for Product in Products ], dtype=bool),
+        'Downloaded'    : np.zeros(len(Products), dtype=bool),
+        'ContentLength' : pd.array([ Product.get('ContentLength') for Product in Products ], dtype="Int64"),
+        'ContentStart'  : pd.to_datetime([ Date.get('Start') for Date in ContentDate ], utc=True, format="ISO8601"),
+        'ContentEnd'    : pd.to_datetime([ Date.get('End') for Date in ContentDate ], utc=True, format="ISO8601"),
+        'S3Path'        : [ Product.get('S3Path') for Product in Products ],
+        'Footprint'     : [ Product.get('Footprint') for Product in Products ] })
+
+    # Footprint as WKT: geography'SRID=4326;POLYGON ((...))' -> POLYGON ((...))
+    log_df['Footprint'] = log_df['Footprint'].astype("string").str.extract(r"^(?:geography')?(?:SRID=\d+;)?([^']*)'?$", expand=False)
+
+    return log_df
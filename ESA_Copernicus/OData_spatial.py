@@ -0,0 +1,352 @@
+#
+#  Local spatial index of the footprints of the products returned by the
+#  catalogue of the Copernicus Dataspace Ecosystem
+#  (https://dataspace.copernicus.eu/), to find the products already seen
+#  which intersect an area of interest without querying the catalogue.
+#  Version 1.3
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: footprints stored in SQLite with an R-tree of their
+#         bounding boxes, searched by polygon, sensing dates, cloud cover and
+#         collection, the candidates being checked against the polygon.
+#
+#  1.1: 17.10.2026
+#       * Subclasses can name the table and add columns and indexes of their
+#         own (TABLE, COLUMNS, INDEXES, columns()). search() accepts criteria
+#         on these columns, and no polygon to search on the other criteria
+#         only.
+#
+#  1.2: 17.10.2026
+#       * rings_intersect() tests one vertex of every ring for containment,
+#         not only the first ring, so that a part of a multipolygon lying
+#         wholly inside the other polygon is found.
+#
+#  1.3: 17.10.2026
+#       * mgrs_tile(), taken from OData_scheduler, for OData_catalogue and
+#         OData_scheduler.
+#
+#
+#  Usage:
+#      from OData_spatial import FootprintIndex
+#
+#      index = FootprintIndex(".OData_footprints.sqlite")
+#      index.add_page(page, "SENTINEL-2")     # page returned by the catalogue
+#
+#      Records = index.search("(57.0 -20.8, 58.1 -20.8, 58.1 -19.6, 57.0 -20.8)",
+#                             "2021-08-01T00:00:00.000", "2021-08-31T23:59:59.999",
+#                             Cloud=50, Collection="SENTINEL-2")
+#      log_df = page_records({ 'value' : Records })
+#
+#  The R-tree (SQLite module rtree) narrows the search to the footprints
+#  whose bounding box overlaps that of the polygon, in logarithmic time, so
+#  that the index scales to millions of footprints. Only these candidates
+#  are tested against the polygon itself.
+#
+
+
+#  Load libraries
+from datetime import datetime, timezone
+import json
+import re
+import sqlite3
+import threading
+
+
+#  Format of the sensing dates in the index, which sort as text
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def normalize_date(Date):
+    """
+    Date and time of the catalogue or of the query parameters (e.g.
+    "2021-08-01T06:26:31.024Z" or "2021-08-01T00:00:00.000") in DATE_FORMAT,
+    in UTC.
+    """
+    Date = datetime.fromisoformat(Date.replace("Z", "+00:00"))
+    if (Date.tzinfo is None):
+        Date = Date.replace(tzinfo=timezone.utc)
+    return Date.astimezone(timezone.utc).strftime(DATE_FORMAT)
+
+
+def parse_rings(Geometry):
+    """
+    Rings of a polygon, as lists of (lon, lat), from WKT (POLYGON or
+    MULTIPOLYGON, with or without the geography'SRID=4326;...' wrapping of
+    the catalogue), from the "(lon lat, ...)" format of the query
+    parameters, or from a GeoJSON geometry. The holes of the polygons are
+    returned as rings as well, so that a polygon falling entirely inside a
+    hole is taken as intersecting.
+    """
+    if isinstance(Geometry, dict):
+        if (Geometry.get('type') == "Polygon"):
+            Polygons = [ Geometry['coordinates'] ]
+        elif (Geometry.get('type') == "MultiPolygon"):
+            Polygons = Geometry['coordinates']
+        else:
+            return []
+        return [ [ (float(v[0]), float(v[1])) for v in Ring ] for Polygon in Polygons for Ring in Polygon ]
+
+    Rings = []
+    for Ring in re.findall(r"\(([^()]+)\)", str(Geometry)):
+        Rings.append([ tuple(float(x) for x in Vertex.split()[:2]) for Vertex in Ring.split(",") ])
+    return Rings
+
+
+def mgrs_tile(Name):
+    """
+    MGRS tile of a Sentinel-2 product from its name, e.g. "40KEC" for
+    S2A_MSIL2A_20210801T062631_N0301_R077_T40KEC_20210801T085124.SAFE, or ""
+    if the name does not give one.
+    """
+    match = re.search(r"_T(\d{2}[A-Z]{3})_", str(Name))
+    return match.group(1) if match else ""
+
+
+def bounding_box(Rings):
+    Lons = [ v[0] for Ring in Rings for v in Ring ]
+    Lats = [ v[1] for Ring in Rings for v in Ring ]
+    return min(Lons), max(Lons), min(Lats), max(Lats)
+
+
+def segments_cross(p1, p2, q1, q2):
+    """
+    True if the segments [p1, p2] and [q1, q2] have a point in common.
+    """
+    def orientation(a, b, c):
+        v = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        return (v > 0) - (v < 0)
+
+    def on_segment(a, b, c):
+        return min(a[0], b[0]) <= c[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= c[1] <= max(a[1], b[1])
+
+    o1, o2 = orientation(p1, p2, q1), orientation(p1, p2, q2)
+    o3, o4 = orientation(q1, q2, p1), orientation(q1, q2, p2)
+    if (o1 != o2) and (o3 != o4):
+        return True
+
+    return ((o1 == 0) and on_segment(p1, p2, q1)) or ((o2 == 0) and on_segment(p1, p2, q2)) or \
+           ((o3 == 0) and on_segment(q1, q2, p1)) or ((o4 == 0) and on_segment(q1, q2, p2))
+
+
+def point_in_ring(Point, Ring):
+    """
+    True if Point is inside the ring (ray casting).
+    """
+    x, y = Point
+    inside = False
+    for (x1, y1), (x2, y2) in zip(Ring, Ring[1:] + Ring[:1]):
+        if ((y1 > y) != (y2 > y)) and (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1)):
+            inside = not inside
+    return inside
+
+
+def rings_intersect(A, B):
+    """
+    True if the polygons given by the rings A and B overlap or touch: an
+    edge of one crosses an edge of the other, or one lies inside the other.
+    When no edges cross, each ring lies wholly inside or outside each ring
+    of the other polygon, so one vertex of every ring (e.g. of every part
+    of a multipolygon) is tested.
+    """
+    for RingA in A:
+        for RingB in B:
+            EdgesB = list(zip(RingB, RingB[1:] + RingB[:1]))
+            for p1, p2 in zip(RingA, RingA[1:] + RingA[:1]):
+                for q1, q2 in EdgesB:
+                    if segments_cross(p1, p2, q1, q2):
+                        return True
+
+    return any(point_in_ring(RingA[0], RingB) for RingA in A for RingB in B) or \
+           any(point_in_ring(RingB[0], RingA) for RingA in A for RingB in B)
+
+
+def cloud_cover(Product):
+    """
+    Cloud cover of a product from its attributes, if the catalogue returned
+    them ($expand=Attributes), else None.
+    """
+    for Attribute in Product.get('Attributes') or []:
+        if (Attribute.get('Name') == "cloudCover"):
+            return Attribute.get('Value')
+    return None
+
+
+class FootprintIndex:
+    """
+    Footprints of products kept in an SQLite database, with the sensing
+    start, the cloud cover, the collection and the JSON record of each
+    product as returned by the catalogue. The bounding boxes of the
+    footprints are indexed by an R-tree. The index can be shared by the
+    threads of a script, each using a connection of its own.
+
+    Subclasses keep more about the products by naming their own TABLE,
+    extra COLUMNS as (name, SQL type), filled in by columns(), and INDEXES
+    as name -> columns.
+    """
+
+    TABLE = "footprints"
+    COLUMNS = []
+    INDEXES = { 'start' : ("ContentStart",) }
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+        con = self.connection()
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS {0:s} (
+                Rowid        INTEGER PRIMARY KEY,
+                Id           TEXT NOT NULL UNIQUE,
+                Collection   TEXT,
+                ContentStart TEXT,
+                Cloud        REAL,
+                Footprint    TEXT NOT NULL,
+                Record       TEXT NOT NULL
+            )""".format(self.TABLE))
+
+        # Columns of the subclass missing from a table created before them
+        Existing = { row[1] for row in con.execute("PRAGMA table_info({:s})".format(self.TABLE)) }
+        for Name, Type in self.COLUMNS:
+            if (Name not in Existing):
+                con.execute("ALTER TABLE {:s} ADD COLUMN {:s} {:s}".format(self.TABLE, Name, Type))
+
+        for Name, Columns in self.INDEXES.items():
+            con.execute("CREATE INDEX IF NOT EXISTS {0:s}_{1:s} ON {0:s} ({2:s})".format(self.TABLE, Name, ", ".join(Columns)))
+        con.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {:s}_rtree USING rtree(Rowid, MinLon, MaxLon, MinLat, MaxLat)".format(self.TABLE))
+        con.commit()
+
+
+    def connection(self):
+        """
+        Connection of the calling thread, opened on first use.
+        """
+        con = getattr(self.local, 'con', None)
+        if (con is None):
+            con = sqlite3.connect(self.path, timeout=self.timeout)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+
+        return con
+
+
+    def columns(self, Product):
+        """
+        Values of the extra COLUMNS for a product, as a dictionary.
+        """
+        return {}
+
+
+    def add_page(self, page, Collection=None):
+        """
+        Add or update the products of a page returned by the catalogue, in
+        a single transaction. The footprint is taken from 'GeoFootprint'
+        (GeoJSON) or else from 'Footprint' (WKT); the products without
+        either are left out. Returns the number of products indexed.
+        """
+        con = self.connection()
+        count = 0
+        with con:
+            for Product in page['value']:
+                Geometry = Product.get('GeoFootprint') or Product.get('Footprint')
+                Rings = parse_rings(Geometry) if Geometry else []
+                if (len(Rings) == 0):
+                    continue
+
+                Start = (Product.get('ContentDate') or {}).get('Start')
+                Values = { 'Id'           : Product['Id'],
+                           'Collection'   : Collection,
+                           'ContentStart' : normalize_date(Start) if Start else None,
+                           'Cloud'        : cloud_cover(Product),
+                           'Footprint'    : json.dumps(Rings),
+                           'Record'       : json.dumps(Product) }
+                Values.update(self.columns(Product))
+
+                Rowid = con.execute("""
+                    INSERT INTO {0:s} ({1:s}) VALUES ({2:s})
+                    ON CONFLICT (Id) DO UPDATE SET {3:s}
+                    RETURNING Rowid""".format(self.TABLE,
+                                              ", ".join(Values),
+                                              ", ".join("?" * len(Values)),
+                                              ", ".join("{0:s} = excluded.{0:s}".format(Name) for Name in Values if (Name != "Id"))),
+                    list(Values.values())).fetchone()[0]
+
+                con.execute("INSERT OR REPLACE INTO {:s}_rtree VALUES (?, ?, ?, ?, ?)".format(self.TABLE), (Rowid,) + bounding_box(Rings))
+                count += 1
+
+        return count
+
+
+    def search(self, Poly=None, StartTime=None, StopTime=None, Cloud=None, Collection=None, **Columns):
+        """
+        JSON records of the products whose footprint intersects the polygon
+        Poly (any format understood by parse_rings()), sensed strictly
+        between StartTime and StopTime, with a cloud cover of at most Cloud
+        percent and from the collection Collection, the criteria left to
+        None being ignored. Products whose cloud cover is not known are
+        kept. Further keyword arguments select the products by the value of
+        extra COLUMNS, e.g. Tile="40KEC". The records are sorted by sensing
+        start.
+        """
+        Names = [ Name for Name, Type in self.COLUMNS ]
+        for Name in Columns:
+            if (Name not in Names):
+                raise ValueError("no column {:s} in the index".format(Name))
+
+        if (Poly is not None):
+            Rings = parse_rings(Poly)
+            MinLon, MaxLon, MinLat, MaxLat = bounding_box(Rings)
+
+            # CROSS JOIN makes SQLite search the R-tree first, rather than
+            # the index of the sensing dates which matches far more products
+            sql = """
+                SELECT f.Footprint, f.Record FROM {0:s}_rtree r CROSS JOIN {0:s} f ON f.Rowid = r.Rowid
+                WHERE r.MaxLon >= ? AND r.MinLon <= ? AND r.MaxLat >= ? AND r.MinLat <= ?""".format(self.TABLE)
+            args = [ MinLon, MaxLon, MinLat, MaxLat ]
+        else:
+            sql = "SELECT f.Footprint, f.Record FROM {:s} f WHERE 1".format(self.TABLE)
+            args = []
+
+        if (StartTime is not None):
+            sql += " AND f.ContentStart > ?"
+            args.append(normalize_date(StartTime))
+        if (StopTime is not None):
+            sql += " AND f.ContentStart < ?"
+            args.append(normalize_date(StopTime))
+        if (Cloud is not None):
+            sql += " AND (f.Cloud IS NULL OR f.Cloud <= ?)"
+            args.append(float(Cloud))
+        if (Collection is not None):
+            sql += " AND f.Collection = ?"
+            args.append(Collection)
+        for Name, Value in Columns.items():
+            if (Value is not None):
+                sql += " AND f.{:s} = ?".format(Name)
+                args.append(Value)
+        sql += " ORDER BY f.ContentStart"
+
+        return [ json.loads(Record) for Footprint, Record in self.connection().execute(sql, args)
+                 if (Poly is None) or rings_intersect(Rings, [ [ tuple(v) for v in Ring ] for Ring in json.loads(Footprint) ]) ]
+
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM {:s}".format(self.TABLE)).fetchone()[0]
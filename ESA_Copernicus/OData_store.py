@@ -0,0 +1,207 @@
+#
+#  Content-addressed store of the products downloaded from the Copernicus
+#  Dataspace Ecosystem (https://dataspace.copernicus.eu/), shared by the
+#  users of a file system, so that a product is downloaded and stored once.
+#  Version 1.2
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: products kept under their MD5 checksum and their
+#         Id, linked into place with hard links, reflinks or copies, and
+#         published atomically.
+#
+#  1.1: 17.10.2026
+#       * Products of log files with BLAKE3 checksums are kept under their
+#         BLAKE3 checksum, in a directory of their own.
+#
+#  1.2: 17.10.2026
+#       * A published file is made read-only before it is renamed into the
+#         store, so that it never appears there writable. publish() returns
+#         the method used, as fetch() does.
+#
+#
+#  Usage:
+#      from OData_store import ProductStore
+#
+#      store = ProductStore("/shared/OData_store")
+#      if store.fetch(Id, Checksum, Name + ".zip") is None:
+#          ...                            # download and verify the product
+#          store.publish(Name + ".zip", Id, Checksum)
+#
+#  Layout of the store:
+#      ROOT/md5/8f/8f5674b70c25e9adfb097e1ab647a6f3.zip
+#      ROOT/id/a1/a1b2c3d4-....zip        (same file as the one above)
+#      ROOT/blake3/3c/3c4f...e1.zip       (with algorithm="BLAKE3")
+#
+#  A product is looked up by its checksum, or by its Id if the checksum is
+#  not known. The files of the store are read-only: they may be hard
+#  links of the files of the users, which must not be written in place.
+#
+
+
+#  Load libraries
+import os
+from os.path import join, dirname, isfile, getsize
+import errno
+import fcntl
+import shutil
+import threading
+
+
+#  ioctl of Linux sharing the blocks of a file with another one (copy on
+#  write), on Btrfs, XFS and other file systems supporting it
+FICLONE = 0x40049409
+
+#  Ways of putting a file of the store into place, in order of preference
+LINK_METHODS = ("hardlink", "reflink", "copy")
+
+#  Errors of os.link() meaning that a hard link cannot be made here, e.g.
+#  across file systems
+LINK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP)
+
+
+def reflink(Source, Dest):
+    """
+    Create Dest sharing the blocks of Source. Returns False if the file
+    system or the platform does not support it.
+    """
+    with open(Source, 'rb') as src, open(Dest, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError as err:
+            if (err.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF)):
+                raise
+
+    os.remove(Dest)
+    return False
+
+
+def link_file(Source, Dest, method="hardlink", mode=None):
+    """
+    Create Dest with the content of Source, with a hard link, a reflink or
+    a copy, trying the given method first and the next ones of LINK_METHODS
+    if it cannot be used. Dest is written under a temporary name, given the
+    permissions mode if any, and renamed, so that it never appears
+    incomplete or with other permissions. Returns the method used.
+    """
+    if dirname(Dest):
+        os.makedirs(dirname(Dest), exist_ok=True)
+    TmpFile = "{:s}.tmp-{:d}-{:d}".format(Dest, os.getpid(), threading.get_ident())
+
+    try:
+        for method in LINK_METHODS[LINK_METHODS.index(method):]:
+            if (method == "hardlink"):
+                try:
+                    os.link(Source, TmpFile)
+                    break
+                except OSError as err:
+                    if (err.errno not in LINK_ERRNOS):
+                        raise
+            elif (method == "reflink"):
+                if reflink(Source, TmpFile):
+                    break
+            else:
+                shutil.copyfile(Source, TmpFile)
+
+        if (mode is not None):
+            os.chmod(TmpFile, mode)
+        os.replace(TmpFile, Dest)
+
+    except BaseException:
+        if isfile(TmpFile):
+            os.remove(TmpFile)
+        raise
+
+    return method
+
+
+class ProductStore:
+    """
+    Products kept in the directory root under their checksum (MD5, or the
+    algorithm given), with a second hard link under their Id. method ("hardlink", "reflink" or
+    "copy") is the first way tried to link the files between the store and
+    the directories of the users, the next ones being used if it cannot be,
+    e.g. for a store on another file system.
+    """
+
+    def __init__(self, root, method="hardlink", algorithm="MD5"):
+        if (method not in LINK_METHODS):
+            raise ValueError("link method must be one of {:s}".format(", ".join(LINK_METHODS)))
+
+        self.root = root
+        self.method = method
+        self.algorithm = algorithm
+
+
+    def checksum_path(self, Checksum):
+        Checksum = Checksum.lower()
+        return join(self.root, self.algorithm.lower(), Checksum[:2], Checksum + ".zip")
+
+
+    def id_path(self, Id):
+        return join(self.root, "id", Id[:2], Id + ".zip")
+
+
+    def lookup(self, Id, Checksum=None, Size=None):
+        """
+        Path of the product in the store, found by its checksum if it is
+        given, else by its Id, or None if the store does not hold it. With
+        Size, a file of another size is not taken.
+        """
+        Path = self.checksum_path(Checksum) if Checksum else self.id_path(Id)
+        if not isfile(Path):
+            return None
+        if (Size is not None) and (getsize(Path) != Size):
+            return None
+        return Path
+
+
+    def fetch(self, Id, Checksum, Dest, Size=None):
+        """
+        Put the product into Dest if the store holds it. Returns the method
+        used ("hardlink", "reflink" or "copy"), or None if the product is not
+        in the store.
+        """
+        Path = self.lookup(Id, Checksum, Size)
+        if (Path is None):
+            return None
+        return link_file(Path, Dest, self.method)
+
+
+    def publish(self, Filename, Id, Checksum):
+        """
+        Add a downloaded file, whose checksum was verified, to the store.
+        The file appears in the store at once under its final name, or not at
+        all, and is read-only from the start. With a hard link, the file of
+        the user is the same file, hence read-only too. Returns the method
+        used ("hardlink", "reflink" or "copy"), or None if the store already
+        held the file.
+        """
+        Path = self.checksum_path(Checksum)
+        if isfile(Path):
+            method = None
+        else:
+            method = link_file(Filename, Path, self.method, mode=0o444)
+
+        if not isfile(self.id_path(Id)):
+            link_file(Path, self.id_path(Id), "hardlink")
+
+        return method
@@ -0,0 +1,216 @@
+#
+#  Access token management for the OData API of the Copernicus Dataspace
+#  Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: fetch and refresh tokens in-process over the pooled
+#         session of OData_transport instead of running curl.
+#
+#  1.1: 17.10.2026
+#       * refresh() returns whether this call refreshed the token, False
+#         when another thread had already done it.
+#
+#
+#  Usage:
+#      from OData_transport import PooledSession
+#      from OData_token import TokenManager, TokenRefreshError
+#
+#      session = PooledSession()
+#      tokens = TokenManager(session, "CopernicusDataspace_token.json")
+#      tokens.load()
+#      tokens.ensure_fresh()     # before each request
+#      tokens.refresh(auth)      # after a 401, auth = header of the request
+#
+
+
+#  Load libraries
+from os import replace
+from os.path import getmtime
+from time import time
+import json
+import threading
+import requests
+from OData_transport import IDENTITY_URL
+
+
+###  BEGIN Define custom exceptions  ###
+
+class TokenRefreshError(Exception):
+    pass
+
+class IdentityUnreachableError(TokenRefreshError):
+    pass
+
+###  END Define custom exceptions  ###
+
+
+class TokenManager:
+    """
+    Keeps the access token of a session valid.
+
+    The token JSON record returned by the identity service gives the life
+    time of the access token (expires_in) and of the refresh token
+    (refresh_expires_in) in seconds. The time at which the record was
+    obtained is stored with it under the key 'fetched_at' (the modification
+    time of the token file is used for records written by older scripts).
+
+    ensure_fresh() refreshes the access token when it is about to expire,
+    i.e. less than 'margin' seconds before its expiry, so that requests do
+    not fail with a 401 in the first place. When the refresh token has
+    expired as well, a new token is requested with the password grant if a
+    username and password were given.
+
+    A lock makes sure that only one refresh runs at a time when the manager
+    is shared between worker threads.
+    """
+
+    def __init__(self, session, token_file, username="", password="", margin=60, client_id="cdse-public"):
+        self.session = session
+        self.token_file = token_file
+        self.username = username
+        self.password = password
+        self.margin = margin
+        self.client_id = client_id
+
+        self.token = None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+
+
+    def load(self):
+        """
+        Load the token record from the token file and set the Authorization
+        header of the session. Raises FileNotFoundError if there is no file.
+        """
+        with open(self.token_file) as f:
+            token = json.load(f)
+
+        self.token = token
+        self.fetched_at = token.get('fetched_at', getmtime(self.token_file))
+        self.session.set_token(token['access_token'])
+
+
+    def access_expired(self):
+        return (time() >= self.fetched_at + self.token.get('expires_in', 0) - self.margin)
+
+
+    def refresh_expired(self):
+        return (time() >= self.fetched_at + self.token.get('refresh_expires_in', 0) - self.margin)
+
+
+    def ensure_fresh(self):
+        """
+        Refresh the access token ahead of its expiry.
+        """
+        if self.access_expired():
+            self.refresh()
+
+
+    def refresh(self, expired_auth=None):
+        """
+        Refresh the access token. If expired_auth, the Authorization header
+        of a request which failed with a 401, is given and the session
+        already carries another header, another thread has refreshed the
+        token in the meantime and nothing is done. Returns True if this call
+        refreshed the token, False if it found it already refreshed.
+        """
+        with self.lock:
+
+            if (expired_auth is not None) and (self.session.authorization() != expired_auth):
+                return False
+
+            # Another thread may have refreshed ahead of expiry meanwhile
+            if (expired_auth is None) and not self.access_expired():
+                return False
+
+            if not self.refresh_expired():
+                try:
+                    self._store( self._request({ 'grant_type' : 'refresh_token',
+                                                 'refresh_token' : self.token['refresh_token'],
+                                                 'client_id' : self.client_id }) )
+                    return True
+
+                except IdentityUnreachableError:
+                    raise
+
+                except TokenRefreshError:
+                    if not self.username:
+                        raise
+
+            elif not self.username:
+                raise TokenRefreshError("Refresh token expired, please run the OData_fetch_token script.")
+
+            # Refresh token expired or refused: start again from the password
+            self._password_grant()
+            return True
+
+
+    def password_grant(self):
+        """
+        Request a brand new token using the username and password.
+        """
+        with self.lock:
+            self._password_grant()
+
+
+    def _password_grant(self):
+        self._store( self._request({ 'grant_type' : 'password',
+                                     'username' : self.username,
+                                     'password' : self.password,
+                                     'client_id' : self.client_id }) )
+
+
+    def _request(self, data):
+        """
+        POST a form to the identity service and return the decoded token
+        record.
+        """
+        try:
+            res = self.session.post(IDENTITY_URL, data=data)
+        except requests.exceptions.ConnectionError:
+            raise IdentityUnreachableError("could not resolve host <identity.dataspace.copernicus.eu>")
+
+        try:
+            token = res.json()
+        except ValueError:
+            raise TokenRefreshError("unexpected response from identity service (status code = {:d})".format(res.status_code))
+
+        if "error" in token.keys():
+            raise TokenRefreshError(token.get('error_description', token['error']))
+
+        return token
+
+
+    def _store(self, token):
+        """
+        Keep the new token, write it to the token file and update the
+        Authorization header of the session.
+        """
+        token['fetched_at'] = time()
+
+        with open(self.token_file + ".tmp", 'w') as f:
+            json.dump(token, f)
+        replace(self.token_file + ".tmp", self.token_file)
+
+        self.token = token
+        self.fetched_at = token['fetched_at']
+        self.session.set_token(token['access_token'])
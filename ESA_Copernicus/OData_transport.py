@@ -0,0 +1,136 @@
+#
+#  HTTP transport shared by the OData scripts for the Copernicus Dataspace
+#  Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module: one long-lived session with a pool of keep-alive
+#         connections, shared by the query, token and download code.
+#
+#  1.1: 17.10.2026
+#       * The endpoints can be overridden with the environment variables
+#         CDSE_CATALOGUE_URL, CDSE_ZIPPER_URL and CDSE_IDENTITY_URL, e.g. to
+#         run the scripts against the mock server of OData_mockserver.
+#
+#
+#  Usage:
+#      from OData_transport import PooledSession, CATALOGUE_URL
+#
+#      session = PooledSession(pool_size=8)
+#      session.set_token(access_token)
+#      res = session.get(CATALOGUE_URL + "/Products?$top=1")
+#
+
+
+#  Load libraries
+import os
+import socket
+import requests
+from requests.adapters import HTTPAdapter
+
+
+###  BEGIN Copernicus Dataspace endpoints  ###
+
+#  Each endpoint can be overridden by the environment variable of the same
+#  name prefixed with "CDSE_".
+
+#  Catalogue (product search)
+CATALOGUE_URL = os.environ.get("CDSE_CATALOGUE_URL", "https://catalogue.dataspace.copernicus.eu/odata/v1")
+
+#  Product download
+ZIPPER_URL = os.environ.get("CDSE_ZIPPER_URL", "https://zipper.dataspace.copernicus.eu/odata/v1")
+
+#  Identity service delivering the access tokens
+IDENTITY_URL = os.environ.get("CDSE_IDENTITY_URL", "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token")
+
+###  END Copernicus Dataspace endpoints  ###
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter which turns on TCP keep-alive probes on its sockets, so that
+    idle pooled connections are not silently dropped by NAT or firewalls
+    between two products.
+    """
+
+    def __init__(self, keepalive_idle=60, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = [ (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+                           (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) ]
+
+        # Linux only
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            socket_options += [ (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle),
+                                (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, self.keepalive_idle // 4)) ]
+
+        kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PooledSession(requests.Session):
+    """
+    requests.Session meant to live for the whole run of a script.
+
+    pool_size : maximum number of connections kept open per host. Requests
+                beyond this number wait for a free connection instead of
+                opening a new one.
+    timeout : default (connect, read) timeout in seconds applied to every
+              request which does not set its own.
+    keepalive : if False, connections are closed after each request.
+    keepalive_idle : number of idle seconds before TCP keep-alive probes are
+                     sent on a pooled connection.
+    """
+
+    def __init__(self, pool_size=10, timeout=(10, 120), keepalive=True, keepalive_idle=60):
+        super().__init__()
+        self.timeout = timeout
+
+        if keepalive:
+            adapter = KeepAliveAdapter(keepalive_idle=keepalive_idle,
+                                       pool_connections=4,
+                                       pool_maxsize=pool_size,
+                                       pool_block=True)
+        else:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+            self.headers["Connection"] = "close"
+
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+    def set_token(self, access_token):
+        """
+        Update the Authorization header in place. The pooled connections are
+        kept, so no new TLS handshake is needed after a token refresh.
+        """
+        self.headers["Authorization"] = "Bearer {:s}".format(access_token)
+
+    def authorization(self):
+        """
+        Current Authorization header, or None if no token was set.
+        """
+        return self.headers.get("Authorization")
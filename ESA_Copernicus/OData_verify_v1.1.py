@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+#
+#  Script to verify the checksums of the products already downloaded from the
+#  Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/).
+#  Version 1.1
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial script: hash the files of the records of one or more log
+#         files in a pool of processes, compare with the 'Checksum' column and
+#         update the 'Downloaded' column of the log files.
+#
+#  1.1: 17.10.2026
+#       * Keep the digests in the hash cache of OData_hashing (params_HashCache)
+#         and only read the files which changed since they were last hashed.
+#       * The algorithm of the checksums of each log file is read from its
+#         preamble (OData_query 2.7), params_Checksum being used for the log
+#         files which do not give it.
+#
+#
+#  Usage: ./OData_verify_vx.x.py INPUTLOGFILE [INPUTLOGFILE ...]
+#
+#  Exit status:
+#      0      if OK,
+#      1      no argument was passed on the command line,
+#      2      cannot access a log file passed to script,
+#      3      some files do not match their checksum or are missing,
+#      4      the checksums of a log file are of an unknown algorithm, or of
+#             one which cannot be computed here,
+#      6      keyboard interrupt, the log files are not updated.
+#
+
+
+###  BEGIN Set Verification Parameters  ###
+
+#  params_Workers : number of files hashed concurrently, each by a process of
+#                   its own. Files on a single disk are best hashed by a few
+#                   processes, files on an array of disks or SSDs by one
+#                   process per core.
+#  params_ReadSize : number of bytes read at a time from each file.
+#  params_DataDir : directory holding the downloaded files (Name + ".zip").
+#  params_Checksum : algorithm of the checksums of the log files written
+#                    before OData_query 2.7, which do not give it in their
+#                    preamble, "MD5" or "BLAKE3".
+#  params_Missing : if True, records marked as 'Downloaded' whose file is not
+#                   found are marked as not downloaded.
+#  params_HashCache : SQLite file caching the digests of the files, shared
+#                     with OData_download. Leave empty to hash every file.
+#
+
+##  Please set the following:
+
+params_Workers = 8
+params_ReadSize = 8388608
+params_DataDir = "."
+params_Checksum = "MD5"
+params_Missing = True
+params_HashCache = ".OData_hashes.sqlite"
+
+###  END Set Verification Parameters  ###
+
+
+#  Load libraries
+from sys import argv
+from os.path import isfile, getsize, join
+from time import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from OData_logfile import read_log, write_log, CHECKSUM_KEY, checksum_algorithm
+from OData_search import NO_CHECKSUM
+from OData_hashing import new_hash, file_digest, file_identity, HashCache
+
+
+###  BEGIN Parsing of command line arguments  ###
+if len(argv) <= 1:
+    print("Usage: {:s} ODATA_QUERY_LOG [ODATA_QUERY_LOG ...]".format(argv[0]))
+    print("The files ODATA_QUERY_LOG are log files output by the OData_query.py script.")
+    print("The files of their records are looked for in {:s}.\n".format(params_DataDir))
+    exit(1)
+
+LogFiles = argv[1:]
+for LogFile in LogFiles:
+    if not isfile(LogFile):
+        print("Cannot access {:s}!\n".format(LogFile))
+        exit(2)
+###  END Parsing of command line arguments  ###
+
+
+
+###  BEGIN Load log files and select files to verify  ###
+
+#  LogFile -> (log_hdr, log_df)
+Logs = {}
+
+#  LogFile -> algorithm of its checksums
+Algorithms = {}
+
+#  Files to hash: (LogFile, RecordIdx, DataFile, Checksum)
+Jobs = []
+
+count_missing = 0
+count_unverifiable = 0
+
+for LogFile in LogFiles:
+    log_hdr, log_df = read_log(LogFile)
+    Logs[LogFile] = (log_hdr, log_df)
+
+    Algorithms[LogFile] = checksum_algorithm(log_hdr) if (CHECKSUM_KEY in log_hdr) else params_Checksum
+    try:
+        new_hash(Algorithms[LogFile])
+    except ValueError as err:
+        print("Cannot verify the checksums of {:s}: {:s}\n".format(LogFile, str(err)))
+        exit(4)
+
+    for RecordIdx in range(log_df.shape[0]):
+        DataFile = join(params_DataDir, log_df.loc[RecordIdx, 'Name'] + ".zip")
+
+        if not isfile(DataFile):
+            if (log_df.loc[RecordIdx, 'Downloaded'] == True):
+                print("***  {:s}: file missing although marked as downloaded.".format(DataFile))
+                count_missing += 1
+                if params_Missing:
+                    log_df.loc[RecordIdx, 'Downloaded'] = False
+            continue
+
+        if (log_df.loc[RecordIdx, 'Checksum'] == NO_CHECKSUM):
+            count_unverifiable += 1
+            continue
+
+        Jobs.append((LogFile, RecordIdx, DataFile, log_df.loc[RecordIdx, 'Checksum']))
+
+# Files which did not change since they were last hashed are not read again
+hashes = HashCache(params_HashCache) if params_HashCache else None
+
+Cached = []
+if (hashes is not None):
+    Cached = [ (Job, hashes.get(Job[2], Algorithms[Job[0]])) for Job in Jobs ]
+    Cached = [ (Job, Digest) for Job, Digest in Cached if Digest is not None ]
+    CachedFiles = { Job[2] for Job, Digest in Cached }
+    Jobs = [ Job for Job in Jobs if Job[2] not in CachedFiles ]
+
+# Largest files first, so that the last processes do not run alone on a
+# large file at the end
+Jobs.sort(key=lambda Job: getsize(Job[2]), reverse=True)
+TotalBytes = sum(getsize(Job[2]) for Job in Jobs)
+
+if Cached:
+    print("\n# {:d} file(s) unchanged since they were last hashed.".format(len(Cached)))
+print("\n# {:d} file(s), {:.1f} GB, to verify using {:d} process(es).".format(len(Jobs), TotalBytes / 1e9, params_Workers))
+
+###  END Load log files and select files to verify  ###
+
+
+
+###  BEGIN Hash files using a pool of processes  ###
+
+count_ok = 0
+CorruptFiles = []
+start = time()
+
+
+def check_digest(LogFile, RecordIdx, DataFile, Checksum, Digest):
+    """
+    Compare the digest of a file with its checksum and update the record.
+    """
+    global count_ok
+    log_df = Logs[LogFile][1]
+
+    if (Digest == Checksum):
+        count_ok += 1
+        log_df.loc[RecordIdx, 'Downloaded'] = True
+    else:
+        print("***  {:s}: checksum {:s} does not match {:s} from query record!".format(DataFile, Digest, Checksum))
+        CorruptFiles.append(DataFile)
+        log_df.loc[RecordIdx, 'Downloaded'] = False
+
+
+for Job, Digest in Cached:
+    check_digest(*Job, Digest)
+
+# The workers are forked so that this script is not run again in each of them
+pool = ProcessPoolExecutor(max_workers=params_Workers, mp_context=multiprocessing.get_context("fork"))
+try:
+    # The identity of each file is taken before it is read, so that a file
+    # modified while being hashed is not cached
+    futures = {}
+    for Job in Jobs:
+        identity = file_identity(Job[2])
+        futures[pool.submit(file_digest, Job[2], Algorithms[Job[0]], params_ReadSize)] = (Job, identity)
+
+    for fut in as_completed(futures):
+        Job, identity = futures[fut]
+        LogFile, RecordIdx, DataFile, Checksum = Job
+
+        try:
+            Digest = fut.result()
+        except OSError as err:
+            print("***  {:s}: cannot read file ({:s}).".format(DataFile, str(err)))
+            CorruptFiles.append(DataFile)
+            Logs[LogFile][1].loc[RecordIdx, 'Downloaded'] = False
+            continue
+
+        if (hashes is not None):
+            hashes.put(DataFile, Algorithms[LogFile], Digest, identity)
+
+        check_digest(LogFile, RecordIdx, DataFile, Checksum, Digest)
+
+    pool.shutdown()
+
+except KeyboardInterrupt:
+    print("\n***  Keyboard interrupt! The log files are not updated.\n")
+    pool.shutdown(wait=False, cancel_futures=True)
+    exit(6)
+
+elapsed = time() - start
+
+###  END Hash files using a pool of processes  ###
+
+
+
+###  BEGIN Update log files and report  ###
+
+for LogFile, (log_hdr, log_df) in Logs.items():
+    print("# Updating log file {:s}".format(LogFile))
+    write_log(LogFile, log_hdr, log_df)
+
+# List of the corrupt files, to be checked or deleted
+if CorruptFiles:
+    with open("OData_verify_corrupt.txt", 'w') as f:
+        for DataFile in sorted(CorruptFiles):
+            f.write(DataFile + "\n")
+
+print("\n------------------------------------------------------------------------------")
+print("{:d} file(s) hashed in {:.1f} s ({:.0f} MB/s), {:d} found in the hash cache".format(len(Jobs), elapsed, TotalBytes / 1e6 / max(elapsed, 1e-6), len(Cached)))
+print("{:d} OK, {:d} corrupt, {:d} missing, {:d} without checksum".format(count_ok, len(CorruptFiles), count_missing, count_unverifiable))
+if CorruptFiles:
+    print("Corrupt files are listed in OData_verify_corrupt.txt and marked as not downloaded.")
+print("------------------------------------------------------------------------------\n")
+
+if CorruptFiles or count_missing:
+    exit(3)
+
+exit(0)
+
+###  END Update log files and report  ###
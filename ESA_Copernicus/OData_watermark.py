@@ -0,0 +1,131 @@
+#
+#  High-water marks of saved queries, used to query the catalogue of the
+#  Copernicus Dataspace Ecosystem (https://dataspace.copernicus.eu/) for new
+#  products only.
+#  Version 1.0
+#
+#  Copyright (C) 2024  Nitish Ragoomundun, Mauritius
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+#  Changelog:
+#  1.0: 17.10.2026
+#       * Initial module.
+#
+#
+#  Usage:
+#      from OData_watermark import Watermark
+#
+#      mark = Watermark("OData_state", "mauritius_s2")
+#      mark.load()
+#      flt = mark.restrict(flt)           # only products published since
+#      for record in page['value']:
+#          if mark.is_new(record['Id'], record['PublicationDate']):
+#              ...
+#              mark.update(record['Id'], record['PublicationDate'])
+#      mark.save()                        # once the records are stored
+#
+
+
+#  Load libraries
+import os
+from os.path import join, isfile
+from datetime import datetime
+import json
+
+
+def parse_date(value):
+    """
+    datetime of an OData date such as "2024-03-18T10:21:05.123456Z".
+    """
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class Watermark:
+    """
+    High-water mark of a saved query: the latest publication date of the
+    products seen so far, and the Ids of the products published at exactly
+    that date. Products are queried with 'PublicationDate ge mark', so that
+    nothing published in the same instant is missed, and the products whose
+    Id is already known are dropped.
+
+    The state is kept as a JSON file named after the query in the state
+    directory, next to the log file (OData_query format) to which the new
+    records of each run are appended.
+    """
+
+    def __init__(self, state_dir, name):
+        self.state_dir = state_dir
+        self.name = name
+        self.state_file = join(state_dir, name + ".json")
+        self.log_file = join(state_dir, name + ".log")
+
+        self.mark = None
+        self.ids = set()
+
+
+    def load(self):
+        """
+        Load the state of the query, if it was run before.
+        """
+        if isfile(self.state_file):
+            with open(self.state_file) as f:
+                state = json.load(f)
+            self.mark = state['PublicationDate']
+            self.ids = set(state['Ids'])
+
+
+    def restrict(self, flt):
+        """
+        Add the condition on the publication date to the filter flt.
+        """
+        if (self.mark is None):
+            return flt
+        return flt + " and PublicationDate ge " + self.mark
+
+
+    def is_new(self, Id, PublicationDate):
+        """
+        Whether a product returned by the catalogue was not seen yet.
+        """
+        if (self.mark is None):
+            return True
+
+        date = parse_date(PublicationDate)
+        mark = parse_date(self.mark)
+        return (date > mark) or ((date == mark) and (Id not in self.ids))
+
+
+    def update(self, Id, PublicationDate):
+        """
+        Move the mark forward with a product which was stored.
+        """
+        if (self.mark is None) or (parse_date(PublicationDate) > parse_date(self.mark)):
+            self.mark = PublicationDate
+            self.ids = { Id }
+        elif (parse_date(PublicationDate) == parse_date(self.mark)):
+            self.ids.add(Id)
+
+
+    def save(self):
+        """
+        Write the state of the query. To be called only once the new records
+        are safely stored, so that a failed run is simply done again.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self.state_file + ".tmp", 'w') as f:
+            json.dump({ 'PublicationDate' : self.mark, 'Ids' : sorted(self.ids) }, f)
+        os.replace(self.state_file + ".tmp", self.state_file)
@@ -0,0 +1,71 @@
+#
+#  Tests of the OData_query script against the mock server of
+#  OData_mockserver, run with pytest from the directory ESA_Copernicus.
+#
+
+
+import os
+import re
+import sys
+import glob
+import subprocess
+import pytest
+
+ScriptDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ScriptDir)
+
+from OData_mockserver import MockServer
+from OData_logfile import read_log
+
+
+QueryScript = os.path.join(ScriptDir, "OData_query_v2.7.py")
+
+
+@pytest.fixture
+def server():
+    server = MockServer(products=20, product_size=1024, check_tokens=False)
+    server.start()
+    yield server
+    server.stop()
+
+
+def run_query(server, WorkDir, **params):
+    """
+    Run a copy of the query script in WorkDir with the given parameters
+    (params_NAME=value) set in its preamble, and return the dataframe of
+    the log file written.
+    """
+    with open(QueryScript) as f:
+        Script = f.read()
+    for Name, Value in params.items():
+        Script, n = re.subn(r"^params_{:s} = .*$".format(Name), "params_{:s} = {!r}".format(Name, Value), Script, count=1, flags=re.M)
+        assert (n == 1), Name
+
+    with open(os.path.join(WorkDir, "query.py"), 'w') as f:
+        f.write(Script)
+
+    env = dict(os.environ, PYTHONPATH=ScriptDir, **server.environ())
+    res = subprocess.run([sys.executable, "query.py"], cwd=WorkDir, env=env, capture_output=True, text=True)
+    assert (res.returncode == 0), res.stdout + res.stderr
+
+    LogFiles = glob.glob(os.path.join(WorkDir, "OData_*_query_*.log"))
+    assert (len(LogFiles) == 1)
+    return read_log(LogFiles[0])[1]
+
+
+def test_max_records_per_overlapping_aoi(server, tmp_path):
+    """
+    Two areas of interest covering the same products (the mock server does
+    not filter on the polygon) each take params_MaxRecords of them, and
+    both are listed in the 'AOI' column of every record.
+    """
+    with open(tmp_path / "aois.txt", 'w') as f:
+        f.write("West = (57.30 -20.48, 57.38 -20.48, 57.38 -20.42, 57.30 -20.42, 57.30 -20.48)\n")
+        f.write("East = (57.45 -20.22, 57.55 -20.22, 57.55 -20.12, 57.45 -20.12, 57.45 -20.22)\n")
+
+    log_df = run_query(server, tmp_path, AOIFile=str(tmp_path / "aois.txt"), MaxRecords="5",
+                       PageSize="2", QueryWorkers=2, CacheMode="bypass", Catalogue="")
+
+    assert (log_df.shape[0] == 5)
+    assert log_df['Id'].is_unique
+    assert (log_df['AOI'] == "East;West").all()
@@ -0,0 +1,39 @@
+#
+#  Tests of the geometry of OData_spatial, run with pytest from the directory
+#  ESA_Copernicus.
+#
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from OData_spatial import parse_rings, rings_intersect
+
+
+AOI = parse_rings("(57.0 -20.5, 57.5 -20.5, 57.5 -20.0, 57.0 -20.0, 57.0 -20.5)")
+
+
+def test_polygon_inside_polygon():
+    Inside = parse_rings("POLYGON ((57.1 -20.4, 57.2 -20.4, 57.2 -20.3, 57.1 -20.4))")
+    assert rings_intersect(AOI, Inside)
+    assert rings_intersect(Inside, AOI)
+
+
+def test_multipolygon_part_inside_polygon():
+    """
+    The first part of the multipolygon is far from the area, the second one
+    lies wholly inside it: no edges cross.
+    """
+    Footprint = parse_rings("MULTIPOLYGON (((60.0 -10.0, 61.0 -10.0, 61.0 -9.0, 60.0 -10.0)), "
+                            "((57.1 -20.4, 57.2 -20.4, 57.2 -20.3, 57.1 -20.4)))")
+    assert rings_intersect(AOI, Footprint)
+    assert rings_intersect(Footprint, AOI)
+
+
+def test_multipolygon_disjoint():
+    Footprint = parse_rings("MULTIPOLYGON (((60.0 -10.0, 61.0 -10.0, 61.0 -9.0, 60.0 -10.0)), "
+                            "((58.0 -20.4, 58.2 -20.4, 58.2 -20.3, 58.0 -20.4)))")
+    assert not rings_intersect(AOI, Footprint)
+    assert not rings_intersect(Footprint, AOI)